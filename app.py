@@ -15,7 +15,20 @@ from application.admin_routes import register_admin_routes
 from application.moderator_routes import register_moderator_routes
 from application.student_routes import register_student_routes
 from application.misc_routes import register_misc_routes
+from application.cli import register_cli_commands
 from application.models import db
+from application.db_pool import db_pool, PoolTimeout
+from application.password_hashing import password_hasher
+from application.audit_sink import audit_sink
+from application.vote_ingest import vote_ingestor
+from application.cca_cascade import cca_purger
+from application.metrics import metrics
+from application.query_profiler import query_profiler, profiled
+from application.app_metrics import register_app_metrics
+from application.health import health
+from application.session_store import configure_sessions
+from application.session_sweeper import session_sweeper
+from sqlalchemy.pool import NullPool
 
 app = Flask(__name__)
 
@@ -54,14 +67,39 @@ except KeyError:
 app.config['SQLALCHEMY_DATABASE_URI'] = app.config.get('SQLALCHEMY_DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = app.config.get('SQLALCHEMY_TRACK_MODIFICATIONS', False)
 
+# Shared connection pool: against SQL Server the SQLAlchemy engine borrows from
+# db_pool instead of keeping its own, so raw pyodbc handlers and ORM queries draw
+# from one bounded set. Any other database (e.g. SQLite in CI) keeps its own engine.
+db_pool.init_app(app)
+if (app.config.get('SQLALCHEMY_DATABASE_URI') or '').startswith('mssql+pyodbc'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+        'creator': db_pool.connect,
+        'poolclass': NullPool,
+        # db_pool rolls back on release, no need for SQLAlchemy to do it too
+        'pool_reset_on_return': None,
+    }
+
 with app.app_context():
     db.init_app(app)
 
+# bcrypt runs in a per-worker process pool (sized in gunicorn.conf.py post_fork)
+password_hasher.init_app(app)
+
+# LoginLog/AdminLog rows and ballots are written in batches by background threads
+audit_sink.init_app(app)
+vote_ingestor.init_app(app)
+
+# Large CCAs are soft-deleted and purged by a background thread
+cca_purger.init_app(app)
+
+# Per-request query counts and DB time, served with other figures at /metrics
+metrics.init_app(app)
+query_profiler.init_app(app)
+register_app_metrics(app)
+
 # Session Management
 app.config.update(
-    # Server-side
-    SESSION_TYPE='sqlalchemy',
-    SESSION_SQLALCHEMY=db,
     # Temporary session cookie to clear when browser closes
     SESSION_PERMANENT=False,
     # Sign session cookie
@@ -74,28 +112,25 @@ app.config.update(
     SESSION_COOKIE_SAMESITE='Strict'
 )
 
+# Server-side store from SESSION_BACKEND (SQL Server table, in-process LRU or Redis)
+configure_sessions(app)
+
 # Initialise session
 Session(app)
+# Session store load/save times go to /metrics
+metrics.instrument_sessions(app)
+# Expired and idle rows leave the session table in the background
+session_sweeper.init_app(app)
+
+# /health/live for the container, /health/ready (cached, checked in the background) for load balancers
+health.init_app(app)
 
 # Database connection function
 def get_db_connection():
     try:
-        # Access DB_CONNECTION_STRING from app.config
-        conn_str = app.config.get('DB_CONNECTION_STRING')
-        if not conn_str:
-            # Fallback to constructing it if DB_CONNECTION_STRING is not directly in Config
-            # This assumes DB_DRIVER, DB_SERVER etc. are in config.Config
-            driver = app.config['DB_DRIVER']
-            server = app.config['DB_SERVER']
-            name = app.config['DB_NAME']
-            user = app.config['DB_USER']
-            password = app.config['DB_PASSWORD']
-            conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={name};UID={user};PWD={password};Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=30;"
-            app.config['DB_CONNECTION_STRING'] = conn_str # Store it for potential reuse
-
-        conn = pyodbc.connect(conn_str)
-        return conn
-    except pyodbc.Error as e:
+        # Borrow from the shared pool; conn.close() hands it back
+        return profiled(db_pool.connect())
+    except (pyodbc.Error, PoolTimeout) as e:
         print(f"Database connection error: {e}")
         return None
     except KeyError as e:
@@ -110,10 +145,10 @@ def login_required(f):
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('misc_routes.login')) # Updated url_for
         
-        # Check if session is expired
+        # Check if session is expired (session_sweeper deletes abandoned ones on the same limit)
         if 'login_time' in session:
             login_time = datetime.fromisoformat(session['login_time'])
-            if datetime.now() - login_time > timedelta(minutes=30):
+            if datetime.now() - login_time > timedelta(seconds=app.config.get('SESSION_IDLE_TIMEOUT', 1800)):
                 session.clear()
                 flash('Your session has expired. Please log in again.', 'warning')
                 return redirect(url_for('misc_routes.login')) # Updated url_for
@@ -140,18 +175,8 @@ register_student_routes(app, get_db_connection, login_required)
 register_moderator_routes(app, get_db_connection)
 register_admin_routes(app, get_db_connection, validate_student_id)
 
-@app.route('/health')
-def health_check():
-    """Health check endpoint for Docker"""
-    try:
-        conn = get_db_connection()
-        if conn:
-            conn.close()
-            return {'status': 'healthy', 'timestamp': datetime.now().isoformat()}, 200
-        else:
-            return {'status': 'unhealthy', 'database': 'disconnected'}, 503
-    except Exception as e:
-        return {'status': 'unhealthy', 'error': str(e)}, 503
+# Maintenance commands (flask init-db, flask rebuild-tallies)
+register_cli_commands(app)
 
 # Global Error Handlers 
 # 401 error handler 
@@ -206,8 +231,15 @@ def handle_500(error):
     flash("An unexpected error occurred.", "error")
     return redirect(url_for('student_routes.dashboard')), 302
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False)
+# Also sent by nginx (nginx/nginx.conf); browsers enforce both, so keep the two policies the same.
+# Templates use inline scripts and handlers, Bootstrap from jsDelivr and reCAPTCHA from Google.
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://www.google.com https://www.gstatic.com; "
+    "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+    "img-src 'self' data:; font-src 'self' https://cdn.jsdelivr.net; "
+    "frame-src https://www.google.com"
+)
 
 @app.after_request
 def set_security_headers(response):
@@ -215,10 +247,9 @@ def set_security_headers(response):
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['Permissions-Policy'] = "geolocation=(), microphone=(), camera=()"
     response.headers['Cross-Origin-Opener-Policy'] = 'same-origin'
-    response.headers['Cross-Origin-Embedder-Policy'] = 'require-corp'
     response.headers['Referrer-Policy'] = 'no-referrer-when-downgrade'
-    response.headers['Content-Security-Policy'] = (
-        "default-src 'self'; script-src 'self' https://www.google.com; "
-        "style-src 'self' https://cdn.jsdelivr.net; frame-src https://www.google.com"
-    )
-    return response
\ No newline at end of file
+    response.headers['Content-Security-Policy'] = CONTENT_SECURITY_POLICY
+    return response
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,94 @@
+# application/admin_dashboard.py
+import base64
+import json
+from flask import current_app
+from sqlalchemy import and_, exists, func, literal, or_, select, union_all
+from application.models import db, CCA, CCAPurge, Student, User
+from application.cache import TTLCache
+
+# The admin dashboard renders only its summary counters; each panel then loads
+# its rows a page at a time from /admin/api/dashboard/<panel>. Panels are sorted
+# by (Name, id) and paged by keyset on that pair, which the name indexes in
+# models.py serve, so every page costs the same however many students exist.
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+_counts = TTLCache(ttl=60, maxsize=1)
+
+# ───────────────────────────────────────────────────────────
+def _ccas():
+    query = db.session.query(CCA.CCAId.label('id'), CCA.Name, CCA.Description).filter(~_purging())
+    return query, CCA.Name, CCA.CCAId
+
+def _purging():
+    # Soft-deleted CCAs stay in the table until the background purge reaches them
+    return exists().where(CCAPurge.CCAId == CCA.CCAId)
+
+def _students():
+    return db.session.query(Student.StudentId.label('id'), Student.Name, Student.Email), \
+        Student.Name, Student.StudentId
+
+def _password_setup():
+    # Accounts created but still waiting for the student to set a password
+    query = db.session.query(Student.StudentId.label('id'), Student.Name, Student.Email) \
+        .join(User, User.StudentId == Student.StudentId).filter(User.Password == None)
+    return query, Student.Name, Student.StudentId
+
+# Panel name -> builder returning (query, sort column, tiebreak id column)
+PANELS = {
+    'ccas': _ccas,
+    'students': _students,
+    'password-setup': _password_setup,
+}
+
+# ───────────────────────────────────────────────────────────
+def dashboard_counts():
+    """Summary counters for the dashboard, from one query cached for DASHBOARD_COUNTS_TTL seconds."""
+    counts = _counts.get('counts')
+    if counts is not None:
+        return counts
+
+    statement = union_all(
+        select(literal('ccas').label('kind'), func.count().label('n')).select_from(CCA).where(~_purging()),
+        select(literal('students').label('kind'), func.count().label('n')).select_from(Student),
+        select(literal('accounts').label('kind'), func.count().label('n'))
+        .select_from(User).where(User.StudentId != None),
+        select(literal('password-setup').label('kind'), func.count().label('n'))
+        .select_from(User).where(User.StudentId != None, User.Password == None),
+    )
+    counts = {kind: n for kind, n in db.session.execute(statement)}
+    _counts.set('counts', counts, ttl=current_app.config.get('DASHBOARD_COUNTS_TTL', 60))
+    return counts
+
+def invalidate_dashboard_counts():
+    _counts.clear()
+
+def dashboard_page(panel, cursor=None, limit=PAGE_SIZE):
+    """Return (rows, next_cursor) for one page of a panel; next_cursor is None on the last page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query, name_column, id_column = PANELS[panel]()
+
+    position = _decode_cursor(cursor)
+    if position:
+        name, row_id = position
+        query = query.filter(or_(name_column > name, and_(name_column == name, id_column > row_id)))
+
+    rows = query.order_by(name_column, id_column).limit(limit + 1).all()
+    page = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = _encode_cursor(page[-1]['Name'], page[-1]['id']) if len(rows) > limit else None
+    return page, next_cursor
+
+# ───────────────────────────────────────────────────────────
+def _encode_cursor(name, row_id):
+    return base64.urlsafe_b64encode(json.dumps([name, row_id]).encode()).decode()
+
+def _decode_cursor(cursor):
+    """Turn a cursor back into (name, id); a bad cursor starts from the first page."""
+    if not cursor:
+        return None
+    try:
+        name, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(name), int(row_id)
+    except (ValueError, TypeError):
+        return None
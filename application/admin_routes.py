@@ -1,11 +1,23 @@
-from flask import render_template, request, redirect, url_for, session, flash, Blueprint
+from flask import render_template, request, redirect, url_for, session, flash, Blueprint, current_app
 from email_service import email_service
 import bcrypt
+import io
 from datetime import datetime, timezone
-from application.auth_utils import admin_required
-from .models import db, CCA, Student, CCAMembers, User, Poll, PollOption, PollVote, LoginLog, AdminLog
+from application.auth_utils import admin_required, get_auth_context
+from application.cache_invalidation import membership_changed
+from application.student_search import search_response, student_index
+from application.cca_cascade import cca_purger, cca_size, delete_cca as cascade_delete_cca, is_pending_purge, soft_delete_cca
+from application.admin_dashboard import PANELS as DASHBOARD_PANELS, dashboard_counts, dashboard_page, invalidate_dashboard_counts
+from .models import db, CCA, Student, CCAMembers, User, Poll, EmailOutbox
 from application.auth_utils import log_admin_action
 from application.moderator_routes import sanitize_input
+from application.tally_service import poll_vote_totals
+from application.email_outbox import outbox_counts, retry_email, DEAD
+from application.provisioning import provision_students, read_student_ids, summarize, CREATED
+from application.log_explorer import parse_filters, query_logs, log_counts
+
+# Query args the log explorer understands
+LOG_FILTER_ARGS = ('log_type', 'user', 'ip', 'success', 'date_from', 'date_to')
 
 # Create a Blueprint
 admin_bp = Blueprint('admin_routes', __name__, url_prefix='/admin')
@@ -15,44 +27,33 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
     @admin_bp.route('/')
     @admin_required
     def admin_dashboard():
+        # Only the counters are rendered here; the panels load their rows from dashboard_api
+        log_admin_action(session["user_id"], "Admin login successful")
         try:
-            # Get all CCAs
-            all_ccas = CCA.query.order_by(CCA.Name).all()
-            # Retrieves all CCAs, ordered by name.
-            log_admin_action(session["user_id"], "Admin login successful")
-            # Get all students
-            all_students = Student.query.order_by(Student.Name).all()
-            
-            # Get CCA memberships with details
-            memberships = db.session.query(
-                Student.Name.label('StudentName'),
-                CCA.Name.label('CCAName'),
-                CCAMembers.CCARole,
-                Student.StudentId,
-                CCA.CCAId,
-                CCAMembers.MemberId
-            ).join(User, CCAMembers.UserId == User.UserId).join(Student).join(CCA).order_by(CCA.Name, Student.Name).all()
-
-            # Get students who need password setup (Password is NULL)
-            students_needing_password_setup = db.session.query(
-                Student.StudentId, Student.Name, Student.Email
-            ).join(User).filter(User.Password == None).order_by(Student.Name).all()
-            
-            return render_template('admin_dashboard.html',
-                                ccas=all_ccas,
-                                students=all_students,
-                                memberships=memberships,
-                                students_needing_password_setup=students_needing_password_setup,
-                                user_name=session['name'])
-            
+            counts = dashboard_counts()
         except Exception as e:
             print(f"Admin dashboard error: {e}")
-            log_admin_action(session["user_id"],f"[ERROR] Failed to render logs page: {str(e)}")
             flash('Error loading admin dashboard.', 'error')
-            return render_template('admin_dashboard.html', 
-                                ccas=[], students=[], memberships=[],
-                                students_needing_password_setup=[],
-                                user_name=session.get('name'))
+            counts = {}
+        return render_template('admin_dashboard.html', counts=counts, user_name=session.get('name'))
+
+    @admin_bp.route('/api/dashboard/<panel>')
+    @admin_required
+    def dashboard_api(panel):
+        """Admin dashboard panel API: one page of ccas, students or password-setup. ?cursor, limit"""
+        if panel not in DASHBOARD_PANELS:
+            return {'error': 'Unknown panel.'}, 404
+        try:
+            limit = int(request.args.get('limit', 25))
+        except ValueError:
+            limit = 25
+        try:
+            rows, next_cursor = dashboard_page(panel, request.args.get('cursor'), limit)
+            total = dashboard_counts().get(panel, 0)
+        except Exception as e:
+            print(f"Dashboard API error: {e}")
+            return {'error': 'Could not load this panel.'}, 500
+        return {'rows': rows, 'next_cursor': next_cursor, 'total': total}
 
     @admin_bp.route('/create-student', methods=['GET', 'POST'])
     @admin_required
@@ -72,7 +73,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
             
             try:
                 # Check admin access
-                is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+                is_admin = get_auth_context(session["user_id"])['is_admin']
                 
                 if not is_admin:
                     flash('Access denied.', 'error')
@@ -95,13 +96,15 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 # Checks if a user account already exists for the given student ID.
                 if existing_account:
                     flash(f'Student {student_record.Name} (ID: {student_id}) already has a login account.', 'error')
-                    log_admin_action(f'Student already has a login account.')
+                    log_admin_action(session["user_id"], f'Student already has a login account.')
                     return render_template('create_student.html')
                 
                 # Create account with NULL password, student will set via email link
                 new_user = User(Username=student_id, StudentId=int(student_id), Password=None, SystemRole='student')
                 db.session.add(new_user)
                 db.session.commit()
+                student_index.accounts_changed(int(student_id))
+                invalidate_dashboard_counts()
 
                 log_admin_action(session["user_id"], f"Created login for student ID {student_id}")
                 
@@ -113,18 +116,18 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 
                 if student_email:
                     try:
-                        # Generate password reset token and send setup email
-                        token = email_service.generate_password_reset_token(student_id)
+                        # Queue the setup email; the outbox worker delivers it (with retries)
                         email_sent = email_service.send_student_credentials(
                             student_name=student_name,
                             student_email=student_email,
                             student_id=student_id,
-                            temp_password=None  # No temp password needed
+                            temp_password=None,  # No temp password needed
+                            background=True
                         )
                         
                         if email_sent:
-                            flash(f'{base_message} Password setup email sent to {student_email}. Student must set their password before they can login.', 'success')
-                            log_admin_action(session["user_id"],f'Password setup email sent to student. Student must set their password before they can login.')
+                            flash(f'{base_message} Password setup email queued for {student_email}. Student must set their password before they can login.', 'success')
+                            log_admin_action(session["user_id"],f'Password setup email queued for student. Student must set their password before they can login.')
                         else:
                             flash(f'{base_message} However, email notification failed. Please provide password setup link manually.', 'warning')
                             log_admin_action(session["user_id"],f'However, email notification failed. Please provide password setup link manually.')
@@ -161,7 +164,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
             
             try:
                 # Check admin access
-                is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+                is_admin = get_auth_context(session["user_id"])['is_admin']
                 
                 if not is_admin:
                     flash('Access denied.', 'error')
@@ -179,6 +182,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 new_cca = CCA(Name=name, Description=description or '')
                 db.session.add(new_cca)
                 db.session.commit()
+                invalidate_dashboard_counts()
 
                 log_admin_action(session["user_id"], f"Created CCA: {name}")
 
@@ -200,7 +204,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
     def view_cca(cca_id):
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -211,7 +215,8 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
             # Get CCA details
             cca = CCA.query.get(cca_id)
             
-            if not cca:
+            # A CCA waiting to be purged is already deleted as far as anyone can see
+            if not cca or is_pending_purge(cca_id):
                 flash('CCA not found.', 'error')
                 log_admin_action(session["user_id"],'CCA not found.')
                 return redirect(url_for('admin_routes.admin_dashboard'))
@@ -249,7 +254,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -295,7 +300,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -317,6 +322,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
             new_member = CCAMembers(UserId=user_id, CCAId=cca_id, CCARole=role)
             db.session.add(new_member)
             db.session.commit()
+            membership_changed(user_id)
 
             log_admin_action(session["user_id"], f"Added student {student_id} to CCA {cca_id} as {role}")
 
@@ -335,7 +341,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
     def remove_student_from_cca(cca_id, member_id):
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -344,8 +350,10 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 return redirect(url_for('student_routes.dashboard'))
             
             # Deletes a CCA membership entry by member and CCA ID.
+            removed_user_ids = [m.UserId for m in db.session.query(CCAMembers.UserId).filter_by(MemberId=member_id, CCAId=cca_id)]
             CCAMembers.query.filter_by(MemberId=member_id, CCAId=cca_id).delete()
             db.session.commit()
+            membership_changed(*removed_user_ids)
 
             log_admin_action(session["user_id"], f"Removed member {member_id} from CCA {cca_id}")
 
@@ -365,7 +373,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
     def delete_cca(cca_id):
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -383,25 +391,26 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
             
             cca_name = cca_result.Name
             
-            # Deletes all memberships for a given CCA.
-            CCAMembers.query.filter_by(CCAId=cca_id).delete()
-
-            # Deletes all votes for polls associated with the CCA.
-            poll_ids = [p.PollId for p in Poll.query.filter_by(CCAId=cca_id).all()]
-            PollVote.query.filter(PollVote.PollId.in_(poll_ids)).delete(synchronize_session=False)
+            member_user_ids = [m.UserId for m in db.session.query(CCAMembers.UserId).filter_by(CCAId=cca_id)]
 
-            # Deletes all options for polls associated with the CCA.
-            PollOption.query.filter(PollOption.PollId.in_(poll_ids)).delete(synchronize_session=False)
+            # Large CCAs are hidden now and purged in chunks in the background
+            if cca_size(cca_id) > current_app.config.get('CCA_PURGE_ASYNC_THRESHOLD', 20000):
+                soft_delete_cca(cca_id, session["user_id"])
+                membership_changed(*member_user_ids)
+                invalidate_dashboard_counts()
+                cca_purger.wake()
 
-            # Deletes all polls for a given CCA.
-            Poll.query.filter_by(CCAId=cca_id).delete()
+                log_admin_action(session["user_id"], f"Deleted CCA '{cca_name}' (ID: {cca_id}); purging its polls and votes in the background")
+                flash(f'CCA "{cca_name}" deleted. Its polls and votes are being removed in the background.', 'success')
+                return redirect(url_for('admin_routes.admin_dashboard'))
 
-            # Deletes the CCA itself.
-            CCA.query.filter_by(CCAId=cca_id).delete()
-            
-            db.session.commit()
+            # Memberships, polls, options, votes, ballots, tallies and vote tokens in one transaction
+            counts = cascade_delete_cca(cca_id)
+            membership_changed(*member_user_ids)
+            invalidate_dashboard_counts()
 
-            log_admin_action(session["user_id"], f"Deleted CCA '{cca_name}' (ID: {cca_id})")
+            summary = ', '.join(f"{table}: {count}" for table, count in counts.items())
+            log_admin_action(session["user_id"], f"Deleted CCA '{cca_name}' (ID: {cca_id}) - {summary}")
             flash(f'CCA "{cca_name}" and all related data deleted successfully!', 'success')
             return redirect(url_for('admin_routes.admin_dashboard'))
             
@@ -418,14 +427,12 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         """API endpoint to search for students by name or student ID"""
         search_query = sanitize_input(request.args.get('q', ''), max_length=100)
 
-        cca_id = request.args.get('cca_id', '')
-        
         if not search_query or len(search_query) < 2:
             return {'students': []}
         
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -433,23 +440,10 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 log_admin_action(session["user_id"],f'DEBUG: Not admin, unauthorised to view.')
                 return redirect(url_for('student_routes.dashboard'))
             
-            # Searches for students not in a CCA by name or ID.
-            search_pattern = f'%{search_query}%'
-            subquery = db.session.query(CCAMembers.UserId).filter(CCAMembers.CCAId == cca_id)
-            students = db.session.query(Student.StudentId, Student.Name, Student.Email).join(User).filter(
-                db.or_(Student.Name.like(search_pattern), db.cast(Student.StudentId, db.String).like(search_pattern)),
-                User.UserId.notin_(subquery)
-            ).order_by(Student.Name).all()
-            
-            result = []
-            for student in students:
-                result.append({
-                    'student_id': student.StudentId,
-                    'name': student.Name,
-                    'email': student.Email
-                })
+            # Searches for students not in a CCA by name or ID, from the in-memory index
+            result = student_index.search(search_query, cca_id=request.args.get('cca_id', type=int))
             
-            return {'students': result}
+            return search_response(result)
             
         except Exception as e:
             print(f"Search students error: {e}")
@@ -470,7 +464,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -500,6 +494,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
             if new_members:
                 db.session.bulk_insert_mappings(CCAMembers, new_members)
                 db.session.commit()
+                membership_changed(*(m['UserId'] for m in new_members))
 
                 log_admin_action(session["user_id"], f"Bulk added {len(new_members)} students to CCA {cca_id} as {role}")
 
@@ -523,7 +518,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         """Resend password setup email for a student who hasn't set their password yet"""
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None
+            is_admin = get_auth_context(session["user_id"])['is_admin']
             
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -552,18 +547,18 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
 
             if student_email:
                 try:
-                    # Generate password reset token and send setup email
-                    token = email_service.generate_password_reset_token(student_id)
+                    # Queue the setup email; the outbox worker delivers it (with retries)
                     email_sent = email_service.send_student_credentials(
                         student_name=student_name,
                         student_email=student_email,
                         student_id=student_id,
-                        temp_password=None  # No temp password needed
+                        temp_password=None,  # No temp password needed
+                        background=True
                     )
                     
                     if email_sent:
-                        flash(f'Password setup email resent to {student_email}.', 'success')
-                        log_admin_action(session["user_id"],f'Password setup email resent to {student_email}.')
+                        flash(f'Password setup email queued for {student_email}.', 'success')
+                        log_admin_action(session["user_id"],f'Password setup email queued for {student_email}.')
                     else:
                         flash('Email notification failed. Please try again.', 'error')
                         log_admin_action(session["user_id"],"Email notification failed. Please try again.")
@@ -589,7 +584,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         """Admin view to see all CCAs with member counts"""
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -620,7 +615,7 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
         """Admin view to see all polls in the system"""
         try:
             # Check admin access
-            is_admin = db.session.query(User).filter_by(UserId=session["user_id"],SystemRole="admin").first() is not None 
+            is_admin = get_auth_context(session["user_id"])['is_admin']
                 
             if not is_admin:
                 flash('Access denied.', 'error')
@@ -628,7 +623,8 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 log_admin_action(session["user_id"],'Access denied.')
                 return redirect(url_for('student_routes.dashboard'))
             
-            # Retrieves all polls with CCA info and vote counts.
+            # Retrieves all polls with CCA info and vote counts from the tallies.
+            vote_totals = poll_vote_totals()
             polls_data = db.session.query(
                 Poll.PollId,
                 Poll.Question,
@@ -638,10 +634,9 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
                 Poll.IsAnonymous,
                 Poll.IsActive,
                 CCA.Name.label('CCAName'),
-                db.func.count(PollVote.VoteId).label('VoteCount')
-            ).join(CCA).outerjoin(PollVote).group_by(
-                Poll.PollId, Poll.Question, Poll.QuestionType, Poll.StartDate, Poll.EndDate,
-                Poll.IsAnonymous, Poll.IsActive, CCA.Name            ).order_by(Poll.EndDate.desc(), Poll.StartDate.desc()).all()
+                db.func.coalesce(vote_totals.c.VoteCount, 0).label('VoteCount')
+            ).join(CCA).outerjoin(vote_totals, vote_totals.c.PollId == Poll.PollId) \
+             .order_by(Poll.EndDate.desc(), Poll.StartDate.desc()).all()
             
             processed_polls = []
             for poll in polls_data:
@@ -685,48 +680,108 @@ def register_admin_routes(app, get_db_connection, validate_student_id):
     @admin_bp.route('/logs')
     @admin_required
     def view_logs():
-        # Get the total number of logs, categorized by type
-        total_logs = db.session.query(AdminLog).count() + db.session.query(LoginLog).count()
-        authentication_logs = db.session.query(LoginLog).count()
-        authorization_logs = db.session.query(AdminLog).filter(AdminLog.Action == 'Authorization').count()
-        data_changes_logs = db.session.query(AdminLog).filter(AdminLog.Action == 'Data Change').count()
-        security_issues_logs = db.session.query(AdminLog).filter(AdminLog.Action == 'Security Issue').count()
-        system_events_logs = db.session.query(AdminLog).filter(AdminLog.Action == 'System Event').count()
-
-        # Get recent logs
-        login_logs = (
-            db.session.query(LoginLog, User)
-            .outerjoin(User, LoginLog.UserId == User.UserId)
-            .order_by(LoginLog.Timestamp.desc())
-            .limit(50)
-            .all()
-        )
-
-        admin_logs = (
-            db.session.query(AdminLog, User)
-            .outerjoin(User, AdminLog.AdminUserId == User.UserId)
-            .order_by(AdminLog.Timestamp.desc())
-            .limit(50)
-            .all()
-        )
-
-        logs = sorted(
-            [('auth', log, user) for log, user in login_logs] +
-            [('admin', log, user) for log, user in admin_logs],
-            key=lambda x: x[1].Timestamp,
-            reverse=True
-        )
+        filters = parse_filters(request.args)
+        try:
+            logs, next_cursor = query_logs(filters, request.args.get('cursor'))
+            counts = log_counts()
+        except Exception as e:
+            print(f"View logs error: {e}")
+            flash('Error loading logs.', 'error')
+            return redirect(url_for('admin_routes.admin_dashboard'))
+
+        # Filters carried into the "Older" link and the form
+        filter_args = {name: request.args[name] for name in LOG_FILTER_ARGS if request.args.get(name)}
 
         # Pass the counts and logs to the template
-        return render_template('admin_logs.html', 
+        return render_template('admin_logs.html',
                             user_name=session['name'],
                             logs=logs,
-                            total_logs=total_logs,
-                            authentication_logs=authentication_logs,
-                            authorization_logs=authorization_logs,
-                            data_changes_logs=data_changes_logs,
-                            security_issues_logs=security_issues_logs,
-                            system_events_logs=system_events_logs)
+                            next_cursor=next_cursor,
+                            is_first_page=not request.args.get('cursor'),
+                            filter_args=filter_args,
+                            **counts)
+
+    @admin_bp.route('/api/logs')
+    @admin_required
+    def logs_api():
+        """Log explorer API: ?log_type, user, ip, success, date_from, date_to, cursor, limit"""
+        try:
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            limit = 50
+        try:
+            logs, next_cursor = query_logs(parse_filters(request.args), request.args.get('cursor'), limit)
+        except Exception as e:
+            print(f"Logs API error: {e}")
+            return {'error': 'Could not load logs.'}, 500
+
+        for log in logs:
+            log['timestamp'] = log['timestamp'].isoformat()
+        return {'logs': logs, 'next_cursor': next_cursor}
+
+    @admin_bp.route('/provision-students', methods=['GET', 'POST'])
+    @admin_required
+    def provision_students_view():
+        if request.method == 'POST':
+            upload = request.files.get('students_csv')
+            if not upload or not upload.filename:
+                flash('Please choose a CSV file of student IDs.', 'error')
+                return render_template('admin_provision_students.html', user_name=session['name'])
+
+            try:
+                # Stream the upload rather than reading it all into memory
+                stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+                outcomes = provision_students(read_student_ids(stream))
+                invalidate_dashboard_counts()
+                summary = summarize(outcomes)
+
+                log_admin_action(session["user_id"], f"Bulk provisioned student accounts from {upload.filename}: {summary}")
+                flash(f"Processed {len(outcomes)} rows: {summary.get(CREATED, 0)} accounts created.", 'success')
+                return render_template('admin_provision_students.html',
+                                    user_name=session['name'],
+                                    outcomes=outcomes,
+                                    summary=summary)
+            except UnicodeDecodeError:
+                flash('The file must be a UTF-8 CSV.', 'error')
+            except Exception as e:
+                db.session.rollback()
+                print(f"Bulk provisioning error: {e}")
+                log_admin_action(session["user_id"], f"[ERROR] Bulk provisioning failed: {str(e)}")
+                flash('An error occurred while provisioning accounts. Please try again.', 'error')
+
+        return render_template('admin_provision_students.html', user_name=session['name'])
+
+    @admin_bp.route('/email-outbox')
+    @admin_required
+    def email_outbox_view():
+        try:
+            # Messages that used up their retries, most recent first
+            dead_letters = EmailOutbox.query.filter_by(Status=DEAD) \
+                .order_by(EmailOutbox.CreatedAt.desc()).limit(100).all()
+
+            return render_template('admin_email_outbox.html',
+                                user_name=session['name'],
+                                counts=outbox_counts(),
+                                dead_letters=dead_letters)
+        except Exception as e:
+            print(f"Error loading email outbox: {e}")
+            flash('Error loading email outbox.', 'error')
+            return redirect(url_for('admin_routes.admin_dashboard'))
+
+    @admin_bp.route('/email-outbox/<int:email_id>/retry', methods=['POST'])
+    @admin_required
+    def retry_outbox_email(email_id):
+        try:
+            if retry_email(email_id):
+                flash('Email queued for another delivery attempt.', 'success')
+                log_admin_action(session["user_id"], f"Requeued outbox email {email_id}")
+            else:
+                flash('Email not found, not in the dead-letter queue, or its student no longer exists.', 'error')
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error retrying outbox email {email_id}: {e}")
+            flash('Error retrying email. Please try again.', 'error')
+        return redirect(url_for('admin_routes.email_outbox_view'))
 
     # Register the blueprint with the app
     app.register_blueprint(admin_bp)
\ No newline at end of file
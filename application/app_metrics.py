@@ -0,0 +1,60 @@
+# application/app_metrics.py
+from flask import current_app
+from application.metrics import metrics, COUNTER
+from application.cache import TTLCache
+from application.db_pool import db_pool
+from application.password_hashing import password_hasher
+from application.audit_sink import audit_sink
+from application.vote_ingest import vote_ingestor
+from application.email_outbox import outbox_counts
+
+# Figures the rest of the app already keeps (pool, hasher, audit and vote
+# buffers, outbox), read only when /metrics is scraped. The outbox depth is a
+# database count, so it is cached for METRICS_DB_TTL seconds between scrapes.
+
+_outbox = TTLCache(ttl=15, maxsize=1)
+
+# ───────────────────────────────────────────────────────────
+def _labelled(stats, label, keys):
+    return [({label: key}, stats[key]) for key in keys]
+
+def _outbox_depth():
+    counts = _outbox.get('counts')
+    if counts is None:
+        counts = outbox_counts()
+        _outbox.set('counts', counts, ttl=current_app.config.get('METRICS_DB_TTL', 15))
+    return [({'status': status}, count) for status, count in counts.items()]
+
+def register_app_metrics(app):
+    """Expose pool, bcrypt, audit, vote and outbox figures at /metrics."""
+    # Database connection pool (wait time / checkouts gives the mean checkout wait)
+    metrics.collector('db_pool_connections', 'Pooled database connections, by state.',
+                      lambda: _labelled(db_pool.stats(), 'state', ('in_use', 'idle', 'open', 'max_size')))
+    metrics.collector('db_pool_checkouts_total', 'Connections checked out of the pool.',
+                      lambda: db_pool.stats()['checkouts'], kind=COUNTER)
+    metrics.collector('db_pool_wait_seconds_total', 'Time spent waiting to check out a connection.',
+                      lambda: db_pool.stats()['wait_time_total'], kind=COUNTER)
+    metrics.collector('db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection.',
+                      lambda: db_pool.stats()['timeouts'], kind=COUNTER)
+
+    # bcrypt process pool
+    metrics.collector('password_hash_in_flight', 'Password hashes running or queued.',
+                      lambda: password_hasher.stats()['in_flight'])
+    metrics.collector('password_hash_queue_limit', 'Password hashes allowed in flight before logins are turned away.',
+                      lambda: password_hasher.stats()['max_queue'])
+    metrics.collector('password_hash_rejected_total', 'Logins turned away because the hashing queue was full.',
+                      lambda: password_hasher.stats()['rejected'], kind=COUNTER)
+    metrics.collector('password_hash_wait_seconds_total', 'Time spent waiting for a hashing slot.',
+                      lambda: password_hasher.stats()['wait_time_total'], kind=COUNTER)
+
+    # Write-behind buffers
+    metrics.collector('audit_log_pending', 'Audit log rows buffered, not yet written.',
+                      lambda: audit_sink.stats()['pending'])
+    metrics.collector('audit_log_rows_total', 'Audit log rows, by outcome.',
+                      lambda: _labelled(audit_sink.stats(), 'outcome', ('written', 'overflowed', 'failed')),
+                      kind=COUNTER)
+    metrics.collector('vote_queue_pending', 'Ballots buffered, not yet committed.', vote_ingestor.pending)
+
+    # Same for every worker: read once per scrape
+    metrics.collector('email_outbox_messages', 'Messages in the email outbox, by status.', _outbox_depth,
+                      per_worker=False)
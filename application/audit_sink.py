@@ -0,0 +1,144 @@
+# application/audit_sink.py
+import atexit
+import queue
+import threading
+import time
+from sqlalchemy import insert
+from application.models import db
+from application.background import WorkerThreads
+
+# LoginLog and AdminLog rows are queued by request handlers and written by one
+# flusher thread per worker, as multi-row inserts once AUDIT_LOG_BATCH_SIZE rows
+# are waiting or AUDIT_LOG_FLUSH_INTERVAL has passed since the first one. Rows
+# carry their own timestamp, so batching doesn't change when an event happened.
+
+# SQL Server allows 2100 parameters per statement; multi-row inserts stay under it
+_MAX_PARAMS_PER_INSERT = 2000
+
+
+class AuditSink:
+    """Write-behind buffer for audit log rows, drained by one flusher thread per worker process."""
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._writing = threading.Lock()   # held by the flusher while a batch is in flight
+        self._queue = None
+        self._threads = WorkerThreads(self._start_flusher)
+        self._metrics = {
+            'queued': 0,
+            'written': 0,
+            'batches': 0,
+            'overflowed': 0,     # queue full; written by the request thread instead
+            'failed': 0,         # couldn't be written at all; printed to the log instead
+        }
+
+    def init_app(self, app):
+        self._app = app
+        if 'audit_sink' not in app.extensions:
+            app.extensions['audit_sink'] = self
+            self._threads.init_app(app)
+            # Whatever is still buffered when the process exits gets written first
+            atexit.register(self.flush)
+
+    def record(self, model, row):
+        """Queue one row for `model` (a dict of column values)."""
+        if not self._app.config.get('AUDIT_LOG_BATCHING', True):
+            self._write([(model, row)])
+            return
+        try:
+            self._buffer().put_nowait((model, row))
+        except queue.Full:
+            # Never drop an audit record: the caller pays for the insert instead
+            self._count('overflowed')
+            self._write([(model, row)])
+            return
+        self._count('queued')
+
+    def flush(self):
+        """Write everything queued in this process now, e.g. at shutdown."""
+        if self._queue is None or not self._threads.started:
+            return
+        # Let a batch the flusher already took finish first
+        if not self._writing.acquire(timeout=5):
+            print("Audit flusher still busy at shutdown; flushing the rest anyway")
+        else:
+            self._writing.release()
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            with self._app.app_context():
+                self._write(batch)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['pending'] = self._queue.qsize() if self._queue is not None and self._threads.started else 0
+        return stats
+
+    # ───────────────────────────────────────────────────────────
+    def _buffer(self):
+        self._threads.ensure_started()
+        return self._queue
+
+    def _start_flusher(self):
+        self._queue = queue.Queue(maxsize=self._app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+        threading.Thread(target=self._run, args=(self._queue,), name="audit-flusher", daemon=True).start()
+
+    def _run(self, pending):
+        config = self._app.config
+        batch_size = config.get('AUDIT_LOG_BATCH_SIZE', 200)
+        interval = config.get('AUDIT_LOG_FLUSH_INTERVAL', 0.5)
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self._writing, self._app.app_context():
+                self._write(batch)
+
+    def _write(self, batch):
+        """Insert a batch of (model, row) pairs. Never raises."""
+        try:
+            self._insert(batch)
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                # Keep the good rows: retry one at a time so a bad row only costs itself
+                print(f"Error writing {len(batch)} audit log rows, retrying individually: {e}")
+                for item in batch:
+                    self._write([item])
+                return
+            model, row = batch[0]
+            print(f"Audit log row could not be saved to {model.__tablename__}: {row} ({e})")
+            self._count('failed')
+            return
+        self._count('batches')
+        self._count('written', len(batch))
+
+    def _insert(self, batch):
+        rows_by_model = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+        for model, rows in rows_by_model.items():
+            rows_per_insert = _MAX_PARAMS_PER_INSERT // len(rows[0])
+            for start in range(0, len(rows), rows_per_insert):
+                db.session.execute(insert(model).values(rows[start:start + rows_per_insert]))
+        db.session.commit()
+
+    def _count(self, metric, amount=1):
+        with self._lock:
+            self._metrics[metric] += amount
+
+
+audit_sink = AuditSink()
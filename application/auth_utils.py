@@ -1,9 +1,122 @@
 # application/auth_utils.py
+from datetime import datetime
 from functools import wraps
-from flask import session, redirect, url_for, flash, request
-from application.models import db, User, CCAMembers
+from flask import session, redirect, url_for, flash, request, current_app, g
+from sqlalchemy import and_, case, exists, or_, update
+from application.models import db, User, Student, CCAMembers
 from application.models import LoginLog, db
 from application.models import AdminLog, db
+from application.cache import TTLCache
+from application.audit_sink import audit_sink
+
+# Role and membership lookups per user, shared by the decorators and handlers.
+# Writes that change membership call invalidate_auth_context(); other gunicorn
+# workers pick the change up once AUTH_CONTEXT_TTL expires.
+_auth_contexts = TTLCache(ttl=30)
+
+# ───────────────────────────────────────────────────────────
+def get_auth_context(user_id):
+    """Return the user's system role and CCA memberships, loading them in one query if not cached."""
+    context = _auth_contexts.get(user_id)
+    if context is not None:
+        return context
+
+    rows = db.session.query(User.SystemRole, CCAMembers.CCAId, CCAMembers.CCARole) \
+        .outerjoin(CCAMembers, CCAMembers.UserId == User.UserId) \
+        .filter(User.UserId == user_id).all()
+
+    system_role = rows[0][0] if rows else None
+    context = {
+        'system_role': system_role,
+        'is_admin': system_role == 'admin',
+        'member_cca_ids': frozenset(row[1] for row in rows if row[1] is not None),
+        'moderated_cca_ids': frozenset(row[1] for row in rows if row[2] == 'moderator'),
+    }
+    _auth_contexts.set(user_id, context, ttl=current_app.config.get('AUTH_CONTEXT_TTL', 30))
+    return context
+
+def invalidate_auth_context(*user_ids):
+    """Drop cached contexts after a membership change so the next request reloads them."""
+    for user_id in user_ids:
+        _auth_contexts.pop(user_id)
+
+def is_cca_moderator(cca_id):
+    """True if the logged-in user moderates the given CCA."""
+    try:
+        cca_id = int(cca_id)
+    except (TypeError, ValueError):
+        return False
+    return cca_id in get_auth_context(session['user_id'])['moderated_cca_ids']
+
+def is_any_cca_moderator():
+    """True if the logged-in user moderates at least one CCA."""
+    return bool(get_auth_context(session['user_id'])['moderated_cca_ids'])
+
+# ───────────────────────────────────────────────────────────
+# UserDetails columns a login attempt may change, and their keys in an identity
+_LOGIN_STATE_FIELDS = {
+    'Password': 'password',
+    'FailedLoginAttempts': 'failed_attempts',
+    'IsLocked': 'is_locked',
+    'LastFailedLogin': 'last_failed_login',
+}
+
+def resolve_identity(identifier, by='username'):
+    """Load everything login needs about an account in one query, reused for the rest of the request.
+
+    `by` is 'email', 'student_id' or 'username'. An admin whose username matches
+    takes precedence, as in the admin special case. Returns a dict, or None.
+    """
+    identities = g.setdefault('identities', {})
+    if (by, identifier) in identities:
+        return identities[(by, identifier)]
+
+    if by == 'email':
+        match = Student.Email == identifier
+    elif by == 'student_id':
+        match = User.StudentId == int(identifier)
+    else:
+        match = User.Username == identifier
+    # CASE rather than a bare EXISTS: SQL Server doesn't allow predicates in the select list
+    is_moderator = case(
+        (exists().where(CCAMembers.UserId == User.UserId, CCAMembers.CCARole == 'moderator'), 1), else_=0
+    ).label('IsModerator')
+
+    rows = db.session.query(
+        User.UserId, User.Username, User.Password, User.SystemRole, User.StudentId, User.MFATOTPSecret,
+        User.FailedLoginAttempts, User.IsLocked, User.LastFailedLogin, User.PasswordLastSet,
+        Student.Name, Student.Email, is_moderator
+    ).outerjoin(Student, Student.StudentId == User.StudentId) \
+        .filter(or_(and_(User.SystemRole == 'admin', User.Username == identifier), match)).all()
+
+    identity = None
+    if rows:
+        row = next((row for row in rows if row.SystemRole == 'admin' and row.Username == identifier), rows[0])
+        identity = {
+            'user_id': row.UserId,
+            'username': row.Username,
+            'password': row.Password,
+            'system_role': row.SystemRole,
+            'student_id': row.StudentId,
+            'mfa_secret': row.MFATOTPSecret,
+            'failed_attempts': row.FailedLoginAttempts or 0,
+            'is_locked': bool(row.IsLocked),
+            'last_failed_login': row.LastFailedLogin,
+            'password_last_set': row.PasswordLastSet,
+            'name': row.Name,
+            'email': row.Email,
+            'is_moderator': bool(row.IsModerator),
+        }
+    identities[(by, identifier)] = identity
+    return identity
+
+def save_login_state(identity, **changes):
+    """Stage UserDetails changes for this account and mirror them into the identity; the caller commits."""
+    if not changes:
+        return
+    db.session.execute(update(User).where(User.UserId == identity['user_id']).values(**changes))
+    for column, value in changes.items():
+        identity[_LOGIN_STATE_FIELDS[column]] = value
 
 # ───────────────────────────────────────────────────────────
 def _mfa_guard():
@@ -42,10 +155,7 @@ def admin_required(f):
 
         try:
             # Check if user is an admin
-            is_admin = db.session.query(User).filter_by(
-                UserId=session["user_id"],
-                SystemRole="admin"
-            ).first() is not None
+            is_admin = get_auth_context(session["user_id"])['is_admin']
 
             if not is_admin:
                 flash("Access denied.", "error")
@@ -78,10 +188,7 @@ def moderator_required(f):
         
         try:
             # Check if user is a moderator in any CCA
-            is_moderator = db.session.query(CCAMembers).filter_by(
-                UserId=session['user_id'],
-                CCARole='moderator'
-            ).first() is not None
+            is_moderator = is_any_cca_moderator()
 
             if not is_moderator:
                 flash("Access denied.", "error")
@@ -97,23 +204,23 @@ def moderator_required(f):
     return decorated
 
 # ───────────────────────────────────────────────────────────
+# Both logs go through audit_sink: the row is queued with its own timestamp and
+# written within AUDIT_LOG_FLUSH_INTERVAL, so callers must commit their own changes.
 def log_login_attempt(username, user_id, success, reason=None):
-    log = LoginLog(
-        Username=username,
-        UserId=user_id,
-        IPAddress=request.remote_addr,
-        Success=success,
-        Reason=reason
-    )
-    db.session.add(log)
-    db.session.commit()
+    audit_sink.record(LoginLog, {
+        'Username': username,
+        'UserId': user_id,
+        'IPAddress': request.remote_addr,
+        'Timestamp': datetime.utcnow(),
+        'Success': success,
+        'Reason': reason[:255] if reason else reason,
+    })
 
 # ───────────────────────────────────────────────────────────
 def log_admin_action(admin_user_id, action_desc):
-    log = AdminLog(
-        AdminUserId=admin_user_id,
-        Action=action_desc,
-        IPAddress=request.remote_addr
-    )
-    db.session.add(log)
-    db.session.commit()
\ No newline at end of file
+    audit_sink.record(AdminLog, {
+        'AdminUserId': admin_user_id,
+        'Action': action_desc[:255],
+        'Timestamp': datetime.utcnow(),
+        'IPAddress': request.remote_addr,
+    })
@@ -0,0 +1,52 @@
+# application/background.py
+import os
+import threading
+from functools import partial
+
+# Background threads (audit and vote flushers, mail senders, the session sweeper,
+# health checks, metrics snapshots) belong to one worker process. gunicorn loads
+# the app in the master and forks the workers from it, and a forked child has
+# none of its parent's threads, so each worker has to start its own.
+#
+# Components hand a start function to WorkerThreads and register it on the app.
+# gunicorn.conf.py's post_fork starts everything registered before the worker
+# takes a request; the Flask dev server never forks, so there the first request
+# starts them instead. A component may also call ensure_started() itself before
+# it needs its threads, e.g. from a CLI command.
+
+
+class WorkerThreads:
+    """Runs a component's start function once in each process."""
+
+    def __init__(self, start):
+        self._start = start
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def init_app(self, app):
+        """Start with the app's other background threads."""
+        registered = app.extensions.setdefault('worker_threads', [])
+        if not registered:
+            app.before_request(partial(start_worker_threads, app))
+        if self not in registered:
+            registered.append(self)
+
+    @property
+    def started(self):
+        """Whether the threads are running in this process."""
+        return self._pid == os.getpid()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._start()
+            self._pid = os.getpid()
+
+# ───────────────────────────────────────────────────────────
+def start_worker_threads(app):
+    """Start every registered component's threads in this process, if not already running."""
+    for threads in app.extensions.get('worker_threads', ()):
+        threads.ensure_started()
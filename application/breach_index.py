@@ -0,0 +1,192 @@
+# application/breach_index.py
+import gzip
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import requests
+from flask import current_app
+from application.cache import TTLCache
+
+# Offline breached-password check. The index is built once from the Have I Been
+# Pwned SHA-1 dump (lines of "HASH:COUNT", sorted by hash) and memory-mapped, so
+# every worker shares one copy through the page cache and a lookup is a binary
+# search over a few thousand records with no network involved.
+#
+# File layout (little-endian header, big-endian records so bytes sort like hashes):
+#   8 bytes   magic
+#   8 bytes   record count
+#   65537 x 8 bytes   start record of each bucket (first 2 bytes of the hash); last = count
+#   count x 8 bytes   bytes 2..9 of each hash, sorted
+# 16 bucket bits + 64 stored bits make accidental matches negligible even for
+# a billion hashes, at under half the size of storing full digests.
+
+MAGIC = b'CCAPBRX1'
+_BUCKETS = 1 << 16
+_RECORD_SIZE = 8
+_HEADER = struct.Struct('<8sQ')
+_OFFSETS = struct.Struct(f'<{_BUCKETS + 1}Q')
+_DATA_START = _HEADER.size + _OFFSETS.size
+
+PWNED_RANGE_URL = "https://api.pwnedpasswords.com/range/{prefix}"
+
+
+class BreachIndexError(Exception):
+    pass
+
+
+class BreachIndex:
+    """Read-only view of an index file built by build_index()."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise BreachIndexError(f"{path} is not a breached-password index")
+        self._offsets = _OFFSETS.unpack_from(self._mm, _HEADER.size)
+
+    def __len__(self):
+        return self.count
+
+    def contains_hash(self, digest):
+        """True if a 20-byte SHA-1 digest is in the index."""
+        bucket = (digest[0] << 8) | digest[1]
+        key = digest[2:2 + _RECORD_SIZE]
+        lo, hi = self._offsets[bucket], self._offsets[bucket + 1]
+        mm = self._mm
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = _DATA_START + mid * _RECORD_SIZE
+            record = mm[start:start + _RECORD_SIZE]
+            if record < key:
+                lo = mid + 1
+            elif record > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains_password(self, password):
+        return self.contains_hash(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def close(self):
+        self._mm.close()
+
+# ───────────────────────────────────────────────────────────
+def build_index(source_path, output_path, min_count=1):
+    """Build an index file from a HIBP SHA-1 dump (plain or .gz). Returns the number of hashes stored.
+
+    The dump must be sorted by hash, as the official downloads are. Hashes seen
+    fewer than `min_count` times can be skipped to shrink the file.
+    """
+    counts = [0] * _BUCKETS
+    opener = gzip.open if source_path.endswith('.gz') else open
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    stored = 0
+    previous = b''
+    with tempfile.TemporaryFile(dir=output_dir) as records:
+        with opener(source_path, 'rt', encoding='ascii') as source:
+            for line_number, line in enumerate(source, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                hash_hex, _, count = line.partition(':')
+                try:
+                    digest = bytes.fromhex(hash_hex)
+                except ValueError:
+                    digest = b''
+                if len(digest) != 20:
+                    raise BreachIndexError(f"Line {line_number}: expected a SHA-1 hash, got {hash_hex[:40]!r}")
+                if digest <= previous:
+                    raise BreachIndexError(f"Line {line_number}: dump is not sorted by hash")
+                previous = digest
+
+                if count and int(count) < min_count:
+                    continue
+                records.write(digest[2:2 + _RECORD_SIZE])
+                counts[(digest[0] << 8) | digest[1]] += 1
+                stored += 1
+
+        offsets = [0] * (_BUCKETS + 1)
+        for bucket, count in enumerate(counts):
+            offsets[bucket + 1] = offsets[bucket] + count
+
+        # Write next to the target and rename, so running workers never see a half-built file
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(_HEADER.pack(MAGIC, stored))
+                out.write(_OFFSETS.pack(*offsets))
+                records.seek(0)
+                shutil.copyfileobj(records, out, 1 << 20)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return stored
+
+# ───────────────────────────────────────────────────────────
+_index = None
+_index_lock = threading.Lock()
+_index_missing_logged = False
+
+# Range responses keyed by 5-character prefix, for api/hybrid mode
+_ranges = TTLCache(ttl=86400, maxsize=4096)
+
+def get_index():
+    """Open the configured index once per process, or return None if there isn't one."""
+    global _index, _index_missing_logged
+    path = current_app.config.get('BREACHED_PASSWORD_INDEX', 'data/pwned-passwords.idx')
+    if _index is not None and _index.path == path:
+        return _index
+
+    with _index_lock:
+        if _index is None or _index.path != path:
+            if not os.path.exists(path):
+                if not _index_missing_logged:
+                    print(f"Breached-password index not found at {path}")
+                    _index_missing_logged = True
+                return None
+            _index = BreachIndex(path)
+        return _index
+
+def _range_suffixes(prefix):
+    suffixes = _ranges.get(prefix)
+    if suffixes is None:
+        response = requests.get(PWNED_RANGE_URL.format(prefix=prefix), timeout=5)
+        response.raise_for_status()
+        suffixes = frozenset(line.split(':', 1)[0] for line in response.text.splitlines())
+        _ranges.set(prefix, suffixes, ttl=current_app.config.get('BREACHED_PASSWORD_CACHE_TTL', 86400))
+    return suffixes
+
+def is_breached(password):
+    """Check a password against breach data according to BREACHED_PASSWORD_MODE.
+
+    index:  local index only, never touches the network
+    api:    HIBP range API, with responses cached per prefix
+    hybrid: the local index when one is installed, otherwise the cached API (default)
+    """
+    mode = current_app.config.get('BREACHED_PASSWORD_MODE', 'hybrid')
+
+    if mode in ('index', 'hybrid'):
+        index = get_index()
+        if index is not None:
+            return index.contains_password(password)
+        if mode == 'index':
+            return False
+
+    sha1_hash = hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
+    try:
+        return sha1_hash[5:] in _range_suffixes(sha1_hash[:5])
+    except Exception as e:
+        # If API is down, allow password
+        print(f"Breached-password API check failed, allowing password: {e}")
+        return False
@@ -0,0 +1,10 @@
+# application/cache_invalidation.py
+from application.auth_utils import invalidate_auth_context
+from application.dashboard_service import invalidate_dashboard
+from application.student_search import student_index
+
+def membership_changed(*user_ids):
+    """Call after CCAMembers rows are added or removed for these users."""
+    invalidate_auth_context(*user_ids)
+    invalidate_dashboard(*user_ids)
+    student_index.memberships_changed(*user_ids)
@@ -0,0 +1,159 @@
+# application/cca_cascade.py
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, or_, select, update
+from application.models import (db, CCA, CCAMembers, CCAPurge, Poll, PollBallot, PollOption, PollTally,
+                                PollVote, VoteToken)
+
+# Deleting a CCA removes everything hanging off it with one set-based DELETE per
+# table, children first, each filtered by a subquery on the CCA's polls rather
+# than a list of ids pulled into Python.
+#
+# Small CCAs go in one transaction (delete_cca). A large one is soft-deleted
+# instead: its memberships go and its polls close straight away, so nobody can
+# reach it, and a CCAPurgeQueue row records it. purge_deleted_ccas() then
+# removes the rest in chunks of CHUNK_SIZE rows, committing after each, so no
+# single statement holds its locks for long.
+
+CHUNK_SIZE = 5000
+
+def _polls(cca_id):
+    return select(Poll.PollId).where(Poll.CCAId == cca_id)
+
+# (table, model, key column to chunk on, rows belonging to the CCA), children first.
+# PollBallots chunks on UserId, so a chunk can take one voter's ballots in several polls.
+_CASCADE = (
+    ('Votes', PollVote, PollVote.VoteId, lambda cca_id: PollVote.PollId.in_(_polls(cca_id))),
+    ('VoteTokens', VoteToken, VoteToken.Token, lambda cca_id: VoteToken.PollId.in_(_polls(cca_id))),
+    ('PollBallots', PollBallot, PollBallot.UserId, lambda cca_id: PollBallot.PollId.in_(_polls(cca_id))),
+    ('PollTallies', PollTally, PollTally.OptionId, lambda cca_id: PollTally.PollId.in_(_polls(cca_id))),
+    ('Options', PollOption, PollOption.OptionId, lambda cca_id: PollOption.PollId.in_(_polls(cca_id))),
+    ('Poll', Poll, Poll.PollId, lambda cca_id: Poll.CCAId == cca_id),
+    ('CCAMembers', CCAMembers, CCAMembers.MemberId, lambda cca_id: CCAMembers.CCAId == cca_id),
+    ('CCA', CCA, CCA.CCAId, lambda cca_id: CCA.CCAId == cca_id),
+)
+
+# ───────────────────────────────────────────────────────────
+def cca_size(cca_id):
+    """Votes plus vote tokens under a CCA: the rows that make a delete slow."""
+    votes = select(func.count()).select_from(PollVote).where(PollVote.PollId.in_(_polls(cca_id))).scalar_subquery()
+    tokens = select(func.count()).select_from(VoteToken).where(VoteToken.PollId.in_(_polls(cca_id))).scalar_subquery()
+    return db.session.execute(select(votes + tokens)).scalar() or 0
+
+def delete_cca(cca_id):
+    """Delete a CCA and everything under it in one transaction. Returns {table: rows deleted}."""
+    counts = {}
+    try:
+        for table, model, _, belongs_to in _CASCADE:
+            counts[table] = db.session.execute(delete(model).where(belongs_to(cca_id))).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
+
+def soft_delete_cca(cca_id, requested_by=None):
+    """Hide a CCA now and queue the rest of its data for purge_deleted_ccas(). Returns memberships removed."""
+    try:
+        name = db.session.execute(select(CCA.Name).where(CCA.CCAId == cca_id)).scalar()
+        db.session.execute(insert(CCAPurge).values(CCAId=cca_id, Name=name, RequestedBy=requested_by,
+                                                   RequestedAt=datetime.utcnow()))
+        # Access comes from membership, so removing it cuts everyone off at once
+        members = db.session.execute(delete(CCAMembers).where(CCAMembers.CCAId == cca_id)).rowcount
+        db.session.execute(update(Poll).where(Poll.CCAId == cca_id).values(IsActive=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return members
+
+def is_pending_purge(cca_id):
+    return db.session.query(CCAPurge.CCAId).filter_by(CCAId=cca_id).first() is not None
+
+def purge_deleted_ccas(chunk_size=CHUNK_SIZE, lease=600):
+    """Finish every soft-deleted CCA nobody else is working on. Returns {cca id: {table: rows deleted}}."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:64]
+    purged = {}
+    while True:
+        cca_id = _claim(worker_id, lease)
+        if cca_id is None:
+            return purged
+        try:
+            purged[cca_id] = _purge(cca_id, chunk_size)
+            db.session.execute(delete(CCAPurge).where(CCAPurge.CCAId == cca_id))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error purging deleted CCA {cca_id}: {e}")
+            # Leave it locked until the lease runs out, then any worker retries from where this stopped
+            db.session.execute(update(CCAPurge).where(CCAPurge.CCAId == cca_id).values(LastError=str(e)[:1000]))
+            db.session.commit()
+
+# ───────────────────────────────────────────────────────────
+def _claim(worker_id, lease):
+    now = datetime.utcnow()
+    free = or_(CCAPurge.LockedUntil == None, CCAPurge.LockedUntil < now)
+    cca_ids = [row[0] for row in db.session.query(CCAPurge.CCAId).filter(free).order_by(CCAPurge.RequestedAt)]
+    for cca_id in cca_ids:
+        # Re-checking `free` in the UPDATE means two workers can't both claim it
+        claimed = db.session.execute(
+            update(CCAPurge).where(CCAPurge.CCAId == cca_id, free)
+            .values(LockedBy=worker_id, LockedUntil=now + timedelta(seconds=lease))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return cca_id
+    db.session.rollback()
+    return None
+
+def _purge(cca_id, chunk_size):
+    counts = {}
+    for table, model, key, belongs_to in _CASCADE:
+        counts[table] = 0
+        while True:
+            chunk = select(key).where(belongs_to(cca_id)).limit(chunk_size)
+            deleted = db.session.execute(delete(model).where(belongs_to(cca_id), key.in_(chunk))).rowcount
+            db.session.commit()
+            counts[table] += deleted
+            if deleted < chunk_size:
+                break
+    return counts
+
+
+class CCAPurger:
+    """Runs purge_deleted_ccas() on a background thread in this worker when woken."""
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def init_app(self, app):
+        self._app = app
+        app.extensions['cca_purger'] = self
+
+    def wake(self):
+        """Start purging now unless this process is already at it; the nightly CLI run catches anything left."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name="cca-purger", daemon=True).start()
+
+    def _run(self):
+        config = self._app.config
+        try:
+            with self._app.app_context():
+                purged = purge_deleted_ccas(config.get('CCA_PURGE_CHUNK_SIZE', CHUNK_SIZE))
+            for cca_id, counts in purged.items():
+                print(f"Purged deleted CCA {cca_id}: {counts}")
+        except Exception as e:
+            print(f"CCA purge error: {e}")
+        finally:
+            with self._lock:
+                self._running = False
+
+
+cca_purger = CCAPurger()
@@ -0,0 +1,128 @@
+# application/cli.py
+import csv
+import json
+import click
+from sqlalchemy import inspect
+from application.models import db
+from application.tally_service import fill_missing_tallies, rebuild_tallies
+from application.provisioning import provision_students, read_student_ids, summarize
+from application.breach_index import BreachIndexError, build_index
+from application.log_retention import ARCHIVED_TABLES, CHUNK_SIZE, archive_logs, count_archivable, read_archive
+from application.cca_cascade import purge_deleted_ccas
+from application.session_sweeper import session_model, sweep_sessions
+from application.email_outbox import purge_sent
+
+# ───────────────────────────────────────────────────────────
+def register_cli_commands(app):
+    """Attach maintenance and admin commands to `flask`."""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create any tables and indexes declared in models.py that don't exist yet, and fill in missing tallies."""
+        db.create_all()
+        # create_all only indexes tables it creates; add indexes declared later on existing tables
+        created = 0
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if not inspect(db.engine).has_index(table.name, index.name):
+                    click.echo(f"Creating index {index.name} on {table.name}...")
+                    index.create(db.engine)
+                    created += 1
+        click.echo(f"Database tables are up to date ({created} index(es) added).")
+        # Polls created before PollTallies existed get their tallies counted once here
+        filled = fill_missing_tallies()
+        db.session.commit()
+        if filled:
+            click.echo(f"Counted tallies for {len(filled)} poll(s) that had none.")
+
+    @app.cli.command('rebuild-tallies')
+    @click.option('--poll-id', type=int, default=None, help='Only rebuild this poll.')
+    def rebuild_tallies_command(poll_id):
+        """Recompute PollTallies from Votes."""
+        rows = rebuild_tallies(poll_id)
+        db.session.commit()
+        click.echo(f"Rebuilt {rows} tally rows.")
+
+    @app.cli.command('provision-students')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--no-email', is_flag=True, help='Create accounts without queueing setup emails.')
+    @click.option('--report', type=click.File('w'), default='-', help='Where to write per-row results (CSV, default stdout).')
+    @click.option('--base-url', envvar='SITE_URL', help='Public site URL used in setup links (default: $SITE_URL).')
+    def provision_students_command(csv_file, no_email, report, base_url):
+        """Create login accounts for every student ID in CSV_FILE."""
+        if not no_email and not base_url:
+            raise click.UsageError("Setup links need --base-url or SITE_URL (or pass --no-email).")
+
+        # Setup links are built with url_for(_external=True), which needs a request context
+        with app.test_request_context(base_url=base_url or 'http://localhost'):
+            outcomes = provision_students(read_student_ids(csv_file), send_emails=not no_email)
+
+        writer = csv.DictWriter(report, fieldnames=['line', 'student_id', 'status', 'message'])
+        writer.writeheader()
+        writer.writerows(outcomes)
+        click.echo(f"Processed {len(outcomes)} rows: {summarize(outcomes)}", err=True)
+
+    @app.cli.command('build-breach-index')
+    @click.argument('dump_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--output', default=None, help='Index file to write (default: BREACHED_PASSWORD_INDEX).')
+    @click.option('--min-count', type=int, default=1, help='Skip hashes seen fewer times than this to shrink the index.')
+    def build_breach_index_command(dump_file, output, min_count):
+        """Build the breached-password index from a HIBP SHA-1 dump (HASH:COUNT lines, sorted by hash)."""
+        output = output or app.config.get('BREACHED_PASSWORD_INDEX', 'data/pwned-passwords.idx')
+        try:
+            stored = build_index(dump_file, output, min_count=min_count)
+        except BreachIndexError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Wrote {stored} hashes to {output}. Restart workers to pick it up.")
+
+    @app.cli.command('archive-logs')
+    @click.option('--days', type=int, default=None, help='Keep this many days in the database (default: LOG_RETENTION_DAYS).')
+    @click.option('--dry-run', is_flag=True, help='Only report how many rows would be archived.')
+    @click.option('--chunk-size', type=int, default=CHUNK_SIZE, show_default=True, help='Rows moved per transaction.')
+    def archive_logs_command(days, dry_run, chunk_size):
+        """Move LoginLog/AdminLog rows past the retention window into the gzipped archive."""
+        if dry_run:
+            click.echo(f"Rows to archive: {count_archivable(days)}")
+            return
+        archived = archive_logs(days, chunk_size=chunk_size)
+        click.echo(f"Archived {archived} to {app.config.get('LOG_ARCHIVE_DIR', 'data/log-archive')}.")
+
+    @app.cli.command('query-log-archive')
+    @click.argument('table', type=click.Choice(sorted(ARCHIVED_TABLES)))
+    @click.option('--from', 'start', type=click.DateTime(['%Y-%m-%d']), default=None, help='First day (YYYY-MM-DD).')
+    @click.option('--to', 'end', type=click.DateTime(['%Y-%m-%d']), default=None, help='Last day (YYYY-MM-DD).')
+    @click.option('--user', default=None, help='Only rows for this username (LoginLog) or admin user id (AdminLog).')
+    @click.option('--ip', default=None, help='Only rows from this IP address.')
+    def query_log_archive_command(table, start, end, user, ip):
+        """Print archived rows as JSON Lines."""
+        for row in read_archive(table, start and start.date(), end and end.date()):
+            if ip and row.get('IPAddress') != ip:
+                continue
+            if user and str(row.get('Username', row.get('AdminUserId'))) != user:
+                continue
+            click.echo(json.dumps(row))
+
+    @app.cli.command('purge-deleted-ccas')
+    @click.option('--chunk-size', type=int, default=None, help='Rows deleted per transaction (default: CCA_PURGE_CHUNK_SIZE).')
+    def purge_deleted_ccas_command(chunk_size):
+        """Finish removing soft-deleted CCAs (normally done in the background)."""
+        purged = purge_deleted_ccas(chunk_size or app.config.get('CCA_PURGE_CHUNK_SIZE', 5000))
+        for cca_id, counts in purged.items():
+            click.echo(f"CCA {cca_id}: " + ', '.join(f"{table} {count}" for table, count in counts.items()))
+        click.echo(f"Purged {len(purged)} CCA(s).")
+
+    @app.cli.command('sweep-sessions')
+    @click.option('--chunk-size', type=int, default=None, help='Rows deleted per transaction (default: SESSION_SWEEP_CHUNK_SIZE).')
+    @click.option('--idle-timeout', type=int, default=None, help='Also delete sessions unchanged for this many seconds (default: SESSION_IDLE_TIMEOUT).')
+    def sweep_sessions_command(chunk_size, idle_timeout):
+        """Delete expired and idle rows from the session table (normally done in the background)."""
+        if session_model() is None:
+            raise click.ClickException("Sessions aren't stored in the database (SESSION_BACKEND), nothing to sweep.")
+        counts = sweep_sessions(chunk_size or app.config.get('SESSION_SWEEP_CHUNK_SIZE', 5000), idle_timeout)
+        click.echo(f"Deleted {counts.get('expired', 0)} expired and {counts.get('idle', 0)} idle session(s).")
+
+    @app.cli.command('purge-email-outbox')
+    @click.option('--retention-days', type=int, default=None, help='Keep sent messages this many days (default: EMAIL_OUTBOX_RETENTION_DAYS).')
+    def purge_email_outbox_command(retention_days):
+        """Delete old sent messages from the email outbox (normally done in the background)."""
+        click.echo(f"Deleted {purge_sent(retention_days)} sent message(s).")
@@ -0,0 +1,102 @@
+# application/dashboard_service.py
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import and_
+from application.models import db, User, CCA, CCAMembers, Poll
+from application.cache import TTLCache
+from application.date_utils import convert_utc_to_gmt8_display
+
+# Per-user dashboard view. Membership, poll and password changes call
+# invalidate_dashboard(); DASHBOARD_CACHE_TTL bounds staleness on other workers.
+_dashboards = TTLCache(ttl=60)
+
+# ───────────────────────────────────────────────────────────
+def _load_dashboard(user_id):
+    """Fetch password age, CCAs and their active polls in a single round-trip."""
+    rows = db.session.query(
+        User.PasswordLastSet,
+        CCA.CCAId, CCA.Name, CCA.Description, CCAMembers.CCARole,
+        Poll.PollId, Poll.Question, Poll.EndDate
+    ).select_from(User) \
+     .outerjoin(CCAMembers, CCAMembers.UserId == User.UserId) \
+     .outerjoin(CCA, CCA.CCAId == CCAMembers.CCAId) \
+     .outerjoin(Poll, and_(Poll.CCAId == CCA.CCAId, Poll.IsActive == True)) \
+     .filter(User.UserId == user_id).all()
+
+    password_last_set = rows[0][0] if rows else None
+    ccas = {}
+    polls = []
+    for _, cca_id, cca_name, description, role, poll_id, question, end_date in rows:
+        if cca_id is None:
+            continue
+        if cca_id not in ccas:
+            ccas[cca_id] = {
+                'id': cca_id,
+                'name': cca_name,
+                'description': description,
+                'role': role
+            }
+        if poll_id is not None:
+            polls.append({
+                'id': poll_id,
+                'title': question,
+                'end_date': convert_utc_to_gmt8_display(end_date).split(' ')[0] if end_date else '',  # Just date part
+                'cca': cca_name,
+                'end_date_utc': end_date
+            })
+
+    polls.sort(key=lambda p: p['end_date_utc'] or datetime.max)
+    return {
+        'password_last_set': password_last_set,
+        'ccas': list(ccas.values()),
+        'polls': polls,
+        'user_is_moderator': any(c['role'] == 'moderator' for c in ccas.values())
+    }
+
+def get_dashboard_data(user_id):
+    """Return the dashboard view for a user, with time-relative fields computed for now."""
+    data = _dashboards.get(user_id)
+    if data is None:
+        data = _load_dashboard(user_id)
+        _dashboards.set(user_id, data, ttl=current_app.config.get('DASHBOARD_CACHE_TTL', 60))
+
+    now = datetime.now(timezone.utc)
+
+    days_left = None
+    password_last_set = data['password_last_set']
+    if password_last_set:
+        # Make sure both datetimes are timezone-aware for comparison
+        if password_last_set.tzinfo is None:
+            # If database datetime is naive, assume it's UTC
+            password_last_set = password_last_set.replace(tzinfo=timezone.utc)
+        days_left = 365 - (now - password_last_set).days
+
+    available_polls = []
+    for poll in data['polls']:
+        # Same day-boundary count as SQL Server's DATEDIFF(day, now, EndDate)
+        end_date = poll['end_date_utc']
+        days_remaining = (end_date.date() - now.date()).days if end_date else 0
+        available_polls.append({
+            'id': poll['id'],
+            'title': poll['title'],
+            'end_date': poll['end_date'],
+            'cca': poll['cca'],
+            'days_remaining': days_remaining
+        })
+
+    return {
+        'ccas': data['ccas'],
+        'available_polls': available_polls,
+        'user_is_moderator': data['user_is_moderator'],
+        'password_days_left': days_left
+    }
+
+def invalidate_dashboard(*user_ids):
+    """Drop cached dashboards so the next visit reloads them."""
+    for user_id in user_ids:
+        _dashboards.pop(user_id)
+
+def invalidate_cca_dashboards(cca_id):
+    """Drop cached dashboards for every member of a CCA, e.g. after a poll is created."""
+    member_ids = [m.UserId for m in db.session.query(CCAMembers.UserId).filter_by(CCAId=cca_id)]
+    invalidate_dashboard(*member_ids)
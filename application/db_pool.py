@@ -0,0 +1,292 @@
+# application/db_pool.py
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+
+import pyodbc
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+def build_connection_string(config):
+    """Resolve the ODBC connection string from the Flask config.
+
+    Order of preference: DB_CONNECTION_STRING, the DB_* parts, then the
+    odbc_connect parameter embedded in SQLALCHEMY_DATABASE_URI.
+    """
+    conn_str = config.get('DB_CONNECTION_STRING')
+    if conn_str:
+        return conn_str
+
+    if config.get('DB_SERVER'):
+        driver = config['DB_DRIVER']
+        server = config['DB_SERVER']
+        name = config['DB_NAME']
+        user = config['DB_USER']
+        password = config['DB_PASSWORD']
+        return f"DRIVER={{{driver}}};SERVER={server};DATABASE={name};UID={user};PWD={password};Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=30;"
+
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    odbc_connect = parse_qs(urlparse(uri).query).get('odbc_connect')
+    if odbc_connect:
+        return odbc_connect[0]
+
+    raise KeyError('DB_CONNECTION_STRING')
+
+
+class PooledConnection:
+    """Proxy around a pyodbc connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._closed = False
+
+    @property
+    def raw(self):
+        return self._entry.raw
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._entry)
+
+    def invalidate(self):
+        """Drop the underlying connection instead of returning it to the pool."""
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._entry, discard=True)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._entry.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # A handler that forgot to close() must not leak a pool slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class _Entry:
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of pyodbc connections.
+
+    Shared by get_db_connection() and the SQLAlchemy engine (as its creator),
+    so a request never pays the TLS + login handshake to SQL Server unless
+    the pool has to grow or replace a connection.
+    """
+
+    def __init__(self, app=None, creator=None):
+        self._creator = creator
+        self.max_size = 10
+        self.timeout = 10.0
+        self.max_idle = 300.0
+        self.max_lifetime = 1800.0
+        self.ping_after = 30.0
+
+        self._reset_state()
+        if app:
+            self.init_app(app)
+
+    def _reset_state(self):
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._opened = 0
+        self._in_use = 0
+        self._metrics = {
+            'checkouts': 0,
+            'created': 0,
+            'closed': 0,
+            'timeouts': 0,
+            'idle_evictions': 0,
+            'failed_health_checks': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def init_app(self, app):
+        """Size the pool from the Flask config"""
+        config = app.config
+        self.max_size = int(config.get('DB_POOL_SIZE') or os.getenv('DB_POOL_SIZE') or self.max_size)
+        self.timeout = float(config.get('DB_POOL_TIMEOUT', self.timeout))
+        self.max_idle = float(config.get('DB_POOL_MAX_IDLE', self.max_idle))
+        self.max_lifetime = float(config.get('DB_POOL_MAX_LIFETIME', self.max_lifetime))
+        self.ping_after = float(config.get('DB_POOL_PING_AFTER', self.ping_after))
+
+        if self._creator is None:
+            def creator():
+                conn_str = build_connection_string(config)
+                config['DB_CONNECTION_STRING'] = conn_str  # Store it for potential reuse
+                return pyodbc.connect(conn_str)
+            self._creator = creator
+
+    # ───────────────────────────────────────────────────────────
+    def connect(self):
+        """Check out a connection, waiting up to self.timeout for a free slot."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            entry = None
+            expired = []
+            try:
+                with self._lock:
+                    while True:
+                        expired.extend(self._evict_idle())
+                        if self._idle:
+                            entry = self._idle.pop()
+                            break
+                        if self._opened < self.max_size:
+                            self._opened += 1
+                            break
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._metrics['timeouts'] += 1
+                            raise PoolTimeout(
+                                f"Timed out after {self.timeout}s waiting for a database connection "
+                                f"({self._in_use}/{self.max_size} in use)"
+                            )
+                        self._lock.wait(remaining)
+                    self._in_use += 1
+            finally:
+                # Closing can block on a half-dead socket, so never while holding the lock
+                for stale in expired:
+                    self._close_raw(stale)
+
+            if entry is None:
+                try:
+                    entry = _Entry(self._creator())
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                        self._in_use -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._metrics['created'] += 1
+            elif not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._metrics['checkouts'] += 1
+                self._metrics['wait_time_total'] += waited
+                if waited > self._metrics['wait_time_max']:
+                    self._metrics['wait_time_max'] = waited
+            return PooledConnection(self, entry)
+
+    def _is_healthy(self, entry):
+        now = time.monotonic()
+        if now - entry.created_at > self.max_lifetime:
+            return False
+        if now - entry.last_used < self.ping_after:
+            return True
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            print(f"[db_pool] Health check failed, replacing connection: {e}")
+            with self._lock:
+                self._metrics['failed_health_checks'] += 1
+            return False
+
+    def _evict_idle(self):
+        """Take connections idle past max_idle out of the pool (lock held); the caller closes them."""
+        # Oldest idle connections sit at the left end of the deque
+        now = time.monotonic()
+        evicted = []
+        while self._idle and now - self._idle[0].last_used > self.max_idle:
+            evicted.append(self._idle.popleft())
+            self._opened -= 1
+            self._metrics['idle_evictions'] += 1
+            self._metrics['closed'] += 1
+        return evicted
+
+    def _release(self, entry, discard=False):
+        if not discard:
+            try:
+                # Never hand the next borrower an open transaction
+                entry.raw.rollback()
+            except Exception:
+                discard = True
+
+        if discard or time.monotonic() - entry.created_at > self.max_lifetime:
+            self._discard(entry)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append(entry)
+            self._lock.notify()
+
+    def _discard(self, entry):
+        self._close_raw(entry)
+        with self._lock:
+            self._opened -= 1
+            self._in_use -= 1
+            self._metrics['closed'] += 1
+            self._lock.notify()
+
+    def _close_raw(self, entry):
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+
+    # ───────────────────────────────────────────────────────────
+    def dispose(self):
+        """Close every idle connection, e.g. after forking a worker process."""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._metrics['closed'] += len(idle)
+        for entry in idle:
+            self._close_raw(entry)
+
+    def reset_after_fork(self):
+        """Forget connections inherited from the parent process without touching their sockets."""
+        self._reset_state()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats.update({
+                'max_size': self.max_size,
+                'open': self._opened,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            })
+        return stats
+
+
+db_pool = ConnectionPool()
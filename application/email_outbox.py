@@ -0,0 +1,262 @@
+# application/email_outbox.py
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import and_, delete, func, or_, select, update
+from application.models import db, EmailOutbox
+from application.background import WorkerThreads
+
+# Outgoing mail is written to the EmailOutbox table by request handlers and sent
+# by a small pool of threads in each worker. Rows are leased while sending, so a
+# worker that dies mid-send only delays its messages until the lease runs out.
+#
+# Bodies can carry password-setup links, so a sent message keeps only its
+# envelope, and the row itself goes after EMAIL_OUTBOX_RETENTION_DAYS. Those
+# links expire, so a setup email keeps its StudentId and a retried one is built
+# again with a new link.
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+DEAD = 'dead'
+
+PURGE_CHUNK_SIZE = 1000
+
+# ───────────────────────────────────────────────────────────
+def enqueue_email(recipient, subject, html=None, text=None, student_id=None):
+    """Store a message for background delivery and commit. Returns its EmailId.
+
+    Pass student_id for a password-setup email, so a retry gets a fresh link.
+    """
+    email, = enqueue_emails([(recipient, subject, html, text, student_id)])
+    return email.EmailId
+
+def enqueue_emails(messages, commit=True):
+    """Store many (recipient, subject, html, text, student_id) messages at once. Returns the new rows.
+
+    With commit=False the rows join the caller's transaction, so e.g. new accounts
+    and their setup emails are saved together; call email_outbox.wake() after committing.
+    """
+    now = datetime.utcnow()
+    emails = [
+        EmailOutbox(
+            Recipient=recipient, Subject=subject, HtmlBody=html, TextBody=text, StudentId=student_id,
+            Status=PENDING, Attempts=0, NextAttemptAt=now, CreatedAt=now
+        )
+        for recipient, subject, html, text, student_id in messages
+    ]
+    db.session.add_all(emails)
+    if commit:
+        db.session.commit()
+        email_outbox.wake()
+    return emails
+
+def retry_email(email_id):
+    """Put a dead-lettered message back in the queue. Returns False if it isn't dead.
+
+    A password-setup email is built again first, since its link may have expired;
+    False if that student no longer exists.
+    """
+    email = db.session.get(EmailOutbox, email_id)
+    if not email or email.Status != DEAD:
+        return False
+    if email.StudentId is not None:
+        built = email_outbox.rebuild_setup_email(email.StudentId)
+        if built is None:
+            return False
+        email.Subject, email.HtmlBody, email.TextBody = built
+    email.Status = PENDING
+    email.Attempts = 0
+    email.NextAttemptAt = datetime.utcnow()
+    db.session.commit()
+    email_outbox.wake()
+    return True
+
+def purge_sent(retention_days=None, chunk_size=PURGE_CHUNK_SIZE):
+    """Delete sent messages older than the retention period and clear any body a sent row still holds.
+
+    Returns the number of rows deleted.
+    """
+    if retention_days is None:
+        retention_days = current_app.config.get('EMAIL_OUTBOX_RETENTION_DAYS', 7)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    old = and_(EmailOutbox.Status == SENT, EmailOutbox.SentAt < cutoff)
+    # Rows sent before bodies were cleared on send
+    with_body = and_(EmailOutbox.Status == SENT,
+                     or_(EmailOutbox.HtmlBody != None, EmailOutbox.TextBody != None))
+
+    deleted = _in_chunks(delete(EmailOutbox), old, chunk_size)
+    _in_chunks(update(EmailOutbox).values(HtmlBody=None, TextBody=None), with_body, chunk_size)
+    return deleted
+
+def _in_chunks(statement, matches, chunk_size):
+    # One short transaction per chunk, so the senders are never blocked for long
+    total = 0
+    while True:
+        chunk = select(EmailOutbox.EmailId).where(matches).limit(chunk_size)
+        try:
+            rows = db.session.execute(statement.where(matches, EmailOutbox.EmailId.in_(chunk))).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        total += rows
+        if rows < chunk_size:
+            return total
+
+def outbox_counts():
+    """Return {status: number of messages}."""
+    rows = db.session.query(EmailOutbox.Status, func.count(EmailOutbox.EmailId)).group_by(EmailOutbox.Status).all()
+    return {status: count for status, count in rows}
+
+
+class OutboxWorkers:
+    """Background senders for EmailOutbox, started in each worker process."""
+
+    def __init__(self):
+        self._app = None
+        self._mail = None
+        self._rebuild_setup_email = None
+        self._lock = threading.Lock()
+        self._threads = WorkerThreads(self._start_senders)
+        self._wake = threading.Event()
+        self._next_purge = 0
+
+    def init_app(self, app, mail, rebuild_setup_email=None):
+        """rebuild_setup_email(student_id) returns a new (subject, html, text), or None if there's no such student."""
+        self._app = app
+        self._mail = mail
+        self._rebuild_setup_email = rebuild_setup_email
+        # init_app may run more than once; only hook the app once
+        if 'email_outbox' not in app.extensions:
+            app.extensions['email_outbox'] = self
+            self._threads.init_app(app)
+
+    def wake(self):
+        """Send newly queued mail now rather than at the next poll."""
+        self._wake.set()
+
+    def rebuild_setup_email(self, student_id):
+        if self._rebuild_setup_email is None:
+            return None
+        return self._rebuild_setup_email(student_id)
+
+    # ───────────────────────────────────────────────────────────
+    def _start_senders(self):
+        self._wake = threading.Event()
+        for index in range(self._app.config.get('EMAIL_OUTBOX_WORKERS', 2)):
+            threading.Thread(target=self._run, name=f"email-outbox-{index}", daemon=True).start()
+
+    def _run(self):
+        config = self._app.config
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:64]
+        while True:
+            try:
+                with self._app.app_context():
+                    claimed = self._process_batch(worker_id)
+            except Exception as e:
+                print(f"Email outbox worker error: {e}")
+                claimed = 0
+            if not claimed:
+                self._purge_if_due()
+                self._wake.wait(config.get('EMAIL_OUTBOX_POLL_INTERVAL', 5))
+                self._wake.clear()
+
+    def _purge_if_due(self):
+        # Only one sender thread per worker purges, at most every EMAIL_OUTBOX_PURGE_INTERVAL seconds
+        with self._lock:
+            if time.monotonic() < self._next_purge:
+                return
+            self._next_purge = time.monotonic() + self._app.config.get('EMAIL_OUTBOX_PURGE_INTERVAL', 3600)
+        try:
+            with self._app.app_context():
+                deleted = purge_sent()
+            if deleted:
+                print(f"Email outbox: deleted {deleted} sent message(s) past retention")
+        except Exception as e:
+            print(f"Email outbox purge error: {e}")
+
+    def _process_batch(self, worker_id):
+        emails = self._claim(worker_id)
+        if not emails:
+            return 0
+
+        try:
+            # One SMTP session for the whole batch
+            with self._mail.connect() as connection:
+                for email in emails:
+                    try:
+                        connection.send(self._message(email))
+                    except Exception as e:
+                        self._failed(email, e)
+                    else:
+                        email.Status = SENT
+                        email.SentAt = datetime.utcnow()
+                        email.HtmlBody = None
+                        email.TextBody = None
+                        email.LockedBy = None
+                        email.LockedUntil = None
+                        email.LastError = None
+                    db.session.commit()
+        except Exception as e:
+            # Couldn't connect (or the session dropped): everything not yet settled retries later
+            for email in emails:
+                if email.Status == SENDING:
+                    self._failed(email, e)
+            db.session.commit()
+        return len(emails)
+
+    def _claim(self, worker_id):
+        config = self._app.config
+        now = datetime.utcnow()
+        due = or_(
+            and_(EmailOutbox.Status == PENDING, EmailOutbox.NextAttemptAt <= now),
+            # Lease ran out: the sender died before settling it
+            and_(EmailOutbox.Status == SENDING, EmailOutbox.LockedUntil < now)
+        )
+        email_ids = [row[0] for row in db.session.query(EmailOutbox.EmailId).filter(due)
+                     .order_by(EmailOutbox.NextAttemptAt).limit(config.get('EMAIL_OUTBOX_BATCH_SIZE', 20))]
+        if not email_ids:
+            db.session.rollback()
+            return []
+
+        # Re-checking `due` in the UPDATE means two workers can't both claim a row
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.EmailId.in_(email_ids), due)
+            .values(
+                Status=SENDING, LockedBy=worker_id, Attempts=EmailOutbox.Attempts + 1,
+                LockedUntil=now + timedelta(seconds=config.get('EMAIL_OUTBOX_LEASE', 300))
+            )
+        )
+        db.session.commit()
+        return EmailOutbox.query.filter(
+            EmailOutbox.EmailId.in_(email_ids), EmailOutbox.LockedBy == worker_id, EmailOutbox.Status == SENDING
+        ).all()
+
+    def _failed(self, email, error):
+        config = self._app.config
+        print(f"Email {email.EmailId} to {email.Recipient} failed (attempt {email.Attempts}): {error}")
+        email.LastError = str(error)[:1000]
+        email.LockedBy = None
+        email.LockedUntil = None
+        if email.Attempts >= config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 6):
+            email.Status = DEAD
+            return
+        # Exponential backoff with jitter so a recovering SMTP server isn't hit all at once
+        delay = min(config.get('EMAIL_OUTBOX_RETRY_BASE', 30) * 2 ** (email.Attempts - 1),
+                    config.get('EMAIL_OUTBOX_RETRY_MAX', 3600))
+        email.Status = PENDING
+        email.NextAttemptAt = datetime.utcnow() + timedelta(seconds=delay * random.uniform(1, 1.25))
+
+    @staticmethod
+    def _message(email):
+        return Message(subject=email.Subject, recipients=[email.Recipient], html=email.HtmlBody, body=email.TextBody)
+
+
+email_outbox = OutboxWorkers()
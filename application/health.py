@@ -0,0 +1,162 @@
+# application/health.py
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from application.db_pool import db_pool
+from application.models import db
+from application.breach_index import get_index
+from application.email_outbox import outbox_counts
+from application.background import WorkerThreads
+
+# Liveness and readiness probes.
+#
+# /health/live answers from memory: if the worker can run a view, it is alive.
+# /health/ready (and the old /health) returns the result of the last round of
+# checks, which a background thread in each worker repeats every
+# HEALTH_CHECK_INTERVAL seconds using a pooled connection. A probe therefore
+# never waits on the database, and neither does starting a worker: until the
+# first round finishes the worker reports "starting" (503). A check that hangs
+# only makes the result stale, and a result older than HEALTH_STALE_AFTER
+# seconds counts as not ready.
+#
+# The database and the session store must be up to serve traffic. The mail
+# outbox and breached-password index are reported but only mark the app
+# "degraded", since logins and voting work without them.
+
+OK = 'ok'
+DEGRADED = 'degraded'
+DOWN = 'down'
+
+REQUIRED = ('database', 'sessions')
+
+# ───────────────────────────────────────────────────────────
+def check_database():
+    started = time.perf_counter()
+    conn = db_pool.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    stats = db_pool.stats()
+    return OK, {'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                'in_use': stats['in_use'], 'open': stats['open'], 'max_size': stats['max_size']}
+
+def check_sessions():
+    # Probe the store SESSION_BACKEND points Flask-Session at, not the interface itself
+    backend = current_app.config.get('SESSION_BACKEND', 'sqlalchemy')
+    interface = current_app.session_interface
+    started = time.perf_counter()
+    if backend == 'sqlalchemy':
+        model = interface.sql_session_model
+        db.session.execute(select(model.id).limit(1)).all()
+    elif backend == 'redis':
+        interface.client.ping()
+    else:
+        interface.cache.get(f'{interface.key_prefix}health-check')
+    return OK, {'backend': backend, 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+def check_outbox():
+    counts = outbox_counts()
+    return (DEGRADED if counts.get('dead') else OK), counts
+
+def check_breach_index():
+    mode = current_app.config.get('BREACHED_PASSWORD_MODE', 'hybrid')
+    if mode == 'api':
+        return OK, {'mode': mode}
+    index = get_index()
+    if index is None:
+        # hybrid falls back to the API; index mode lets every password through
+        return DEGRADED, {'mode': mode, 'index': 'missing'}
+    return OK, {'mode': mode, 'hashes': len(index)}
+
+CHECKS = (
+    ('database', check_database),
+    ('sessions', check_sessions),
+    ('outbox', check_outbox),
+    ('breach_index', check_breach_index),
+)
+
+
+class HealthMonitor:
+    """Runs CHECKS on a background thread per worker and serves the last result."""
+
+    def __init__(self):
+        self._app = None
+        self._threads = WorkerThreads(self._start_checker)
+        self._last = None     # (ready?, body, monotonic time checked)
+
+    def init_app(self, app):
+        self._app = app
+        if 'health' not in app.extensions:
+            app.extensions['health'] = self
+            app.add_url_rule('/health/live', 'health_live', self.live)
+            app.add_url_rule('/health/ready', 'health_ready', self.ready)
+            # Older probes and the nginx location still use /health
+            app.add_url_rule('/health', 'health_check', self.ready)
+            self._threads.init_app(app)
+
+    def run_checks(self):
+        """Run every check now (needs an app context). Returns (ready?, body)."""
+        checks = {}
+        for name, check in CHECKS:
+            try:
+                status, detail = check()
+                checks[name] = {'status': status, **detail}
+            except Exception as e:
+                checks[name] = {'status': DOWN, 'error': str(e)[:200]}
+
+        ready = all(checks[name]['status'] == OK for name in REQUIRED)
+        if not ready:
+            status = DOWN
+        elif any(check['status'] != OK for check in checks.values()):
+            status = DEGRADED
+        else:
+            status = OK
+        return ready, {'status': status, 'checked_at': datetime.now().isoformat(), 'checks': checks}
+
+    # ───────────────────────────────────────────────────────────
+    def live(self):
+        return {'status': 'alive', 'pid': os.getpid()}, 200
+
+    def ready(self):
+        self._threads.ensure_started()
+        last = self._last
+        if last is None:
+            return {'status': 'starting'}, 503
+
+        ready, body, checked_at = last
+        age = time.monotonic() - checked_at
+        interval = current_app.config.get('HEALTH_CHECK_INTERVAL', 15)
+        if age > current_app.config.get('HEALTH_STALE_AFTER', interval * 3):
+            # The checker is stuck (e.g. on a hung connection), so the last answer can't be trusted
+            return {**body, 'status': DOWN, 'stale_seconds': round(age)}, 503
+        return body, 200 if ready else 503
+
+    def _start_checker(self):
+        # A result from before the fork belongs to the master
+        self._last = None
+        threading.Thread(target=self._run, name="health-check", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._check()
+            time.sleep(self._app.config.get('HEALTH_CHECK_INTERVAL', 15))
+
+    def _check(self):
+        try:
+            with self._app.app_context():
+                ready, body = self.run_checks()
+            self._last = (ready, body, time.monotonic())
+            if not ready:
+                print(f"Health check failed: {body['checks']}")
+        except Exception as e:
+            print(f"Health check error: {e}")
+
+
+health = HealthMonitor()
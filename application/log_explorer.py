@@ -0,0 +1,197 @@
+# application/log_explorer.py
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, literal, or_, select, union_all
+from application.models import db, LoginLog, AdminLog, LogDailyStats, User
+from application.cache import TTLCache
+
+# LoginLog and AdminLog are browsed newest first as one stream. Each table is
+# read with keyset pagination on (Timestamp, LogId), which the composite indexes
+# in models.py serve directly, and the two pages are merged. The cursor keeps a
+# separate position per table, so neither table is ever scanned past a page.
+
+AUTH = 'auth'
+ADMIN = 'admin'
+
+# Log type filter -> AdminLog.Action category (authentication means LoginLog only)
+ACTION_TYPES = {
+    'authorization': 'Authorization',
+    'data_modification': 'Data Change',
+    'security_violation': 'Security Issue',
+    'system': 'System Event',
+}
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_counts = TTLCache(ttl=60, maxsize=1)
+
+# ───────────────────────────────────────────────────────────
+def parse_filters(args):
+    """Read explorer filters from request args, dropping anything empty or malformed."""
+    filters = {}
+    log_type = args.get('log_type', 'all')
+    if log_type == 'authentication' or log_type in ACTION_TYPES:
+        filters['log_type'] = log_type
+    for name in ('user', 'ip'):
+        value = (args.get(name) or '').strip()[:255]
+        if value:
+            filters[name] = value
+    if args.get('success') in ('true', 'false'):
+        filters['success'] = args.get('success') == 'true'
+    for name in ('date_from', 'date_to'):
+        try:
+            filters[name] = datetime.strptime(args.get(name) or '', '%Y-%m-%d')
+        except ValueError:
+            pass
+    return filters
+
+def encode_cursor(positions):
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode()
+
+def decode_cursor(cursor):
+    """Turn a cursor back into {source: [iso timestamp, log id] or None}; a bad cursor starts over."""
+    if not cursor:
+        return {}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {
+            source: (datetime.fromisoformat(position[0]), int(position[1])) if position else None
+            for source, position in positions.items() if source in (AUTH, ADMIN)
+        }
+    except (ValueError, TypeError, KeyError, IndexError):
+        return {}
+
+def query_logs(filters, cursor=None, limit=PAGE_SIZE):
+    """Return (rows, next_cursor) for one page of merged logs, newest first.
+
+    next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    positions = decode_cursor(cursor)
+
+    pages = {}
+    for source in _sources(filters):
+        # A source that ran out on an earlier page is stored as None
+        if source in positions and positions[source] is None:
+            continue
+        pages[source] = _page(source, filters, positions.get(source), limit + 1)
+
+    merged = list(heapq.merge(*pages.values(), key=lambda row: (row['timestamp'], row['log_id']), reverse=True))
+    rows = merged[:limit]
+
+    # Each table resumes after its own last row on this page
+    next_positions = dict(positions)
+    for source, page in pages.items():
+        shown = [row for row in rows if row['source'] == source]
+        if shown:
+            next_positions[source] = [shown[-1]['timestamp'].isoformat(), shown[-1]['log_id']]
+        if len(shown) == len(page):
+            next_positions[source] = None
+    has_more = len(merged) > limit
+    return rows, encode_cursor(next_positions) if has_more else None
+
+def log_counts():
+    """Totals for the stat cards, from one grouped query cached for LOG_COUNTS_TTL seconds.
+
+    Rows already moved to the archive are counted from LogDailyStats.
+    """
+    counts = _counts.get('counts')
+    if counts is not None:
+        return counts
+
+    categories = list(ACTION_TYPES.values())
+    statement = union_all(
+        select(literal(AUTH).label('kind'), func.count().label('n')).select_from(LoginLog),
+        select(literal(ADMIN).label('kind'), func.count().label('n')).select_from(AdminLog),
+        select(AdminLog.Action.label('kind'), func.count().label('n'))
+        .where(AdminLog.Action.in_(categories)).group_by(AdminLog.Action),
+        select(LogDailyStats.Kind.label('kind'), func.sum(LogDailyStats.Count).label('n'))
+        .group_by(LogDailyStats.Kind),
+    )
+    rows = {}
+    for kind, n in db.session.execute(statement):
+        rows[kind] = rows.get(kind, 0) + (n or 0)
+
+    counts = {
+        'total_logs': rows.get(AUTH, 0) + rows.get(ADMIN, 0),
+        'authentication_logs': rows.get(AUTH, 0),
+        'authorization_logs': rows.get('Authorization', 0),
+        'data_changes_logs': rows.get('Data Change', 0),
+        'security_issues_logs': rows.get('Security Issue', 0),
+        'system_events_logs': rows.get('System Event', 0),
+    }
+    _counts.set('counts', counts, ttl=current_app.config.get('LOG_COUNTS_TTL', 60))
+    return counts
+
+# ───────────────────────────────────────────────────────────
+def _sources(filters):
+    log_type = filters.get('log_type')
+    if log_type == 'authentication' or 'success' in filters:
+        return [AUTH]
+    if log_type in ACTION_TYPES:
+        return [ADMIN]
+    return [AUTH, ADMIN]
+
+def _page(source, filters, position, limit):
+    if source == AUTH:
+        model = LoginLog
+        query = db.session.query(
+            LoginLog.LogId, LoginLog.Timestamp, LoginLog.IPAddress, LoginLog.Success, LoginLog.Reason,
+            func.coalesce(User.Username, LoginLog.Username).label('Username')
+        ).outerjoin(User, LoginLog.UserId == User.UserId)
+        if 'user' in filters:
+            # What was typed at login, or the account it resolved to (e.g. an email login)
+            user_ids = select(User.UserId).where(User.Username == filters['user']).scalar_subquery()
+            query = query.filter(or_(LoginLog.Username == filters['user'], LoginLog.UserId == user_ids))
+        if 'success' in filters:
+            query = query.filter(LoginLog.Success == filters['success'])
+    else:
+        model = AdminLog
+        query = db.session.query(
+            AdminLog.LogId, AdminLog.Timestamp, AdminLog.IPAddress, AdminLog.Action, User.Username
+        ).outerjoin(User, AdminLog.AdminUserId == User.UserId)
+        if 'user' in filters:
+            # Filter on the indexed id column rather than the joined username
+            user_ids = select(User.UserId).where(User.Username == filters['user']).scalar_subquery()
+            query = query.filter(AdminLog.AdminUserId == user_ids)
+        if filters.get('log_type') in ACTION_TYPES:
+            query = query.filter(AdminLog.Action == ACTION_TYPES[filters['log_type']])
+
+    # A NULL timestamp has no place in the (Timestamp, LogId) order, so such rows are never listed
+    query = query.filter(model.Timestamp.isnot(None))
+    if 'ip' in filters:
+        query = query.filter(model.IPAddress == filters['ip'])
+    if 'date_from' in filters:
+        query = query.filter(model.Timestamp >= filters['date_from'])
+    if 'date_to' in filters:
+        query = query.filter(model.Timestamp < filters['date_to'] + timedelta(days=1))
+    if position:
+        timestamp, log_id = position
+        query = query.filter(or_(
+            model.Timestamp < timestamp,
+            and_(model.Timestamp == timestamp, model.LogId < log_id)
+        ))
+
+    rows = query.order_by(model.Timestamp.desc(), model.LogId.desc()).limit(limit).all()
+    return [_row(source, row) for row in rows]
+
+def _row(source, row):
+    if source == AUTH:
+        message = 'Login success' if row.Success else f"Failed: {row.Reason}"
+        success = row.Success
+    else:
+        message = row.Action
+        success = None
+    return {
+        'source': source,
+        'log_id': row.LogId,
+        'timestamp': row.Timestamp,
+        'username': row.Username or 'Unknown',
+        'ip': row.IPAddress,
+        'success': success,
+        'message': message,
+    }
@@ -0,0 +1,140 @@
+# application/log_retention.py
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, update
+from application.models import db, LoginLog, AdminLog, LogDailyStats
+from application.log_explorer import AUTH, ADMIN, ACTION_TYPES
+
+# Log rows older than LOG_RETENTION_DAYS are moved out of the database into
+# gzipped JSON Lines files, one per table per day:
+#
+#   <LOG_ARCHIVE_DIR>/LoginLog/2024/2024-03-01.jsonl.gz
+#
+# Each chunk is appended and fsynced before its rows are deleted, and its daily
+# counts go into LogDailyStats in the same transaction as the delete, so the
+# System Logs totals don't drop when rows leave. If a run dies between the file
+# write and the delete, the next run appends those rows again; readers skip
+# repeated LogIds.
+
+ARCHIVED_TABLES = {'LoginLog': LoginLog, 'AdminLog': AdminLog}
+
+# Rows per chunk; the delete binds each LogId, well under SQL Server's 2100 parameters
+CHUNK_SIZE = 1000
+
+_COLUMNS = {
+    'LoginLog': ('LogId', 'Timestamp', 'Username', 'UserId', 'IPAddress', 'Success', 'Reason'),
+    'AdminLog': ('LogId', 'Timestamp', 'AdminUserId', 'Action', 'IPAddress'),
+}
+
+# ───────────────────────────────────────────────────────────
+def archive_logs(retention_days=None, chunk_size=CHUNK_SIZE, archive_dir=None):
+    """Move log rows older than the retention window to the archive. Returns {table: rows archived}."""
+    config = current_app.config
+    retention_days = retention_days if retention_days is not None else config.get('LOG_RETENTION_DAYS', 90)
+    archive_dir = archive_dir or config.get('LOG_ARCHIVE_DIR', 'data/log-archive')
+    # Whole days only, so a day's file is complete once its rows are archived
+    cutoff = datetime.combine(date.today() - timedelta(days=retention_days), datetime.min.time())
+
+    archived = {}
+    for table, model in ARCHIVED_TABLES.items():
+        archived[table] = 0
+        while True:
+            moved = _archive_chunk(table, model, cutoff, chunk_size, archive_dir)
+            if not moved:
+                break
+            archived[table] += moved
+    return archived
+
+def count_archivable(retention_days=None):
+    """Rows that archive_logs() would move now, per table."""
+    retention_days = retention_days if retention_days is not None else current_app.config.get('LOG_RETENTION_DAYS', 90)
+    cutoff = datetime.combine(date.today() - timedelta(days=retention_days), datetime.min.time())
+    return {
+        table: db.session.query(model).filter(model.Timestamp < cutoff).count()
+        for table, model in ARCHIVED_TABLES.items()
+    }
+
+def read_archive(table, start=None, end=None, archive_dir=None):
+    """Yield archived rows (dicts) for `table` between two dates inclusive, oldest day first."""
+    archive_dir = os.path.join(archive_dir or current_app.config.get('LOG_ARCHIVE_DIR', 'data/log-archive'), table)
+    if not os.path.isdir(archive_dir):
+        return
+    for year in sorted(os.listdir(archive_dir)):
+        for name in sorted(os.listdir(os.path.join(archive_dir, year))):
+            if not name.endswith('.jsonl.gz'):
+                continue
+            day = date.fromisoformat(name[:10])
+            if (start and day < start) or (end and day > end):
+                continue
+            seen = set()
+            with gzip.open(os.path.join(archive_dir, year, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row['LogId'] in seen:
+                        continue
+                    seen.add(row['LogId'])
+                    yield row
+
+# ───────────────────────────────────────────────────────────
+def _archive_chunk(table, model, cutoff, chunk_size, archive_dir):
+    columns = [getattr(model, name) for name in _COLUMNS[table]]
+    # Oldest first along the (Timestamp, LogId) index
+    rows = db.session.query(*columns).filter(model.Timestamp < cutoff) \
+        .order_by(model.Timestamp, model.LogId).limit(chunk_size).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    by_day = {}
+    for row in rows:
+        record = dict(zip(_COLUMNS[table], row))
+        record['Timestamp'] = record['Timestamp'].isoformat()
+        by_day.setdefault(row.Timestamp.date(), []).append(record)
+
+    for day, records in by_day.items():
+        _append(archive_dir, table, day, records)
+
+    try:
+        _add_daily_stats(table, by_day)
+        db.session.execute(delete(model).where(model.LogId.in_([row.LogId for row in rows])))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+def _append(archive_dir, table, day, records):
+    directory = os.path.join(archive_dir, table, f"{day.year:04d}")
+    os.makedirs(directory, exist_ok=True)
+    # Appending starts a new gzip member; gzip readers treat the members as one stream
+    with open(os.path.join(directory, f"{day.isoformat()}.jsonl.gz"), 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+            for record in records:
+                f.write((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+def _add_daily_stats(table, by_day):
+    counts = Counter()
+    categories = set(ACTION_TYPES.values())
+    for day, records in by_day.items():
+        if table == 'LoginLog':
+            counts[(day, AUTH)] += len(records)
+            continue
+        counts[(day, ADMIN)] += len(records)
+        for record in records:
+            if record['Action'] in categories:
+                counts[(day, record['Action'])] += 1
+
+    for (day, kind), count in counts.items():
+        result = db.session.execute(
+            update(LogDailyStats)
+            .where(LogDailyStats.Day == day, LogDailyStats.Kind == kind)
+            .values(Count=LogDailyStats.Count + count)
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(LogDailyStats).values(Day=day, Kind=kind, Count=count))
@@ -0,0 +1,322 @@
+# application/metrics.py
+import fcntl
+import ipaddress
+import json
+import os
+import threading
+import time
+from flask import current_app, g, request
+from application.background import WorkerThreads
+
+# Prometheus-style counters, histograms and gauges, served as text at /metrics.
+#
+# Each gunicorn worker keeps its own figures. With METRICS_DIR set, every worker
+# writes a snapshot there every METRICS_SNAPSHOT_INTERVAL seconds and /metrics
+# adds up all live workers' snapshots, so a scrape sees the whole server no
+# matter which worker answers it. Without it, /metrics shows one worker only.
+# Workers are recycled (max_requests), so an exited worker's counters and
+# histograms are folded into a retired.json snapshot rather than dropped, and
+# the totals never go down; its gauges go with it.
+# Figures that are the same from every worker (e.g. rows in a table) are
+# registered with per_worker=False and read once per scrape instead.
+#
+# Recording on the request path is a dict update under a lock; everything
+# else (gauges, rendering) happens only when /metrics is scraped.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RETIRED = 'retired'
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """In-process metric registry with a Prometheus text exposition."""
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._families = {}   # name -> (type, help, buckets)
+        self._values = {}     # (name, label key) -> number, or [per-bucket counts..., sum, count]
+        self._collectors = {} # name -> (callable read at collection time, per worker?)
+        self._threads = WorkerThreads(self._start_snapshots)
+        self._lock_in_flight = threading.Lock()
+        self._in_flight = 0
+
+    def init_app(self, app):
+        self._app = app
+        if 'metrics' not in app.extensions:
+            app.extensions['metrics'] = self
+            app.add_url_rule('/metrics', 'metrics', self._serve)
+            self._threads.init_app(app)
+            app.before_request(self._start_request)
+            app.after_request(self._record_status)
+            app.teardown_request(self._finish_request)
+            self.histogram('http_request_duration_seconds', 'Request latency, by endpoint and method.')
+            self.counter('http_requests_total', 'Requests handled, by endpoint and status code.')
+            self.collector('http_requests_in_flight', 'Requests being handled right now.', lambda: self._in_flight)
+
+    def instrument_sessions(self, app):
+        """Time the session store's load and save; call after Session(app)."""
+        self.histogram('session_store_duration_seconds', 'Time to load or save a server-side session.',
+                       buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+        app.session_interface = _TimedSessionInterface(app.session_interface, self)
+
+    # ───────────────────────────────────────────────────────────
+    def counter(self, name, help):
+        self._families.setdefault(name, (COUNTER, help, None))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        self._families.setdefault(name, (HISTOGRAM, help, tuple(buckets)))
+
+    def collector(self, name, help, read, kind=GAUGE, per_worker=True):
+        """Register a figure read at collection time; read() returns a number or [(labels dict, number), ...].
+
+        Use kind=COUNTER for running totals kept elsewhere (e.g. db_pool.stats()).
+        """
+        self._families[name] = (kind, help, None)
+        self._collectors[name] = (read, per_worker)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = self._families[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self, per_worker=True):
+        """This worker's figures, with collectors read now, as a JSON-ready dict.
+
+        per_worker=False gives only the figures that are the same on every worker.
+        """
+        values = []
+        if per_worker:
+            with self._lock:
+                values = [[name, list(map(list, labels)), list(value) if isinstance(value, list) else value]
+                          for (name, labels), value in self._values.items()]
+        for name, (read, collector_per_worker) in list(self._collectors.items()):
+            if collector_per_worker != per_worker:
+                continue
+            try:
+                result = read()
+            except Exception as e:
+                print(f"Error reading metric {name}: {e}")
+                continue
+            if not isinstance(result, list):
+                result = [({}, result)]
+            for labels, value in result:
+                values.append([name, list(map(list, _label_key(labels))), value])
+        families = {name: [kind, help, list(buckets) if buckets else None]
+                    for name, (kind, help, buckets) in self._families.items()}
+        return {'families': families, 'values': values}
+
+    def render(self, snapshots):
+        """Prometheus text format for the sum of one or more snapshots."""
+        families, totals = {}, {}
+        for snapshot in snapshots:
+            families.update(snapshot['families'])
+            for name, labels, value in snapshot['values']:
+                key = (name, tuple(map(tuple, labels)))
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    totals[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+
+        lines = []
+        for name in sorted(families):
+            kind, help, buckets = families[name]
+            series = sorted((labels, value) for (series_name, labels), value in totals.items() if series_name == name)
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                if kind != HISTOGRAM:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value[:-2]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_number(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {value[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(float(value[-2]))}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    # ───────────────────────────────────────────────────────────
+    def _serve(self):
+        if not self._allowed(request.remote_addr):
+            return 'Not Found', 404
+        snapshots = [self.snapshot()]
+        directory = current_app.config.get('METRICS_DIR')
+        if directory:
+            self._write_snapshot(directory, snapshots[0])
+            snapshots = self._read_snapshots(directory)
+        snapshots.append(self.snapshot(per_worker=False))
+        return self.render(snapshots), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    def _allowed(self, address):
+        allowed = current_app.config.get('METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+        try:
+            address = ipaddress.ip_address(address or '')
+        except ValueError:
+            return False
+        return any(address in ipaddress.ip_network(network, strict=False) for network in allowed)
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        with self._lock_in_flight:
+            self._in_flight += 1
+
+    def _record_status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, error=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        with self._lock_in_flight:
+            self._in_flight -= 1
+        endpoint = request.endpoint or 'none'
+        if endpoint == 'metrics':
+            return
+        self.observe('http_request_duration_seconds', time.perf_counter() - started,
+                     endpoint=endpoint, method=request.method)
+        # No status means the request failed before a response was made
+        status = 500 if error is not None else g.pop('metrics_status', 500)
+        self.inc('http_requests_total', endpoint=endpoint, status=status)
+
+    def _start_snapshots(self):
+        directory = self._app.config.get('METRICS_DIR')
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._run, args=(directory,), name="metrics-snapshot", daemon=True).start()
+
+    def _run(self, directory):
+        interval = self._app.config.get('METRICS_SNAPSHOT_INTERVAL', 5)
+        while True:
+            try:
+                with self._app.app_context():
+                    self._write_snapshot(directory, self.snapshot())
+            except Exception as e:
+                print(f"Error writing metrics snapshot: {e}")
+            time.sleep(interval)
+
+    def _write_snapshot(self, directory, snapshot, name=None):
+        path = os.path.join(directory, f'{name or os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)
+
+    def _read_snapshots(self, directory):
+        snapshots, exited = [], []
+        # Workers answering scrapes at the same time must not fold an exited worker in twice
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired = _load_snapshot(os.path.join(directory, f'{RETIRED}.json')) or {'families': {}, 'values': []}
+            for name in os.listdir(directory):
+                if not name.endswith('.json') or name == f'{RETIRED}.json':
+                    continue
+                path = os.path.join(directory, name)
+                snapshot = _load_snapshot(path)
+                try:
+                    os.kill(int(name[:-5]), 0)
+                except ProcessLookupError:
+                    exited.append(path)
+                    if snapshot is not None:
+                        retired = _retire(retired, snapshot)
+                    continue
+                except (ValueError, PermissionError):
+                    pass
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+            if exited:
+                self._write_snapshot(directory, retired, RETIRED)
+                for path in exited:
+                    os.remove(path)
+        snapshots.append(retired)
+        return snapshots
+
+
+def _load_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _retire(retired, snapshot):
+    """retired plus the counters and histograms of an exited worker's snapshot."""
+    families = {**retired['families'], **snapshot['families']}
+    totals = {(name, json.dumps(labels)): value for name, labels, value in retired['values']}
+    for name, labels, value in snapshot['values']:
+        if families.get(name, [GAUGE])[0] == GAUGE:
+            continue
+        key = (name, json.dumps(labels))
+        current = totals.get(key)
+        if current is None:
+            totals[key] = value
+        elif isinstance(value, list):
+            totals[key] = [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = current + value
+    return {'families': families,
+            'values': [[name, json.loads(labels), value] for (name, labels), value in totals.items()]}
+
+
+class _TimedSessionInterface:
+    """Wraps the app's session interface to time open_session/save_session."""
+
+    def __init__(self, inner, registry):
+        self._inner = inner
+        self._registry = registry
+
+    def open_session(self, app, request):
+        started = time.perf_counter()
+        try:
+            return self._inner.open_session(app, request)
+        finally:
+            self._registry.observe('session_store_duration_seconds', time.perf_counter() - started, op='open')
+
+    def save_session(self, app, session, response):
+        started = time.perf_counter()
+        try:
+            return self._inner.save_session(app, session, response)
+        finally:
+            self._registry.observe('session_store_duration_seconds', time.perf_counter() - started, op='save')
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
+metrics = Metrics()
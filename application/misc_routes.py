@@ -1,17 +1,16 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from datetime import datetime, timedelta
 from email_service import email_service
-import bcrypt
-import requests
-import hashlib
 import re
 import pyotp
 from functools import wraps
 from application.captcha_utils import captcha_is_valid
 import os 
-from application.models import User, Student, CCAMembers, db
-import bcrypt
-from application.auth_utils import log_login_attempt
+from application.models import User, Student, db
+from application.auth_utils import log_login_attempt, resolve_identity, save_login_state
+from application.dashboard_service import invalidate_dashboard
+from application.breach_index import is_breached
+from application.password_hashing import password_hasher, PasswordHashBusy
 
 def validate_password_nist(password):
     """
@@ -38,29 +37,23 @@ def validate_password_nist(password):
 
 def is_compromised_password(password):
     """
-    Check password against Have I Been Pwned API 
+    Check password against breach data (local index, or Have I Been Pwned API as fallback)
     """
+    return is_breached(password)
+
+def upgrade_password_hash(stored_password, password):
+    """
+    Return a new hash for a just-verified password if BCRYPT_ROUNDS has changed since it was stored
+    """
+    if not password_hasher.needs_rehash(stored_password):
+        return None
     try:
-        # Hash the password
-        sha1_hash = hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
-        prefix = sha1_hash[:5]
-        suffix = sha1_hash[5:]
-        
-        # Query Have I Been Pwned API
-        url = f"https://api.pwnedpasswords.com/range/{prefix}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            # Check if suffix appears in results
-            for line in response.text.splitlines():
-                if line.startswith(suffix):
-                    # Password found in breach data
-                    return True
-        
-        return False
-    except:
-        # If API is down, allow password 
-        return False
+        new_hash = password_hasher.hash(password)
+    except PasswordHashBusy:
+        # Not worth failing a login over; it will be upgraded next time
+        return None
+    password_hasher.rehashed()
+    return new_hash
 
 # Blueprint for misc routes
 misc_bp = Blueprint('misc_routes', __name__)
@@ -98,108 +91,120 @@ def register_misc_routes(app, get_db_connection, login_required, validate_email,
 
         return render_template('mfa_verify.html')
     
-    def authenticate_user(username, password):
-        # ── ADMIN SPECIAL-CASE ─────────────────────────────────────────────
-        admin_user = User.query.filter_by(SystemRole='admin', Username=username).first()
-        if admin_user and bcrypt.checkpw(password.encode('utf-8'), admin_user.Password.encode('utf-8')):
-            return {
-                'user_id': admin_user.UserId,
-                'student_id': admin_user.Username, # Admin has username as student_id in old code
-                'role': admin_user.SystemRole,
-                'name': admin_user.Username,
-                'email': admin_user.Username # placeholder
-            }
-
-        user_details = None
-        # Try email login
+    def lookup_identity(username):
+        # Same identifier rules as before: email, then student ID, then username
         if validate_email(username):
-            student = Student.query.filter_by(Email=username).first()
-            if student:
-                user_details = student.user_details
-        # Try Student ID
-        elif validate_student_id(username):
-            student = Student.query.filter_by(StudentId=int(username)).first()
-            if student:
-                user_details = student.user_details
-        # Try username login
-        else:
-            user_details = User.query.filter_by(Username=username).first()
+            return resolve_identity(username, by='email')
+        if validate_student_id(username):
+            return resolve_identity(username, by='student_id')
+        return resolve_identity(username)
+
+    def authenticate_user(username, password):
+        identity = lookup_identity(username)
 
         # Check if user was found
-        if not user_details:
+        if not identity:
             print(f"No user found with identifier: {username}")
             log_login_attempt(username, None, success=False, reason="User not found")
             return None
 
         # SECURITY CHECK: Reject login if password is NULL (account not yet set up)
-        stored_password = user_details.Password
+        stored_password = identity['password']
         if stored_password is None:
             print(f"User {username} has no password set - login rejected, must use email link")
             return None
 
-        # Check if account is locked
-        if hasattr(user_details, 'IsLocked') and user_details.IsLocked:
-            # Auto-unlock
-            last_failed = user_details.LastFailedLogin
-            if last_failed and (datetime.utcnow() - last_failed > timedelta(minutes=30)):
-                print(f"Auto-unlocking user {username} (30 minutes passed)")
-                user_details.IsLocked = False
-                user_details.FailedLoginAttempts = 0
-                db.session.commit()
-            else:
-                print(f"User {username} is locked out due to too many failed login attempts.")
-                log_login_attempt(username, user_details.UserId, success=False, reason="Account locked")
-                return None
+        try:
+            # ── ADMIN SPECIAL-CASE ─────────────────────────────────────────
+            password_ok = None
+            if identity['system_role'] == 'admin' and identity['username'] == username:
+                password_ok = password_hasher.verify(password, stored_password)
+                if password_ok:
+                    new_hash = upgrade_password_hash(stored_password, password)
+                    if new_hash:
+                        save_login_state(identity, Password=new_hash)
+                        db.session.commit()
+                    return {
+                        'user_id': identity['user_id'],
+                        'student_id': identity['username'], # Admin has username as student_id in old code
+                        'role': identity['system_role'],
+                        'name': identity['username'],
+                        'email': identity['username'] # placeholder
+                    }
+                # Wrong admin password: count the failure below without checking it a second time
+
+            # Check if account is locked
+            if identity['is_locked']:
+                # Auto-unlock
+                last_failed = identity['last_failed_login']
+                if last_failed and (datetime.utcnow() - last_failed > timedelta(minutes=30)):
+                    print(f"Auto-unlocking user {username} (30 minutes passed)")
+                    save_login_state(identity, IsLocked=False, FailedLoginAttempts=0)
+                    db.session.commit()
+                else:
+                    print(f"User {username} is locked out due to too many failed login attempts.")
+                    log_login_attempt(username, identity['user_id'], success=False, reason="Account locked")
+                    return None
 
-        # Remove TEMP_ prefix if present before bcrypt check
-        password_to_check = stored_password
-        if stored_password.startswith("TEMP_"):
-            password_to_check = stored_password.replace("TEMP_", "", 1)
+            # Remove TEMP_ prefix if present before bcrypt check
+            password_to_check = stored_password
+            if stored_password.startswith("TEMP_"):
+                password_to_check = stored_password.replace("TEMP_", "", 1)
 
-        try:
             # Verify password using bcrypt
-            if bcrypt.checkpw(password.encode('utf-8'), password_to_check.encode('utf-8')):
-                
-                log_login_attempt(username, user_details.UserId, success=True, reason="Login success")
-
+            if password_ok is None:
+                password_ok = password_hasher.verify(password, password_to_check)
+            if password_ok:
                 # Password Expiration
-                if user_details.PasswordLastSet and (datetime.utcnow() - user_details.PasswordLastSet).days > 365:
+                if identity['password_last_set'] and (datetime.utcnow() - identity['password_last_set']).days > 365:
+                    log_login_attempt(username, identity['user_id'], success=True, reason="Login success")
                     flash("Your password has expired. Please reset it to continue.", "warning")
                     session['force_password_change'] = True
                     return None
-                
-                # Failed login attempt
-                user_details.FailedLoginAttempts = 0
-                user_details.IsLocked = False
-                db.session.commit()
-                
+
+                # Clear failed attempts, and upgrade the hash if BCRYPT_ROUNDS changed
+                changes = {}
+                if identity['failed_attempts'] or identity['is_locked']:
+                    changes.update(FailedLoginAttempts=0, IsLocked=False)
+                new_hash = None if stored_password.startswith("TEMP_") else upgrade_password_hash(stored_password, password)
+                if new_hash:
+                    changes['Password'] = new_hash
+                if changes:
+                    save_login_state(identity, **changes)
+                    db.session.commit()
+
+                log_login_attempt(username, identity['user_id'], success=True, reason="Login success")
+
                 # ── PROMOTE TO MODERATOR IF NEEDED ─────────────────────────
-                is_moderator = CCAMembers.query.filter_by(UserId=user_details.UserId, CCARole='moderator').first()
-                promoted_role = 'moderator' if is_moderator else user_details.SystemRole
+                promoted_role = 'moderator' if identity['is_moderator'] else identity['system_role']
 
                 return {
-                    'user_id': user_details.UserId,
-                    'student_id': user_details.StudentId,
+                    'user_id': identity['user_id'],
+                    'student_id': identity['student_id'],
                     'role': promoted_role,
-                    'name': user_details.student.Name,
-                    'email': user_details.student.Email,
+                    'name': identity['name'],
+                    'email': identity['email'],
                 }
             else:
                 # Wrong password: increment failure counter
-                user_details.FailedLoginAttempts = (user_details.FailedLoginAttempts or 0) + 1
-                user_details.LastFailedLogin = datetime.utcnow()
+                failed_attempts = identity['failed_attempts'] + 1
+                changes = {'FailedLoginAttempts': failed_attempts, 'LastFailedLogin': datetime.utcnow()}
 
                 # Failed login attempt
-                if user_details.FailedLoginAttempts >= 5:
-                    user_details.IsLocked = True
+                if failed_attempts >= 5:
+                    changes['IsLocked'] = True
                     print(f"User {username} account locked after 5 failed attempts.")
-
+                save_login_state(identity, **changes)
                 db.session.commit()
 
-                log_login_attempt(username, user_details.UserId, success=False, reason="Wrong password")
+                log_login_attempt(username, identity['user_id'], success=False, reason="Wrong password")
                 print("Password verification failed")
                 return None
+        except PasswordHashBusy:
+            db.session.rollback()
+            raise
         except Exception as bcrypt_error:
+            db.session.rollback()
             print(f"Bcrypt error: {bcrypt_error}")
             return None
 
@@ -247,13 +252,21 @@ def register_misc_routes(app, get_db_connection, login_required, validate_email,
                 return render_template('login.html',
                        RECAPTCHA_SITE_KEY=os.getenv("RECAPTCHA_SITE_KEY"))
                 
-            user = authenticate_user(username, password)
+            try:
+                user = authenticate_user(username, password)
+            except PasswordHashBusy as e:
+                print(f"Login deferred: {e}")
+                flash("The portal is busy right now. Please try signing in again in a moment.", "error")
+                return render_template('login.html',
+                       RECAPTCHA_SITE_KEY=os.getenv("RECAPTCHA_SITE_KEY")), 503
+            # Already loaded by authenticate_user, including any lock it just applied
+            identity = lookup_identity(username)
+
             # If user is locked, show message
-            locked_user = User.query.filter_by(Username=username).first()
-            if locked_user and locked_user.IsLocked:
+            if identity and identity['is_locked']:
                 remaining_minutes = None
-                if locked_user.LastFailedLogin:
-                    elapsed = datetime.utcnow() - locked_user.LastFailedLogin
+                if identity['last_failed_login']:
+                    elapsed = datetime.utcnow() - identity['last_failed_login']
                     if elapsed < timedelta(minutes=30):
                         remaining = timedelta(minutes=30) - elapsed
                         remaining_minutes = int(remaining.total_seconds() // 60) + 1  # Round up
@@ -284,24 +297,13 @@ def register_misc_routes(app, get_db_connection, login_required, validate_email,
                 if session.pop('force_password_change', False):
                     return redirect(url_for('student_routes.change_password'))
 
-                # Check if user has MFA enabled
-                mfa_user = User.query.filter_by(UserId=user['user_id']).first()
-
                 # Clear any stale MFA flag
                 session.pop('mfa_authenticated', None)
 
-                if os.getenv("TESTING") == "1":
-                    session['mfa_authenticated'] = True
-                    return redirect(url_for('student_routes.dashboard'))
-
-                # Check MFA requirement
-                mfa_user = User.query.filter_by(UserId=user['user_id']).first()
-                session.pop('mfa_authenticated', None)
-                
                 # MFA enforcement
-                if mfa_user and mfa_user.MFATOTPSecret:
+                if identity['mfa_secret']:
                     return redirect(url_for('misc_routes.mfa_verify'))
-                elif not mfa_user or not mfa_user.MFATOTPSecret:
+                else:
                     return redirect(url_for('student_routes.mfa_setup'))
 
             else:
@@ -364,18 +366,19 @@ def register_misc_routes(app, get_db_connection, login_required, validate_email,
                 if current_password and current_password.startswith('TEMP_'):
                     # Extract the original temporary password
                     original_hashed_temp = current_password.replace('TEMP_', '')
-                    if bcrypt.checkpw(new_password.encode('utf-8'), original_hashed_temp.encode('utf-8')):
+                    if password_hasher.verify(new_password, original_hashed_temp):
                         flash('You cannot use the temporary password. Please choose a different password.', 'error')
                         return render_template('reset_password.html', token=token)
                 
                 # Update password added hashing
-                hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                hashed_password = password_hasher.hash(new_password)
                 user_to_update.Password = hashed_password
 
                 # Update for password expiration
                 user_to_update.PasswordLastSet = datetime.utcnow()
                 
                 db.session.commit()
+                invalidate_dashboard(user_to_update.UserId)
                 
                 flash('Password set successfully! You can now log in to CCA Portal with your Student ID and new password.', 'success')
                 return redirect(url_for('misc_routes.login'))
@@ -6,7 +6,7 @@ class User(db.Model):
     __tablename__ = 'UserDetails'
     UserId = db.Column(db.Integer, primary_key=True)
     Username = db.Column(db.String(255), unique=True, nullable=False)
-    Password = db.Column(db.String(255), nullable=False)
+    Password = db.Column(db.String(255))  # NULL until the student sets it from the setup email
     SystemRole = db.Column(db.String(50), nullable=False)
     StudentId = db.Column(db.Integer, db.ForeignKey('Student.StudentId'))
     MFATOTPSecret = db.Column(db.String(255))
@@ -25,6 +25,11 @@ class Student(db.Model):
 
     user_details = db.relationship('User', backref='student_details', uselist=False)
 
+    # Admin dashboard pages through students by (Name, StudentId)
+    __table_args__ = (
+        db.Index('IX_Student_Name', 'Name', 'StudentId'),
+    )
+
 class CCAMembers(db.Model):
     __tablename__ = 'CCAMembers'
     MemberId = db.Column(db.Integer, primary_key=True)
@@ -41,6 +46,10 @@ class CCA(db.Model):
     Name = db.Column(db.String(255), nullable=False)
     Description = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('IX_CCA_Name', 'Name', 'CCAId'),
+    )
+
 class Poll(db.Model):
     __tablename__ = 'Poll'
     PollId = db.Column(db.Integer, primary_key=True)
@@ -72,6 +81,19 @@ class PollVote(db.Model):
     VotedTime = db.Column(db.DateTime, nullable=False)
     user = db.relationship('User', backref='votes')
 
+class PollTally(db.Model):
+    __tablename__ = 'PollTallies'
+    PollId = db.Column(db.Integer, db.ForeignKey('Poll.PollId'), primary_key=True)
+    OptionId = db.Column(db.Integer, db.ForeignKey('Options.OptionId'), primary_key=True)
+    VoteCount = db.Column(db.Integer, nullable=False, default=0)
+
+class PollBallot(db.Model):
+    # One row per (poll, voter); the primary key stops a second ballot even across workers
+    __tablename__ = 'PollBallots'
+    PollId = db.Column(db.Integer, db.ForeignKey('Poll.PollId'), primary_key=True)
+    UserId = db.Column(db.Integer, db.ForeignKey('UserDetails.UserId'), primary_key=True)
+    CastTime = db.Column(db.DateTime, nullable=False)
+
 class VoteToken(db.Model):
     __tablename__ = 'VoteTokens'
     Token = db.Column(db.String(255), unique=True, nullable=False, primary_key=True)
@@ -84,6 +106,18 @@ class VoteToken(db.Model):
     user = db.relationship('User', backref='vote_tokens')
     poll = db.relationship('Poll', backref='vote_tokens')
 
+class CCAPurge(db.Model):
+    # A deleted CCA whose polls and votes are still being removed in the background.
+    # No foreign key: the CCA row itself is the last thing the purge deletes.
+    __tablename__ = 'CCAPurgeQueue'
+    CCAId = db.Column(db.Integer, primary_key=True)
+    Name = db.Column(db.String(255))
+    RequestedBy = db.Column(db.Integer)
+    RequestedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    LockedBy = db.Column(db.String(64))
+    LockedUntil = db.Column(db.DateTime)
+    LastError = db.Column(db.String(1000))
+
 class LoginLog(db.Model):
     __tablename__ = 'LoginLog'
     LogId = db.Column(db.Integer, primary_key=True)
@@ -94,10 +128,54 @@ class LoginLog(db.Model):
     Success = db.Column(db.Boolean, nullable=False)
     Reason = db.Column(db.String(255))
 
+    # Keyset pagination in the log explorer: newest first, optionally narrowed by one filter
+    __table_args__ = (
+        db.Index('IX_LoginLog_Timestamp', 'Timestamp', 'LogId'),
+        db.Index('IX_LoginLog_Username_Timestamp', 'Username', 'Timestamp', 'LogId'),
+        db.Index('IX_LoginLog_UserId_Timestamp', 'UserId', 'Timestamp', 'LogId'),
+        db.Index('IX_LoginLog_IPAddress_Timestamp', 'IPAddress', 'Timestamp', 'LogId'),
+        db.Index('IX_LoginLog_Success_Timestamp', 'Success', 'Timestamp', 'LogId'),
+    )
+
 class AdminLog(db.Model):
     __tablename__ = 'AdminLog'
     LogId = db.Column(db.Integer, primary_key=True)
     AdminUserId = db.Column(db.Integer, db.ForeignKey('UserDetails.UserId'))
     Action = db.Column(db.String(255), nullable=False)
     Timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    IPAddress = db.Column(db.String(45))
\ No newline at end of file
+    IPAddress = db.Column(db.String(45))
+
+    __table_args__ = (
+        db.Index('IX_AdminLog_Timestamp', 'Timestamp', 'LogId'),
+        db.Index('IX_AdminLog_AdminUserId_Timestamp', 'AdminUserId', 'Timestamp', 'LogId'),
+        db.Index('IX_AdminLog_IPAddress_Timestamp', 'IPAddress', 'Timestamp', 'LogId'),
+        db.Index('IX_AdminLog_Action_Timestamp', 'Action', 'Timestamp', 'LogId'),
+    )
+
+class LogDailyStats(db.Model):
+    # Per-day counts of log rows moved to the archive, so totals survive pruning
+    __tablename__ = 'LogDailyStats'
+    Day = db.Column(db.Date, primary_key=True)
+    Kind = db.Column(db.String(255), primary_key=True)   # 'auth', 'admin', or an AdminLog action category
+    Count = db.Column(db.Integer, nullable=False, default=0)
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'EmailOutbox'
+    EmailId = db.Column(db.Integer, primary_key=True)
+    Recipient = db.Column(db.String(255), nullable=False)
+    Subject = db.Column(db.String(255), nullable=False)
+    HtmlBody = db.Column(db.Text)
+    TextBody = db.Column(db.Text)
+    StudentId = db.Column(db.Integer)  # password-setup emails, rebuilt with a fresh link when retried
+    Status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, dead
+    Attempts = db.Column(db.Integer, nullable=False, default=0)
+    NextAttemptAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    LockedBy = db.Column(db.String(64))
+    LockedUntil = db.Column(db.DateTime)
+    LastError = db.Column(db.String(1000))
+    CreatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    SentAt = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('IX_EmailOutbox_Status_NextAttemptAt', 'Status', 'NextAttemptAt'),
+    )
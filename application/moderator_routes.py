@@ -1,9 +1,13 @@
 from flask import render_template, request, redirect, url_for, session, flash, Blueprint
 from sqlalchemy.orm import aliased
-from sqlalchemy import text, cast
+from sqlalchemy import text
 from application.models import db, CCA, CCAMembers, User, Student, Poll, PollOption
 from datetime import datetime, timezone, timedelta
-from application.auth_utils import moderator_required
+from application.auth_utils import moderator_required, is_cca_moderator
+from application.cache_invalidation import membership_changed
+from application.student_search import search_response, student_index
+from application.dashboard_service import invalidate_cca_dashboards
+from application.tally_service import create_tallies
 import re
 import unicodedata
 
@@ -264,11 +268,18 @@ def register_moderator_routes(app, get_db_connection):
                     poll_id = new_poll.PollId
 
                     # Create and add new PollOption objects for new poll
+                    new_options = []
                     for option_text in valid_options:
                         new_option = PollOption(PollId=poll_id, OptionText=option_text)
                         db.session.add(new_option)
+                        new_options.append(new_option)
+                    db.session.flush()
+
+                    # Start every option's tally at zero
+                    create_tallies(poll_id, [option.OptionId for option in new_options])
                     
                     db.session.commit()
+                    invalidate_cca_dashboards(cca_id)
                     
                     cca_name = next(cca['name'] for cca in user_ccas if cca['id'] == int(cca_id))
                     flash(f'Poll "{question}" created successfully for {cca_name}!', 'success')
@@ -292,7 +303,8 @@ def register_moderator_routes(app, get_db_connection):
             flash('Error loading create poll page.', 'error')
             return redirect(url_for('student_routes.dashboard'))
         finally:
-            pass
+            if conn:
+                conn.close()
 
     @moderator_bp.route('/moderator/cca/<int:cca_id>')
     @moderator_required
@@ -306,7 +318,7 @@ def register_moderator_routes(app, get_db_connection):
             cursor = conn.cursor()
             
             # Checks if a CCAMembers record exists for the user and CCA
-            is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id, CCARole='moderator').first() is not None
+            is_moderator = is_cca_moderator(cca_id)
             
             if not is_moderator:
                 flash('Access denied.', 'error')
@@ -372,7 +384,7 @@ def register_moderator_routes(app, get_db_connection):
         try:
             cursor = conn.cursor()
             # Checks if a CCAMembers record exists for the user and CCA
-            is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id, CCARole='moderator').first() is not None
+            is_moderator = is_cca_moderator(cca_id)
             
             if not is_moderator:
                 flash('Access denied. You are not a moderator of this CCA.', 'error')
@@ -422,7 +434,7 @@ def register_moderator_routes(app, get_db_connection):
         try:
             cursor = conn.cursor()
             # Checks if a CCAMembers record exists for the user and CCA
-            is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id, CCARole='moderator').first() is not None
+            is_moderator = is_cca_moderator(cca_id)
             
             if not is_moderator:
                 flash('Access denied. You are unauthorised to access this CCA.', 'error')
@@ -458,6 +470,7 @@ def register_moderator_routes(app, get_db_connection):
             db.session.add(new_member)
         
             db.session.commit()
+            membership_changed(user_id)
             
             # Get student's name from the StudentId
             student_name_result = db.session.query(Student.Name).filter_by(StudentId=int(student_id)).first()
@@ -487,7 +500,7 @@ def register_moderator_routes(app, get_db_connection):
         try:
             cursor = conn.cursor()
             # Checks if a CCAMembers record exists for the user and CCA
-            is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id, CCARole='moderator').first() is not None
+            is_moderator = is_cca_moderator(cca_id)
             
             if not is_moderator:
                 flash('Access denied. You are unauthorised to view this CCA.', 'error')
@@ -495,8 +508,10 @@ def register_moderator_routes(app, get_db_connection):
             
             # Delete member from CCA
             member_to_remove = db.session.query(CCAMembers).filter_by(MemberId=member_id, CCAId=cca_id).one()
+            removed_user_id = member_to_remove.UserId
             db.session.delete(member_to_remove)
             db.session.commit()
+            membership_changed(removed_user_id)
 
             flash('Student removed from CCA successfully!', 'success')
             return redirect(url_for('moderator_routes.moderator_view_cca', cca_id=cca_id))
@@ -521,44 +536,17 @@ def register_moderator_routes(app, get_db_connection):
         if not search_query or len(search_query) < 2:
             return {'students': []}
         
-        conn = get_db_connection()
-        if not conn:
-            return {'error': 'Database connection error'}, 500
-        
         try:
             # Check if a CCAMembers record exists for the user and CCA
-            if not db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id, CCARole='moderator').first():
+            if not is_cca_moderator(cca_id):
                 return {'error': 'Access denied'}, 403
             
-            search_pattern = f'%{search_query}%'
-            subquery = db.session.query(CCAMembers.UserId).filter(CCAMembers.CCAId == cca_id)
-            v_ActiveUserDetails = aliased(User, name='v_ActiveUserDetails')
-            v_ActiveStudents = aliased(Student, name='v_ActiveStudents')
-
-            # Search for students not in CCA by name or ID
-            students = db.session.query(v_ActiveStudents.StudentId, v_ActiveStudents.Name, v_ActiveStudents.Email) \
-                .join(v_ActiveUserDetails, v_ActiveStudents.StudentId == v_ActiveUserDetails.StudentId) \
-                .filter(
-                    (v_ActiveStudents.Name.like(search_pattern) | cast(v_ActiveStudents.StudentId, db.String).like(search_pattern)),
-                    v_ActiveUserDetails.UserId.notin_(subquery)
-                ).order_by(v_ActiveStudents.Name).all()
-            
-            result = []
-            for student in students:
-                result.append({
-                    'student_id': student[0],
-                    'name': student[1],
-                    'email': student[2]
-                })
-            
-            return {'students': result}
+            # Search for students not in CCA by name or ID, from the in-memory index
+            return search_response(student_index.search(search_query, cca_id=int(cca_id)))
             
         except Exception as e:
             print(f"Moderator search students error: {e}")
             return {'error': 'Search failed'}, 500
-        finally:
-            if conn:
-                conn.close()
 
     @moderator_bp.route('/moderator/cca/<int:cca_id>/add-multiple-students', methods=['POST'])
     @moderator_required
@@ -577,7 +565,7 @@ def register_moderator_routes(app, get_db_connection):
         
         try:
             # Check if a CCAMembers record exists for the user and CCA
-            if not db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id, CCARole='moderator').first():
+            if not is_cca_moderator(cca_id):
                 flash('Access denied. You are unauthorised to view this CCA.', 'error')
                 return redirect(url_for('student_routes.my_ccas'))
 
@@ -595,6 +583,7 @@ def register_moderator_routes(app, get_db_connection):
                 db.session.add(new_member)
             
             db.session.commit()
+            membership_changed(*(user[0] for user in user_data))
             
             added_count = len(user_data)
             flash(f'{added_count} students have been added to the CCA as members!', 'success')
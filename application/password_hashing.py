@@ -0,0 +1,190 @@
+# application/password_hashing.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+class PasswordHashBusy(Exception):
+    """Raised when the hashing pool is saturated and a request waited too long for a slot."""
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _warm_up():
+    return os.getpid()
+
+def hash_cost(hashed):
+    """Work factor of a bcrypt hash ("$2b$12$..." -> 12), or None if it can't be read."""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt in a small process pool so a login rush can't tie up every request thread.
+
+    At most `max_workers` hashes run at once per gunicorn worker; up to
+    `max_queue` more wait their turn, and anything beyond that waits for a slot
+    for `queue_timeout` seconds before PasswordHashBusy is raised.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.max_workers = 1
+        self.max_queue = 8
+        self._queue_setting = None      # PASSWORD_HASH_QUEUE; default is 8 waiting per pool process
+        self.queue_timeout = 5.0
+        self.task_timeout = 30.0
+        self.use_pool = True
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._reset_state()
+        if app:
+            self.init_app(app)
+
+    def _reset_state(self):
+        self.max_queue = int(self._queue_setting) if self._queue_setting is not None else self.max_workers * 8
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._metrics_lock = threading.Lock()
+        self._in_flight = 0
+        self._metrics = {
+            'verified': 0,
+            'hashed': 0,
+            'rehashed': 0,
+            'rejected': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'hash_time_total': 0.0,
+            'hash_time_max': 0.0,
+        }
+
+    def init_app(self, app):
+        """Read sizing and cost from the Flask config"""
+        config = app.config
+        self.rounds = int(config.get('BCRYPT_ROUNDS', self.rounds))
+        self.max_workers = int(
+            config.get('PASSWORD_HASH_WORKERS') or os.getenv('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+        )
+        self._queue_setting = config.get('PASSWORD_HASH_QUEUE')
+        self.queue_timeout = float(config.get('PASSWORD_HASH_QUEUE_TIMEOUT', self.queue_timeout))
+        self.task_timeout = float(config.get('PASSWORD_HASH_TIMEOUT', self.task_timeout))
+        self.use_pool = bool(config.get('PASSWORD_HASH_POOL', self.use_pool))
+        self._reset_state()
+
+    # ───────────────────────────────────────────────────────────
+    def verify(self, password, hashed):
+        """True if `password` matches the stored bcrypt hash. A missing or malformed hash never matches."""
+        if not hashed:
+            return False
+        try:
+            return self._run('verified', _check, password.encode('utf-8'), hashed.encode('utf-8'))
+        except ValueError:
+            # Not a bcrypt hash (e.g. a placeholder in the Password column)
+            return False
+
+    def hash(self, password):
+        """Return a new bcrypt hash of `password` at the configured cost, as text."""
+        return self._run('hashed', _hash, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def needs_rehash(self, hashed):
+        """True if a hash was made with a different cost than BCRYPT_ROUNDS."""
+        return hash_cost(hashed) != self.rounds
+
+    def rehashed(self):
+        """Count a hash upgraded at login."""
+        with self._metrics_lock:
+            self._metrics['rehashed'] += 1
+
+    # ───────────────────────────────────────────────────────────
+    def reset_after_fork(self, max_workers=None):
+        """Forget the parent's pool and counters, optionally resizing for this worker."""
+        if max_workers:
+            self.max_workers = max_workers
+        self._pid = None
+        self._executor = None
+        self._reset_state()
+
+    def start(self):
+        """Create this process's pool and its processes now.
+
+        Called from gunicorn's post_fork while the worker is still single-threaded,
+        so forking the pool processes can't copy a lock another thread was holding.
+        """
+        if self.use_pool:
+            self._pool().submit(_warm_up).result(timeout=self.task_timeout)
+
+    def _pool(self):
+        # The executor's processes and threads belong to the process that made them
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context('fork')
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, metric, fn, *args):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._metrics_lock:
+                self._metrics['rejected'] += 1
+            raise PasswordHashBusy(
+                f"No password hashing slot free after {self.queue_timeout}s ({self._in_flight} in flight)"
+            )
+        try:
+            with self._metrics_lock:
+                self._in_flight += 1
+            queued = time.monotonic()
+            result = self._submit(fn, *args) if self.use_pool else fn(*args)
+            finished = time.monotonic()
+        finally:
+            with self._metrics_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+        with self._metrics_lock:
+            self._metrics[metric] += 1
+            self._metrics['wait_time_total'] += queued - started
+            self._metrics['wait_time_max'] = max(self._metrics['wait_time_max'], queued - started)
+            self._metrics['hash_time_total'] += finished - queued
+            self._metrics['hash_time_max'] = max(self._metrics['hash_time_max'], finished - queued)
+        return result
+
+    def _submit(self, fn, *args):
+        try:
+            return self._pool().submit(fn, *args).result(timeout=self.task_timeout)
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed); replace the pool and retry once
+            print("[password_hashing] Process pool broken, restarting it")
+            with self._lock:
+                self._pid = None
+            return self._pool().submit(fn, *args).result(timeout=self.task_timeout)
+        except FutureTimeout:
+            raise PasswordHashBusy(f"Password hashing took longer than {self.task_timeout}s")
+
+    def stats(self):
+        with self._metrics_lock:
+            stats = dict(self._metrics)
+            stats.update({
+                'rounds': self.rounds,
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+            })
+        return stats
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,147 @@
+# application/provisioning.py
+import csv
+from sqlalchemy import insert, or_
+from email_service import email_service
+from application.models import db, Student, User
+from application.email_outbox import email_outbox, enqueue_emails
+from application.student_search import student_index
+
+# Bulk version of admin create_student: student IDs are checked and inserted a
+# chunk at a time, and each chunk's accounts and setup emails commit together.
+
+CREATED = 'created'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+DUPLICATE = 'duplicate'
+FAILED = 'failed'
+
+# IDs per existence check; SQL Server allows 2100 parameters and the check binds each ID twice
+CHUNK_SIZE = 500
+# UserDetails rows bind 7 columns each once defaults are filled in
+_USERS_PER_INSERT = 250
+
+# ───────────────────────────────────────────────────────────
+def read_student_ids(stream):
+    """Yield (line_number, student_id) from CSV text.
+
+    Uses a `student_id` column when there is a header row, otherwise the first column.
+    """
+    column = 0
+    for line_number, row in enumerate(csv.reader(stream), start=1):
+        if line_number == 1 and row and not row[0].strip().isdigit():
+            headers = [header.strip().lower() for header in row]
+            for name in ('student_id', 'studentid', 'student id'):
+                if name in headers:
+                    column = headers.index(name)
+                    break
+            continue
+        if len(row) <= column or not row[column].strip():
+            continue
+        yield line_number, row[column].strip()
+
+def provision_students(rows, send_emails=True, chunk_size=CHUNK_SIZE):
+    """Create login accounts for (line_number, student_id) rows.
+
+    Returns one outcome dict per row ({line, student_id, status, message}) in file order.
+    """
+    outcomes = []
+    seen = set()
+    chunk = []
+    for line_number, student_id in rows:
+        if not (student_id.isdigit() and len(student_id) == 7):
+            outcomes.append(_outcome(line_number, student_id, INVALID, 'Student ID must be 7 digits.'))
+        elif student_id in seen:
+            outcomes.append(_outcome(line_number, student_id, DUPLICATE, 'Listed earlier in the file.'))
+        else:
+            seen.add(student_id)
+            chunk.append((line_number, int(student_id)))
+            if len(chunk) >= chunk_size:
+                outcomes.extend(_provision_chunk(chunk, send_emails))
+                chunk = []
+    if chunk:
+        outcomes.extend(_provision_chunk(chunk, send_emails))
+
+    outcomes.sort(key=lambda outcome: outcome['line'])
+    return outcomes
+
+def summarize(outcomes):
+    """Return {status: count} for a list of outcomes."""
+    summary = {}
+    for outcome in outcomes:
+        summary[outcome['status']] = summary.get(outcome['status'], 0) + 1
+    return summary
+
+# ───────────────────────────────────────────────────────────
+def _outcome(line_number, student_id, status, message):
+    return {'line': line_number, 'student_id': str(student_id), 'status': status, 'message': message}
+
+def _provision_chunk(chunk, send_emails):
+    student_ids = [student_id for _, student_id in chunk]
+
+    # Two set-based lookups for the whole chunk instead of two queries per student
+    students = {
+        row.StudentId: row for row in db.session.query(Student.StudentId, Student.Name, Student.Email)
+        .filter(Student.StudentId.in_(student_ids))
+    }
+    # A student is taken if an account links to them or already uses their ID as its username
+    taken = set()
+    for account_student_id, username in db.session.query(User.StudentId, User.Username).filter(
+        or_(User.StudentId.in_(student_ids), User.Username.in_([str(sid) for sid in student_ids]))
+    ):
+        taken.add(account_student_id)
+        if username.isdigit():
+            taken.add(int(username))
+
+    outcomes = []
+    new_students = []
+    for line_number, student_id in chunk:
+        if student_id not in students:
+            outcomes.append(_outcome(line_number, student_id, NOT_FOUND, 'Not found in student records.'))
+        elif student_id in taken:
+            outcomes.append(_outcome(line_number, student_id, EXISTS, 'Already has a login account.'))
+        else:
+            new_students.append((line_number, students[student_id]))
+
+    if not new_students:
+        return outcomes
+
+    try:
+        # Same account shape as create_student: no password until the student sets one
+        user_rows = [
+            {'Username': str(student.StudentId), 'StudentId': student.StudentId, 'Password': None, 'SystemRole': 'student'}
+            for _, student in new_students
+        ]
+        for start in range(0, len(user_rows), _USERS_PER_INSERT):
+            db.session.execute(insert(User).values(user_rows[start:start + _USERS_PER_INSERT]))
+
+        messages = []
+        if send_emails:
+            for _, student in new_students:
+                if student.Email:
+                    subject, html, text = email_service.build_student_credentials(student.Name, student.Email, student.StudentId)
+                    messages.append((student.Email, subject, html, text, student.StudentId))
+            enqueue_emails(messages, commit=False)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error provisioning {len(new_students)} student accounts: {e}")
+        return outcomes + [
+            _outcome(line_number, student.StudentId, FAILED, 'Could not create account. Please try again.')
+            for line_number, student in new_students
+        ]
+
+    if messages:
+        email_outbox.wake()
+    student_index.accounts_changed(*(student.StudentId for _, student in new_students))
+
+    for line_number, student in new_students:
+        if not send_emails:
+            message = 'Account created.'
+        elif student.Email:
+            message = f'Account created. Setup email queued for {student.Email}.'
+        else:
+            message = 'Account created. No email on file; provide the setup link manually.'
+        outcomes.append(_outcome(line_number, student.StudentId, CREATED, message))
+    return outcomes
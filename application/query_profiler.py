@@ -0,0 +1,183 @@
+# application/query_profiler.py
+import time
+from datetime import date, datetime
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from application.metrics import metrics
+
+# Counts and times every statement a request runs, whether it goes through the
+# SQLAlchemy engine (engine events) or a raw pyodbc cursor from
+# get_db_connection() (wrapped by profiled()). Per endpoint, the totals go to
+# the metrics histograms; in debug mode (or with QUERY_PROFILER_HEADERS) they
+# are also sent back as X-DB-* and Server-Timing headers. A statement slower
+# than SLOW_QUERY_MS is printed with the types of its parameters, not their values.
+
+SLOWEST_KEPT = 3
+
+metrics.histogram('db_query_duration_seconds', 'Time spent in single database statements.')
+metrics.histogram('db_queries_per_request', 'Database statements run per request, by endpoint.',
+                  buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+metrics.histogram('db_time_per_request_seconds', 'Total database time per request, by endpoint.')
+metrics.counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS, by endpoint.')
+
+
+def parameter_shape(parameters):
+    """Describe bound parameters by type (and string length) without exposing their values."""
+    if parameters is None:
+        return '()'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {_type_name(value)}' for name, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        if parameters and all(isinstance(row, (list, tuple, dict)) for row in parameters):
+            # executemany: one row's shape is enough
+            return f'{len(parameters)} x {parameter_shape(parameters[0])}'
+        return '(' + ', '.join(_type_name(value) for value in parameters) + ')'
+    return _type_name(parameters)
+
+def record_query(statement, parameters, duration):
+    """Add one executed statement to this request's totals and to the slow-query log."""
+    metrics.observe('db_query_duration_seconds', duration)
+    endpoint = None
+    if has_request_context():
+        stats = g.setdefault('query_stats', {'count': 0, 'time': 0.0, 'slowest': []})
+        stats['count'] += 1
+        stats['time'] += duration
+        slowest = stats['slowest']
+        if len(slowest) < SLOWEST_KEPT or duration > slowest[-1][0]:
+            slowest.append((duration, statement))
+            slowest.sort(key=lambda item: item[0], reverse=True)
+            del slowest[SLOWEST_KEPT:]
+        endpoint = request.endpoint
+
+    threshold = current_app.config.get('SLOW_QUERY_MS', 250) if has_app_context() else 250
+    if threshold is not None and duration * 1000 >= threshold:
+        metrics.inc('db_slow_queries_total', endpoint=endpoint or 'none')
+        print(f"[slow query] {duration * 1000:.0f} ms in {endpoint or 'background'}: "
+              f"{' '.join(str(statement).split())[:1000]} params={parameter_shape(parameters)}")
+
+
+class ProfiledCursor:
+    """pyodbc cursor proxy that times execute() and executemany()."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, statement, *parameters):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(statement, *parameters)
+        finally:
+            record_query(statement, parameters[0] if len(parameters) == 1 else parameters,
+                         time.perf_counter() - started)
+        # pyodbc returns the cursor itself so calls can be chained
+        return self if result is self._cursor else result
+
+    def executemany(self, statement, rows):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(statement, rows)
+        finally:
+            record_query(statement, rows, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ProfiledConnection:
+    """Connection proxy whose cursors are profiled; everything else passes through."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return ProfiledCursor(self._connection.cursor())
+
+    def execute(self, statement, *parameters):
+        return self.cursor().execute(statement, *parameters)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._connection.close()
+
+
+def profiled(connection):
+    """Wrap a raw connection from get_db_connection() so its statements are counted."""
+    return ProfiledConnection(connection) if connection is not None else None
+
+
+class QueryProfiler:
+    """Hooks the engine events and the request cycle."""
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app):
+        if 'query_profiler' in app.extensions:
+            return
+        app.extensions['query_profiler'] = self
+        if not self._listening:
+            # Every engine, including ones Flask-SQLAlchemy creates later
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+            event.listen(Engine, 'handle_error', self._on_error)
+            self._listening = True
+        app.after_request(self._after_request)
+
+    # ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        record_query(statement, parameters, time.perf_counter() - started)
+
+    @staticmethod
+    def _on_error(context):
+        # A failed statement never reaches after_cursor_execute
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    @staticmethod
+    def _after_request(response):
+        stats = g.pop('query_stats', None) or {'count': 0, 'time': 0.0, 'slowest': []}
+        endpoint = request.endpoint or 'none'
+        if endpoint == 'metrics':
+            return response
+        metrics.observe('db_queries_per_request', stats['count'], endpoint=endpoint)
+        metrics.observe('db_time_per_request_seconds', stats['time'], endpoint=endpoint)
+
+        if current_app.debug or current_app.config.get('QUERY_PROFILER_HEADERS'):
+            response.headers['X-DB-Query-Count'] = str(stats['count'])
+            response.headers['X-DB-Time-Ms'] = f"{stats['time'] * 1000:.1f}"
+            response.headers['X-DB-Slowest-Ms'] = ', '.join(f"{duration * 1000:.1f}" for duration, _ in stats['slowest'])
+            response.headers['Server-Timing'] = f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries"'
+        return response
+
+
+def _type_name(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return f'str[{len(value)}]'
+    if isinstance(value, bytes):
+        return f'bytes[{len(value)}]'
+    if isinstance(value, datetime):
+        return 'datetime'
+    if isinstance(value, date):
+        return 'date'
+    return type(value).__name__
+
+
+query_profiler = QueryProfiler()
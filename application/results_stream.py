@@ -0,0 +1,206 @@
+# application/results_stream.py
+import json
+import queue
+import threading
+import time
+from flask import current_app
+from application.tally_service import get_tallies
+from application.cache import TTLCache
+
+# Live poll results over Server-Sent Events. Each worker runs at most one producer
+# thread per poll; it reads PollTallies and fans changes out to every viewer
+# connected to that worker, so N viewers cost one tally read per interval.
+#
+# Every open stream holds one of the worker's request threads. Under gunicorn,
+# post_fork calls reserve_threads() so streams can never take the threads that
+# voting and login need. Viewers who don't get a stream poll latest() instead,
+# which answers from the producer's last read, or from a tally read shared by
+# every poller of that poll for RESULTS_STREAM_INTERVAL seconds.
+
+
+class _PollChannel:
+    def __init__(self, poll_id):
+        self.poll_id = poll_id
+        self.subscribers = set()
+        self.counts = None          # {option_id: vote_count} as last published
+        self.wake = threading.Event()
+
+
+class _StreamBody:
+    """SSE response body that holds one of the worker's stream slots until the server closes it."""
+
+    def __init__(self, broker, events):
+        self._broker = broker
+        self._events = events
+        self._closed = False
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._events.close()
+        self._broker._release_slot()
+
+
+class ResultsBroker:
+    """In-process fan-out of tally changes from one producer per poll to its subscribers."""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._open_streams = 0
+        self.max_streams = None     # set from the thread count by reserve_threads()
+        self._latest = TTLCache(maxsize=1000)
+
+    def reserve_threads(self, threads, reserved=2):
+        """Let streams use at most `threads - reserved` of this worker's request threads."""
+        self.max_streams = max(0, threads - reserved)
+
+    # ───────────────────────────────────────────────────────────
+    def stream(self, poll_id):
+        """Return an SSE body for a poll's live tallies, or None when this worker has no stream slot free."""
+        config = current_app.config
+        limit = config.get('RESULTS_STREAM_MAX_SUBSCRIBERS', 100)
+        if self.max_streams is not None:
+            limit = min(limit, self.max_streams)
+        with self._lock:
+            if self._open_streams >= limit:
+                return None
+            self._open_streams += 1
+        # Subscribing happens on first iteration, so a response that is never sent only holds the slot until closed
+        return _StreamBody(self, self._events(
+            current_app._get_current_object(), poll_id,
+            heartbeat=config.get('RESULTS_STREAM_HEARTBEAT', 15),
+            max_seconds=config.get('RESULTS_STREAM_MAX_SECONDS', 300)
+        ))
+
+    def latest(self, poll_id):
+        """The poll's current tallies as one full update, for viewers polling instead of streaming."""
+        with self._lock:
+            channel = self._channels.get(poll_id)
+            if channel is not None and channel.counts is not None:
+                return self._snapshot(channel)
+        message = self._latest.get(poll_id)
+        if message is None:
+            counts = {option_id: vote_count for option_id, _, vote_count in get_tallies(poll_id)}
+            message = self._message(counts, counts)
+            self._latest.set(poll_id, message, ttl=current_app.config.get('RESULTS_STREAM_INTERVAL', 2))
+        return message
+
+    def notify(self, poll_id):
+        """Wake a poll's producer now instead of at its next interval, e.g. after a local vote."""
+        with self._lock:
+            channel = self._channels.get(poll_id)
+        if channel is not None:
+            channel.wake.set()
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(channel.subscribers) for channel in self._channels.values())
+
+    def _release_slot(self):
+        with self._lock:
+            self._open_streams -= 1
+
+    # ───────────────────────────────────────────────────────────
+    def _subscribe(self, app, poll_id):
+        subscriber = queue.Queue(maxsize=app.config.get('RESULTS_STREAM_QUEUE_SIZE', 16))
+
+        with self._lock:
+            channel = self._channels.get(poll_id)
+            if channel is None:
+                channel = self._channels[poll_id] = _PollChannel(poll_id)
+                threading.Thread(
+                    target=self._produce, args=(app, channel),
+                    name=f"results-stream-{poll_id}", daemon=True
+                ).start()
+            elif channel.counts is not None:
+                # Late joiners get the current state straight from memory
+                subscriber.put_nowait(self._snapshot(channel))
+            channel.subscribers.add(subscriber)
+        return subscriber
+
+    def _unsubscribe(self, poll_id, subscriber):
+        with self._lock:
+            channel = self._channels.get(poll_id)
+            if channel is None:
+                return
+            channel.subscribers.discard(subscriber)
+        # Let an idle producer notice and exit straight away
+        channel.wake.set()
+
+    def _produce(self, app, channel):
+        interval = app.config.get('RESULTS_STREAM_INTERVAL', 2)
+        while True:
+            with self._lock:
+                if not channel.subscribers:
+                    self._channels.pop(channel.poll_id, None)
+                    return
+
+            # Clear before reading so a vote landing mid-read still triggers another pass
+            channel.wake.clear()
+            try:
+                with app.app_context():
+                    rows = get_tallies(channel.poll_id)
+                counts = {option_id: vote_count for option_id, _, vote_count in rows}
+            except Exception as e:
+                print(f"Error reading tallies for poll {channel.poll_id}: {e}")
+                counts = None
+
+            if counts is not None and counts != channel.counts:
+                with self._lock:
+                    previous = channel.counts or {}
+                    channel.counts = counts
+                    message = self._message(counts, {
+                        option_id: vote_count for option_id, vote_count in counts.items()
+                        if previous.get(option_id) != vote_count
+                    })
+                    for subscriber in channel.subscribers:
+                        self._offer(subscriber, message, channel)
+
+            channel.wake.wait(interval)
+
+    @staticmethod
+    def _message(all_counts, changed_counts):
+        return {
+            'counts': {str(option_id): vote_count for option_id, vote_count in changed_counts.items()},
+            'total_votes': sum(all_counts.values())
+        }
+
+    def _snapshot(self, channel):
+        return self._message(channel.counts, channel.counts)
+
+    def _offer(self, subscriber, message, channel):
+        try:
+            subscriber.put_nowait(message)
+        except queue.Full:
+            # Slow reader: replace its backlog with one full snapshot so no delta is lost
+            while True:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    break
+            subscriber.put_nowait(self._snapshot(channel))
+
+    def _events(self, app, poll_id, heartbeat, max_seconds):
+        subscriber = self._subscribe(app, poll_id)
+        try:
+            # Browsers reconnect after this many ms when the stream ends
+            yield "retry: 3000\n\n"
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    message = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies from timing out and detects closed clients
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: tally\ndata: {json.dumps(message)}\n\n"
+        finally:
+            self._unsubscribe(poll_id, subscriber)
+
+
+results_broker = ResultsBroker()
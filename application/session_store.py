@@ -0,0 +1,74 @@
+# application/session_store.py
+from datetime import timedelta
+from application.cache import TTLCache
+from application.models import db
+
+# Chooses where Flask-Session keeps server-side sessions (SESSION_BACKEND):
+#
+#   sqlalchemy  the Sessions table in SQL Server (default)
+#   memory      an LRU in this process: no round-trip at all, but each worker
+#               has its own, so only for a single gunicorn worker
+#   redis       any Redis-protocol server at SESSION_REDIS_URL (Redis, Valkey,
+#               a local stand-in...); needs the redis package
+#
+# Whatever the backend, a session is written only when a request changed it,
+# not on every request, and the stored copy expires SESSION_STORE_TTL seconds
+# (default PERMANENT_SESSION_LIFETIME) after its last change. memory and redis
+# drop expired entries themselves; expired rows in the Sessions table are
+# deleted in bulk by session_sweeper, never by a request.
+
+BACKENDS = ('sqlalchemy', 'memory', 'redis')
+
+
+class MemorySessionCache:
+    """The part of the cachelib interface Flask-Session uses, over an LRU TTLCache."""
+
+    def __init__(self, maxsize=10000):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def get(self, key):
+        data = self._cache.get(key)
+        # Copies, so a request can't change the stored session without saving it
+        return dict(data) if data is not None else None
+
+    def set(self, key, value, timeout=None):
+        self._cache.set(key, dict(value), ttl=timeout)
+        return True
+
+    def delete(self, key):
+        return self._cache.pop(key) is not None
+
+    def clear(self):
+        self._cache.clear()
+        return True
+
+    def __len__(self):
+        return len(self._cache)
+
+# ───────────────────────────────────────────────────────────
+def configure_sessions(app):
+    """Point Flask-Session at SESSION_BACKEND; call before Session(app)."""
+    config = app.config
+    backend = config.get('SESSION_BACKEND', 'sqlalchemy')
+    if backend == 'sqlalchemy':
+        config.update(SESSION_TYPE='sqlalchemy', SESSION_SQLALCHEMY=db)
+    elif backend == 'memory':
+        config.update(SESSION_TYPE='cachelib',
+                      SESSION_CACHELIB=MemorySessionCache(config.get('SESSION_MEMORY_MAX', 10000)))
+    elif backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND = 'redis' needs the redis package (pip install redis)")
+        config.update(SESSION_TYPE='redis',
+                      SESSION_REDIS=redis.Redis.from_url(config.get('SESSION_REDIS_URL', 'redis://localhost:6379/0')))
+    else:
+        raise RuntimeError(f"Unknown SESSION_BACKEND {backend!r}; use one of {', '.join(BACKENDS)}")
+
+    # Only save sessions a request actually changed (login, flash, MFA)
+    config['SESSION_REFRESH_EACH_REQUEST'] = False
+    if config.get('SESSION_STORE_TTL'):
+        # Session cookies last until the browser closes (SESSION_PERMANENT=False),
+        # so this only sets how long the server keeps a session nobody changes
+        app.permanent_session_lifetime = timedelta(seconds=config['SESSION_STORE_TTL'])
+    return backend
@@ -0,0 +1,105 @@
+# application/session_sweeper.py
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from flask import current_app
+from application.models import db
+from application.metrics import metrics
+from application.background import WorkerThreads
+
+# Deletes dead rows from the Flask-Session table (SESSION_BACKEND = 'sqlalchemy')
+# in chunks of CHUNK_SIZE, committing after each, on a background thread every
+# SESSION_SWEEP_INTERVAL seconds (and from `flask sweep-sessions`).
+#
+# A row is dead when it has expired, or when it hasn't been written for
+# SESSION_IDLE_TIMEOUT seconds. Every login writes login_time, so a session
+# left that long is one login_required would turn away anyway; sweeping it
+# just stops the table growing with them. Flask-Session stores
+# expiry = last write + PERMANENT_SESSION_LIFETIME, so the last write is
+# recovered from expiry without reading the session data.
+
+CHUNK_SIZE = 5000
+
+metrics.counter('sessions_swept_total', 'Server-side sessions deleted by the sweeper, by reason.')
+
+# ───────────────────────────────────────────────────────────
+def session_model():
+    """The Flask-Session table model, or None when sessions aren't kept in the database."""
+    return getattr(current_app.session_interface, 'sql_session_model', None)
+
+def sweep_sessions(chunk_size=CHUNK_SIZE, idle_timeout=None):
+    """Delete expired and idle sessions. Returns {'expired': rows, 'idle': rows}."""
+    model = session_model()
+    if model is None:
+        return {}
+    if idle_timeout is None:
+        idle_timeout = current_app.config.get('SESSION_IDLE_TIMEOUT', 1800)
+
+    now = datetime.utcnow()
+    lifetime = current_app.permanent_session_lifetime
+    conditions = {'expired': model.expiry <= now}
+    if idle_timeout and timedelta(seconds=idle_timeout) < lifetime:
+        # Last written before now - idle_timeout
+        conditions['idle'] = model.expiry <= now + lifetime - timedelta(seconds=idle_timeout)
+
+    counts = {}
+    for reason, condition in conditions.items():
+        counts[reason] = 0
+        while True:
+            chunk = select(model.id).where(condition).limit(chunk_size)
+            try:
+                deleted = db.session.execute(delete(model).where(condition, model.id.in_(chunk))).rowcount
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            counts[reason] += deleted
+            if deleted < chunk_size:
+                break
+        if counts[reason]:
+            metrics.inc('sessions_swept_total', counts[reason], reason=reason)
+    return counts
+
+
+class SessionSweeper:
+    """Runs sweep_sessions() every SESSION_SWEEP_INTERVAL seconds on a background thread per worker."""
+
+    def __init__(self):
+        self._app = None
+        self._threads = WorkerThreads(self._start_sweeper)
+
+    def init_app(self, app):
+        """Call after Session(app); declares the expiry index for `flask init-db`."""
+        self._app = app
+        if 'session_sweeper' in app.extensions:
+            return
+        app.extensions['session_sweeper'] = self
+        model = getattr(app.session_interface, 'sql_session_model', None)
+        if model is None:
+            return
+        if not any(index.name == 'IX_sessions_expiry' for index in model.__table__.indexes):
+            db.Index('IX_sessions_expiry', model.__table__.c.expiry)
+        if app.config.get('SESSION_SWEEP_INTERVAL', 300):
+            self._threads.init_app(app)
+
+    def _start_sweeper(self):
+        threading.Thread(target=self._run, name="session-sweeper", daemon=True).start()
+
+    def _run(self):
+        interval = self._app.config.get('SESSION_SWEEP_INTERVAL', 300)
+        # Spread the workers out so they don't all sweep at once
+        time.sleep(random.uniform(0, interval))
+        while True:
+            try:
+                with self._app.app_context():
+                    counts = sweep_sessions(self._app.config.get('SESSION_SWEEP_CHUNK_SIZE', CHUNK_SIZE))
+                if any(counts.values()):
+                    print(f"Swept sessions: {counts}")
+            except Exception as e:
+                print(f"Session sweep error: {e}")
+            time.sleep(interval)
+
+
+session_sweeper = SessionSweeper()
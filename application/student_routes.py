@@ -1,25 +1,21 @@
-from flask import render_template, request, redirect, url_for, session, flash, Blueprint
+from flask import render_template, request, redirect, url_for, session, flash, Blueprint, Response, jsonify
 import pyotp, qrcode
 from io import BytesIO
 from base64 import b64encode
 import pyodbc
-from datetime import datetime, timedelta, timezone
-import secrets
-import hashlib
-import bcrypt
+from datetime import datetime, timezone
 import os
 from application.misc_routes import validate_password_nist
-from application.auth_utils import login_required_with_mfa
-from application.models import db, User, CCAMembers, Poll, PollOption, PollVote, VoteToken, Student, CCA
-from sqlalchemy import func, and_, or_, case, literal_column
-
-def convert_utc_to_gmt8_display(utc_datetime):
-    """Convert UTC datetime to GMT+8 for display purposes"""
-    if utc_datetime and isinstance(utc_datetime, datetime):
-        # Add 8 hours to convert UTC to GMT+8
-        gmt8_datetime = utc_datetime + timedelta(hours=8)
-        return gmt8_datetime.strftime('%Y-%m-%d %H:%M')
-    return str(utc_datetime) if utc_datetime else 'N/A'
+from application.auth_utils import login_required_with_mfa, is_any_cca_moderator, is_cca_moderator, get_auth_context
+from application.models import db, User, CCAMembers, Poll, PollOption, PollVote, Student, CCA
+from sqlalchemy import and_, or_, case
+from application.date_utils import convert_utc_to_gmt8_display
+from application.dashboard_service import get_dashboard_data, invalidate_dashboard
+from application.tally_service import get_tallies
+from application.vote_ingest import vote_ingestor, get_poll_meta, poll_is_open, RECORDED, DUPLICATE, PENDING
+from application.vote_tokens import issue_vote_token, verify_vote_token, VALID, EXPIRED
+from application.results_stream import results_broker
+from application.password_hashing import password_hasher
 
 # Create a Blueprint
 student_bp = Blueprint('student_routes', __name__)
@@ -90,66 +86,17 @@ def register_student_routes(app, get_db_connection, login_required):
             return redirect(url_for('admin_routes.admin_dashboard'))
         
         try:
-            # Get user and calculate password expiry warning
-            user = User.query.filter_by(UserId=session['user_id']).first()
-            days_left = None
-            if user and user.PasswordLastSet:
-                # Make sure both datetimes are timezone-aware for comparison
-                password_last_set = user.PasswordLastSet
-                if password_last_set.tzinfo is None:
-                    # If database datetime is naive, assume it's UTC
-                    password_last_set = password_last_set.replace(tzinfo=timezone.utc)
-                
-                days_since = (datetime.now(timezone.utc) - password_last_set).days
-                days_left = 365 - days_since
-
-            # Get CCAs the user is a member of
-            user_ccas = db.session.query(CCA.CCAId, CCA.Name, CCA.Description, CCAMembers.CCARole).join(CCAMembers, CCA.CCAId == CCAMembers.CCAId).filter(CCAMembers.UserId == session['user_id']).all()
-            
-            ccas = []
-            user_is_moderator = False
-            for cca_row in user_ccas:
-                ccas.append({
-                    'id': cca_row[0],
-                    'name': cca_row[1],
-                    'description': cca_row[2],
-                    'role': cca_row[3]
-                })
-                if cca_row[3] == 'moderator':
-                    user_is_moderator = True
-            
-            if ccas:
-                cca_ids = [c['id'] for c in ccas]
-
-                # Get active polls in user's CCAs
-                poll_results = db.session.query(
-                    Poll.PollId,
-                    Poll.Question,
-                    Poll.EndDate,
-                    CCA.Name.label('CCAName'),
-                    func.datediff(literal_column('day'), func.now(), Poll.EndDate).label('DaysRemaining')
-                ).join(CCA, Poll.CCAId == CCA.CCAId).filter(Poll.CCAId.in_(cca_ids), Poll.IsActive == True).order_by(Poll.EndDate.asc()).all()
-                
-                available_polls = []
-                for poll_row in poll_results:
-                    available_polls.append({
-                        'id': poll_row[0],
-                        'title': poll_row[1],
-                        'end_date': convert_utc_to_gmt8_display(poll_row[2]).split(' ')[0] if poll_row[2] else '',  # Just date part
-                        'cca': poll_row[3],
-                        'days_remaining': poll_row[4] if poll_row[4] is not None else 0
-                    })
-            else:
-                available_polls = []
+            # Password expiry, CCAs and active polls come from one query (or the per-user cache)
+            data = get_dashboard_data(session['user_id'])
             
             return render_template(
                 'dashboard.html',
-                ccas=ccas,
-                available_polls=available_polls,
+                ccas=data['ccas'],
+                available_polls=data['available_polls'],
                 user_name=session['name'],
                 user_role=session['role'],
-                user_is_moderator=user_is_moderator,
-                password_days_left=days_left
+                user_is_moderator=data['user_is_moderator'],
+                password_days_left=data['password_days_left']
             )
             
         except Exception as e:
@@ -211,7 +158,7 @@ def register_student_routes(app, get_db_connection, login_required):
 
         try:
             # Check if user is a moderator in CCA
-            user_is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCARole='moderator').count() > 0
+            user_is_moderator = is_any_cca_moderator()
             # Get IDs of all CCAs the user is a member of
             user_cca_ids = [cca.CCAId for cca in db.session.query(CCA.CCAId).join(CCAMembers).filter(CCAMembers.UserId == session['user_id']).distinct().all()]
 
@@ -256,7 +203,7 @@ def register_student_routes(app, get_db_connection, login_required):
     def view_poll_detail(poll_id):
         try:
             # Check if user is moderator
-            user_is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCARole='moderator').count() > 0
+            user_is_moderator = is_any_cca_moderator()
 
             # Get poll details
             poll_data_row = db.session.query(
@@ -301,25 +248,13 @@ def register_student_routes(app, get_db_connection, login_required):
                 'LiveIsActive': poll_data_row[7],
                 'is_ended': is_ended_status
             }
-            options_data = db.session.query(
-                PollOption.OptionId, PollOption.OptionText, func.count(PollVote.VoteId).label('VoteCount')
-            ).outerjoin(PollVote, PollOption.OptionId == PollVote.OptionId).filter(PollOption.PollId == poll_id).group_by(PollOption.OptionId, PollOption.OptionText).order_by(PollOption.OptionId).all()
+            options_data = get_tallies(poll_id)
             
-            # Gets poll options and vote counts.
+            # Gets poll options and vote counts from the materialized tallies.
             options = [{'OptionId': opt[0], 'OptionText': opt[1], 'VoteCount': opt[2]} for opt in options_data]
 
             # Check if user has voted
-            has_voted = False
-            if poll['IsAnonymous']:
-                # For anonymous polls, check if the user's token has been used
-                token_status = db.session.query(VoteToken.IsUsed).filter_by(PollId=poll_id, UserId=session['user_id']).first()
-                # Checks if the user's vote token has been used.
-                if token_status and token_status[0]:
-                    has_voted = True
-            else:
-                # For non-anonymous polls, check the Votes table directly
-                if db.session.query(PollVote).filter(and_(PollVote.PollId == poll_id, PollVote.UserId == session['user_id'])).count() > 0:
-                    has_voted = True
+            has_voted = db.session.query(PollVote).filter(and_(PollVote.PollId == poll_id, PollVote.UserId == session['user_id'])).count() > 0
             
             user_votes = []
             if has_voted and poll['QuestionType'] == 'multiple':
@@ -328,38 +263,9 @@ def register_student_routes(app, get_db_connection, login_required):
                 user_votes = [uv[0] for uv in user_votes_data]
 
             vote_token = None
-            if poll['IsAnonymous'] and poll['LiveIsActive']:
-                # Check if token already exists and if it is unused
-                token_status_row = db.session.query(VoteToken.IsUsed).filter_by(PollId=poll_id, UserId=session['user_id']).first()
-
-                if token_status_row:
-                    is_used = token_status_row[0]
-                    if not is_used:
-                        # Token exists but unused → safely delete and reissue
-                        db.session.query(VoteToken).filter_by(PollId=poll_id, UserId=session['user_id']).delete()
-                        db.session.commit()
-
-                        # Reissue a new token
-                        raw_token = secrets.token_hex(32)
-                        hashed_token = hashlib.sha256(raw_token.encode()).hexdigest()
-                        new_token = VoteToken(Token=hashed_token, PollId=poll_id, UserId=session['user_id'], IssuedTime=datetime.now(timezone.utc), ExpiryTime=datetime.now(timezone.utc) + timedelta(minutes=10))
-                        db.session.add(new_token)
-                        db.session.commit()
-
-                        # Inserts a new vote token for the user.
-                        vote_token = raw_token
-                    else:
-                        vote_token = None  # Already used, no reissue
-                else:
-                    # No token exists yet → issue first time
-                    raw_token = secrets.token_hex(32)
-                    hashed_token = hashlib.sha256(raw_token.encode()).hexdigest()
-                    new_token = VoteToken(Token=hashed_token, PollId=poll_id, UserId=session['user_id'], IssuedTime=datetime.now(timezone.utc), ExpiryTime=datetime.now(timezone.utc) + timedelta(minutes=10))
-                    db.session.add(new_token)
-                    db.session.commit()
-
-                    # Inserts a new vote token for the user.
-                    vote_token = raw_token
+            if poll['IsAnonymous'] and poll['LiveIsActive'] and not has_voted:
+                # Signed token, nothing stored until it is redeemed in submit_vote
+                vote_token = issue_vote_token(session['user_id'], poll_id)
 
             return render_template('poll_detail.html', 
                                 poll=poll, 
@@ -382,91 +288,73 @@ def register_student_routes(app, get_db_connection, login_required):
             return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
         try:
-            # Get poll information to validate the vote
-            poll_info = db.session.query(Poll.IsActive, Poll.CCAId, Poll.QuestionType).filter_by(PollId=poll_id).first()
+            # Poll metadata and membership come from short-lived caches, not per-vote queries
+            poll = get_poll_meta(poll_id)
 
-            if not poll_info:
+            if not poll:
                 flash('Access denied.', 'error')
                 return redirect(url_for('student_routes.view_polls'))
 
-            live_is_active, cca_id, question_type = poll_info
-
-            if not live_is_active:
+            if not poll_is_open(poll):
                 flash('This poll is closed for voting.', 'error')
                 return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
             # Check if user is a member of the CCA
-            is_member_of_cca = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCAId=cca_id).count() > 0
-
-            if not is_member_of_cca:
+            if poll['cca_id'] not in get_auth_context(session['user_id'])['member_cca_ids']:
                 flash('Access denied.', 'error')
                 return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
-            # Check if user has already voted
-            has_voted = db.session.query(PollVote).filter_by(PollId=poll_id, UserId=session['user_id']).count() > 0
-            # Check if poll is anonymous
-            is_anonymous = db.session.query(Poll.IsAnonymous).filter_by(PollId=poll_id).scalar()
-
             selected_option_ids = []
-            if question_type == 'single_choice':
+            if poll['question_type'] == 'single_choice':
                 option_id = request.form.get('option_id')
                 if option_id:
                     selected_option_ids.append(option_id)
-            elif question_type == 'multiple_choice':
+            elif poll['question_type'] == 'multiple_choice':
                 selected_option_ids = request.form.getlist('option_ids[]')
             else:
                 flash('Invalid poll type.', 'error')
                 return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
-            # Get valid option IDs for the poll
-            valid_option_ids_tuples = db.session.query(PollOption.OptionId).filter_by(PollId=poll_id).all()
-            valid_option_ids = [str(opt_id[0]) for opt_id in valid_option_ids_tuples]
-
+            # Validate the selection against the poll's options
+            valid_option_ids = {str(opt_id) for opt_id in poll['option_ids']}
             for opt_id in selected_option_ids:
                 if opt_id not in valid_option_ids:
                     flash(f'Invalid option selected: {opt_id}', 'error')
                     return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
-            # Token validation only if not already voted
-            if is_anonymous and not has_voted:
+            if not selected_option_ids:
+                flash('Please select an option before submitting.', 'error')
+                return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
+
+            redeemed_token = None
+            if poll['is_anonymous']:
                 raw_token = request.form.get('vote_token')
                 if not raw_token:
                     flash('Missing vote token for anonymous poll.', 'error')
                     return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
-                # Get vote token for validation
-                hashed_token = hashlib.sha256(raw_token.encode()).hexdigest()
-                token_row = db.session.query(VoteToken).filter_by(Token=hashed_token, PollId=poll_id, UserId=session['user_id']).first()
-
-                if not token_row:
+                token_status, redeemed_token = verify_vote_token(raw_token, session['user_id'], poll_id)
+                if token_status == EXPIRED:
+                    flash('Your vote token has expired. Please refresh and try again.', 'error')
+                    return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
+                if token_status != VALID:
                     flash('Invalid or expired vote token.', 'error')
                     return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
-                is_used, expiry_time = token_row.IsUsed, token_row.ExpiryTime
-                if is_used:
-                    flash('This vote token has already been used.', 'error')
-                    return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
-                if expiry_time:
-                    # Make sure both datetimes are timezone-aware for comparison
-                    if expiry_time.tzinfo is None:
-                        # If database datetime is naive, assume it's UTC
-                        expiry_time = expiry_time.replace(tzinfo=timezone.utc)
-                    
-                    if datetime.now(timezone.utc) > expiry_time:
-                        flash('Your vote token has expired. Please refresh and try again.', 'error')
-                        return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
-                
-                token_row.IsUsed = True
-
-            # Insert vote only if not already voted
-            if not has_voted:
-                for option_id in selected_option_ids:
-                    new_vote = PollVote(PollId=poll_id, OptionId=option_id, UserId=session['user_id'], VotedTime=datetime.now(timezone.utc))
-                    db.session.add(new_vote)
-                db.session.commit()
+            # Batched write; returns once this ballot is committed (or rejected as a repeat)
+            result = vote_ingestor.submit(
+                poll_id, session['user_id'], sorted({int(opt_id) for opt_id in selected_option_ids}), redeemed_token
+            )
+
+            if result == RECORDED:
+                results_broker.notify(poll_id)
                 flash('Your vote has been submitted successfully.', 'success')
-            else:
+            elif result == DUPLICATE:
                 flash('You have already voted in this poll.', 'info')
+            elif result == PENDING:
+                flash('Your vote was received and is still being recorded. Refresh in a moment to confirm.', 'info')
+            else:
+                flash('An error occurred while submitting your vote. Please try again.', 'error')
 
         except Exception as e:
             db.session.rollback()
@@ -496,7 +384,7 @@ def register_student_routes(app, get_db_connection, login_required):
             # Get basic poll information for results page           
             poll_info = db.session.query(
                 Poll.PollId, Poll.Question, Poll.IsAnonymous, Poll.StartDate, Poll.EndDate, 
-                Poll.QuestionType, CCA.Name.label('CCAName')
+                Poll.QuestionType, CCA.Name.label('CCAName'), Poll.IsActive
             ).join(CCA, Poll.CCAId == CCA.CCAId).filter(Poll.PollId == poll_id).first()
 
             if not poll_info:
@@ -510,13 +398,12 @@ def register_student_routes(app, get_db_connection, login_required):
                 'StartDate': convert_utc_to_gmt8_display(poll_info[3]),
                 'EndDate': convert_utc_to_gmt8_display(poll_info[4]),
                 'QuestionType': poll_info[5],
-                'CCAName': poll_info[6]
+                'CCAName': poll_info[6],
+                'IsActive': poll_info[7]
             }
             
-            # Get poll options with vote counts
-            options_data = db.session.query(
-                PollOption.OptionId, PollOption.OptionText, func.count(PollVote.VoteId).label('VoteCount')
-            ).outerjoin(PollVote, PollOption.OptionId == PollVote.OptionId).filter(PollOption.PollId == poll_id).group_by(PollOption.OptionId, PollOption.OptionText).order_by(func.count(PollVote.VoteId).desc()).all()
+            # Get poll options with vote counts, most votes first
+            options_data = sorted(get_tallies(poll_id), key=lambda opt: opt[2], reverse=True)
             
             # Calculate total votes
             total_votes = sum(opt[2] for opt in options_data)
@@ -574,6 +461,46 @@ def register_student_routes(app, get_db_connection, login_required):
             flash('Error fetching poll results.', 'error')
             return redirect(url_for('student_routes.view_poll_detail', poll_id=poll_id))
 
+    def live_results_status(poll_id):
+        # Live results are fetched by scripts, which can't follow flash/redirects, so failures are bare status codes
+        poll_info = db.session.query(Poll.IsAnonymous, Poll.CCAId).filter_by(PollId=poll_id).first()
+        if not poll_info:
+            return 404
+
+        is_anonymous, cca_id = poll_info
+        if is_anonymous and not is_cca_moderator(cca_id) and session['role'] != 'admin':
+            return 403
+        return None
+
+    @student_bp.route('/poll/<int:poll_id>/results/stream')
+    @login_required_with_mfa
+    def stream_poll_results(poll_id):
+        status = live_results_status(poll_id)
+        if status:
+            return '', status
+
+        events = results_broker.stream(poll_id)
+        if events is None:
+            # No stream slot free: the page polls /results/latest instead
+            return '', 503, {'Retry-After': '30'}
+
+        return Response(events, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        })
+
+    @student_bp.route('/poll/<int:poll_id>/results/latest')
+    @login_required_with_mfa
+    def latest_poll_results(poll_id):
+        status = live_results_status(poll_id)
+        if status:
+            return '', status
+
+        response = jsonify(results_broker.latest(poll_id))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
     @student_bp.route('/cca/<int:cca_id>')
     @login_required_with_mfa
     def student_view_cca(cca_id):
@@ -584,7 +511,7 @@ def register_student_routes(app, get_db_connection, login_required):
         
         try:
             # Check if user is moderator
-            user_is_moderator = db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCARole='moderator').count() > 0
+            user_is_moderator = is_any_cca_moderator()
 
             # Check user's role in CCA
             membership = db.session.query(CCAMembers.CCARole).filter_by(UserId=session['user_id'], CCAId=cca_id).first()
@@ -621,7 +548,7 @@ def register_student_routes(app, get_db_connection, login_required):
     def change_password():
         # Helper function to check if user is moderator
         def get_moderator_status():
-            return db.session.query(CCAMembers).filter_by(UserId=session['user_id'], CCARole='moderator').count() > 0
+            return is_any_cca_moderator()
 
         if request.method == 'POST':
             current_password = request.form.get('current_password', '').strip()
@@ -663,14 +590,13 @@ def register_student_routes(app, get_db_connection, login_required):
                 stored_password = user.Password
                 
                 # Verify current password
-                if bcrypt.checkpw(current_password.encode('utf-8'), stored_password.encode('utf-8')):
+                if password_hasher.verify(current_password, stored_password):
                     # Hash new password
-                    hashed_new_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-                    
-                    user.Password = hashed_new_password.decode('utf-8')
+                    user.Password = password_hasher.hash(new_password)
                     user.PasswordLastSet = datetime.now(timezone.utc)
 
                     db.session.commit()
+                    invalidate_dashboard(user.UserId)
                     
                     flash('Password changed successfully.', 'success')
                     return redirect(url_for('student_routes.dashboard'))
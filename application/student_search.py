@@ -0,0 +1,262 @@
+# application/student_search.py
+import os
+import threading
+import time
+from flask import current_app, jsonify, request
+from application.models import db, Student, User, CCAMembers
+from application.cache import TTLCache
+
+# Typeahead search over students that have a login account, held in memory per
+# worker. Names and IDs are split into 2- and 3-character grams; a query looks up
+# the rarest of its grams, intersects the rest, and checks the survivors with a
+# plain substring test, so results match the old LIKE '%q%' search without a
+# round-trip. CCA membership is kept as {user id: set of CCA ids} for exclusion.
+#
+# Account and membership changes in this worker are applied straight away
+# (accounts_changed / memberships_changed); other workers pick them up on their
+# next rebuild, at most STUDENT_SEARCH_REFRESH seconds later.
+#
+# Results are cached briefly per (query, CCA), and identical searches that
+# arrive together share one computation. Any change to the index drops them.
+
+MIN_QUERY_LENGTH = 2
+RESULT_LIMIT = 20
+
+# SQL Server allows 2100 parameters per statement
+_IDS_PER_QUERY = 2000
+
+# Best match first: exact ID, ID prefix, name prefix, word prefix, anywhere
+_EXACT_ID, _ID_PREFIX, _NAME_PREFIX, _WORD_PREFIX, _SUBSTRING = range(5)
+
+
+def _normalise(text):
+    return ' '.join(str(text).casefold().split())
+
+def _grams(text):
+    grams = set()
+    for n in (2, 3):
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class StudentSearchIndex:
+    """In-memory n-gram index of students with accounts, plus their CCA memberships."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students = {}      # student id -> (user id, name, email, search name, search id)
+        self._grams = {}         # gram -> set of student ids
+        self._memberships = {}   # user id -> set of CCA ids
+        self._loaded_at = None
+        self._pid = None
+        self._refreshing = False
+        self._loading = threading.Lock()   # one initial build per worker, however many searches wait
+        self._generation = 0               # bumped on every change, so stale results aren't cached
+        self._results = TTLCache(ttl=10, maxsize=2000)
+        self._inflight = {}                # cache key -> Event set when its result is ready
+
+    def search(self, query, cca_id=None, limit=RESULT_LIMIT):
+        """Students matching `query` by name or ID, best first, leaving out members of `cca_id`."""
+        query = _normalise(query)
+        if len(query) < MIN_QUERY_LENGTH:
+            return []
+        self._ensure_fresh()
+        return self._coalesced((query, cca_id, limit), lambda: self._search(query, cca_id, limit))
+
+    def accounts_changed(self, *student_ids):
+        """Call after login accounts are created or removed for these students."""
+        if not self._is_loaded() or not student_ids:
+            return
+        rows = []
+        for chunk in _chunks(list(student_ids)):
+            rows.extend(self._student_query().filter(Student.StudentId.in_(chunk)).all())
+        with self._lock:
+            for student_id in student_ids:
+                self._remove_student(student_id)
+            for row in rows:
+                self._add_student(row)
+            self._changed()
+
+    def memberships_changed(self, *user_ids):
+        """Call after CCAMembers rows are added or removed for these users."""
+        if not self._is_loaded() or not user_ids:
+            return
+        memberships = {user_id: set() for user_id in user_ids}
+        for chunk in _chunks(list(user_ids)):
+            for user_id, cca_id in db.session.query(CCAMembers.UserId, CCAMembers.CCAId) \
+                    .filter(CCAMembers.UserId.in_(chunk)):
+                memberships[user_id].add(cca_id)
+        with self._lock:
+            self._memberships.update(memberships)
+            self._changed()
+
+    def rebuild(self):
+        """Load every student and membership from the database and swap the new index in."""
+        students, grams = {}, {}
+        for row in self._student_query():
+            self._add_student(row, students, grams)
+        memberships = {}
+        for user_id, cca_id in db.session.query(CCAMembers.UserId, CCAMembers.CCAId):
+            memberships.setdefault(user_id, set()).add(cca_id)
+        with self._lock:
+            self._students, self._grams, self._memberships = students, grams, memberships
+            self._loaded_at = time.monotonic()
+            self._pid = os.getpid()
+            self._changed()
+
+    def clear(self):
+        with self._lock:
+            self._students, self._grams, self._memberships = {}, {}, {}
+            self._loaded_at = None
+            self._pid = None
+            self._changed()
+
+    # ───────────────────────────────────────────────────────────
+    def _is_loaded(self):
+        return self._loaded_at is not None and self._pid == os.getpid()
+
+    def _search(self, query, cca_id, limit):
+        with self._lock:
+            # 3-grams are far more selective; a two-character query only has its one 2-gram
+            n = 3 if len(query) >= 3 else 2
+            postings = [self._grams.get(query[i:i + n]) for i in range(len(query) - n + 1)]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return []
+
+            matches = []
+            for student_id in candidates:
+                user_id, name, email, search_name, search_id = self._students[student_id]
+                if cca_id is not None and cca_id in self._memberships.get(user_id, ()):
+                    continue
+                rank = self._rank(query, search_name, search_id)
+                if rank is not None:
+                    matches.append((rank, search_name, student_id, name, email))
+
+        matches.sort()
+        return [
+            {'student_id': student_id, 'name': name, 'email': email}
+            for _, _, student_id, name, email in matches[:limit]
+        ]
+
+    def _changed(self):
+        # Caller holds self._lock
+        self._generation += 1
+        self._results.clear()
+
+    def _coalesced(self, key, compute):
+        while True:
+            result = self._results.get(key)
+            if result is not None:
+                return result
+            with self._lock:
+                ready = self._inflight.get(key)
+                leader = ready is None
+                if leader:
+                    ready = self._inflight[key] = threading.Event()
+                generation = self._generation
+            if not leader:
+                # Someone is computing this exact search; take their result from the cache
+                ready.wait(timeout=5)
+                continue
+            try:
+                result = compute()
+                with self._lock:
+                    if generation == self._generation:
+                        self._results.set(key, result, ttl=current_app.config.get('STUDENT_SEARCH_CACHE_TTL', 10))
+                return result
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                ready.set()
+
+    def _ensure_fresh(self):
+        if not self._is_loaded():
+            # First search in this worker builds the index inline, once
+            with self._loading:
+                if not self._is_loaded():
+                    self.rebuild()
+            return
+        refresh = current_app.config.get('STUDENT_SEARCH_REFRESH', 60)
+        if time.monotonic() - self._loaded_at < refresh:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        # Keep answering from the current index while the new one loads
+        threading.Thread(
+            target=self._refresh_in_background, args=(current_app._get_current_object(),),
+            name="student-search-refresh", daemon=True
+        ).start()
+
+    def _refresh_in_background(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            print(f"Error refreshing student search index: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    @staticmethod
+    def _student_query():
+        return db.session.query(User.UserId, Student.StudentId, Student.Name, Student.Email) \
+            .join(User, User.StudentId == Student.StudentId)
+
+    @staticmethod
+    def _rank(query, search_name, search_id):
+        if search_id == query:
+            return _EXACT_ID
+        if search_id.startswith(query):
+            return _ID_PREFIX
+        if search_name.startswith(query):
+            return _NAME_PREFIX
+        if f' {query}' in search_name:
+            return _WORD_PREFIX
+        if query in search_name or query in search_id:
+            return _SUBSTRING
+        return None
+
+    def _add_student(self, row, students=None, grams=None):
+        students = self._students if students is None else students
+        grams = self._grams if grams is None else grams
+        user_id, student_id, name, email = row
+        search_name, search_id = _normalise(name), str(student_id)
+        students[student_id] = (user_id, name, email, search_name, search_id)
+        for gram in _grams(search_name) | _grams(search_id):
+            grams.setdefault(gram, set()).add(student_id)
+
+    def _remove_student(self, student_id):
+        entry = self._students.pop(student_id, None)
+        if entry is None:
+            return
+        _, _, _, search_name, search_id = entry
+        for gram in _grams(search_name) | _grams(search_id):
+            posting = self._grams.get(gram)
+            if posting is not None:
+                posting.discard(student_id)
+                if not posting:
+                    del self._grams[gram]
+
+
+def search_response(students):
+    """JSON response for a search, with an ETag so a repeated search can be answered with 304."""
+    response = jsonify({'students': students})
+    # no-cache: the browser keeps the result but revalidates it, so membership changes show at once
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+def _chunks(ids):
+    for start in range(0, len(ids), _IDS_PER_QUERY):
+        yield ids[start:start + _IDS_PER_QUERY]
+
+
+student_index = StudentSearchIndex()
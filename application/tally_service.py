@@ -0,0 +1,88 @@
+# application/tally_service.py
+from sqlalchemy import func, insert, select, update
+from application.models import db, PollOption, PollVote, PollTally
+
+# PollTallies holds one running VoteCount per (PollId, OptionId) so results pages
+# read O(options) rows instead of counting Votes. Every write happens inside the
+# caller's transaction; nothing here commits.
+
+# ───────────────────────────────────────────────────────────
+def create_tallies(poll_id, option_ids):
+    """Add zeroed tally rows for a newly created poll."""
+    for option_id in option_ids:
+        db.session.add(PollTally(PollId=poll_id, OptionId=option_id, VoteCount=0))
+
+def record_vote_counts(poll_id, counts):
+    """Add {option_id: n} to a poll's tallies, one UPDATE per option.
+
+    Votes must already be written so that a poll without tally rows (created
+    before PollTallies existed) can be rebuilt from Votes on the spot.
+    """
+    for option_id, count in counts.items():
+        result = db.session.execute(
+            update(PollTally)
+            .where(PollTally.PollId == poll_id, PollTally.OptionId == option_id)
+            .values(VoteCount=PollTally.VoteCount + count)
+        )
+        if result.rowcount != 1:
+            rebuild_tallies(poll_id)
+            return
+
+def get_tallies(poll_id):
+    """Return [(OptionId, OptionText, VoteCount)] for a poll, ordered by OptionId."""
+    rows = db.session.query(
+        PollOption.OptionId, PollOption.OptionText, PollTally.VoteCount
+    ).outerjoin(PollTally, (PollTally.OptionId == PollOption.OptionId) & (PollTally.PollId == PollOption.PollId)) \
+     .filter(PollOption.PollId == poll_id).order_by(PollOption.OptionId).all()
+
+    if any(row[2] is None for row in rows):
+        # Poll predates PollTallies and `flask init-db` hasn't filled it in yet.
+        # Count Votes without writing: a read must not commit the caller's transaction.
+        counts = dict(db.session.query(PollVote.OptionId, func.count(PollVote.VoteId))
+                      .filter(PollVote.PollId == poll_id).group_by(PollVote.OptionId).all())
+        return [(row[0], row[1], counts.get(row[0], 0)) for row in rows]
+
+    return [(row[0], row[1], row[2]) for row in rows]
+
+def poll_vote_totals():
+    """Subquery of (PollId, VoteCount) summed over each poll's tallies."""
+    return db.session.query(
+        PollTally.PollId.label('PollId'),
+        func.sum(PollTally.VoteCount).label('VoteCount')
+    ).group_by(PollTally.PollId).subquery()
+
+def delete_tallies(poll_ids):
+    """Remove tally rows for polls that are being deleted."""
+    PollTally.query.filter(PollTally.PollId.in_(poll_ids)).delete(synchronize_session=False)
+
+# ───────────────────────────────────────────────────────────
+def fill_missing_tallies():
+    """Rebuild the tallies of every poll with an option that has no tally row. Returns those poll ids."""
+    missing = select(PollOption.PollId).distinct().select_from(PollOption) \
+        .outerjoin(PollTally, (PollTally.OptionId == PollOption.OptionId) & (PollTally.PollId == PollOption.PollId)) \
+        .where(PollTally.OptionId == None)
+    poll_ids = [row[0] for row in db.session.execute(missing)]
+    for poll_id in poll_ids:
+        rebuild_tallies(poll_id)
+    return poll_ids
+
+def rebuild_tallies(poll_id=None):
+    """Recompute tallies from Votes for one poll, or for every poll when poll_id is None.
+
+    Returns the number of tally rows written.
+    """
+    delete_query = PollTally.query
+    counts = select(
+        PollOption.PollId, PollOption.OptionId, func.count(PollVote.VoteId)
+    ).select_from(PollOption).outerjoin(PollVote, PollVote.OptionId == PollOption.OptionId) \
+     .group_by(PollOption.PollId, PollOption.OptionId)
+
+    if poll_id is not None:
+        delete_query = delete_query.filter(PollTally.PollId == poll_id)
+        counts = counts.where(PollOption.PollId == poll_id)
+
+    delete_query.delete(synchronize_session=False)
+    result = db.session.execute(
+        insert(PollTally).from_select(['PollId', 'OptionId', 'VoteCount'], counts)
+    )
+    return result.rowcount
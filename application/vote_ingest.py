@@ -0,0 +1,239 @@
+# application/vote_ingest.py
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from application.models import db, Poll, PollOption, PollVote, PollBallot, VoteToken
+from application.cache import TTLCache
+from application.tally_service import record_vote_counts
+from application.metrics import metrics
+from application.background import WorkerThreads
+
+# Votes are validated against cached poll metadata, then handed to a per-worker
+# flusher thread that commits every ballot waiting in the buffer in one
+# transaction. The request thread blocks until its own ballot is settled, so a
+# "submitted" flash still means the vote is durable.
+
+RECORDED = 'recorded'
+DUPLICATE = 'duplicate'
+PENDING = 'pending'     # not settled within VOTE_ACK_TIMEOUT; may still commit
+FAILED = 'failed'
+
+# Short TTL because IsActive flips when a poll opens; closing is checked against EndDate
+_poll_meta = TTLCache(ttl=5)
+
+# SQL Server allows 2100 parameters per statement; multi-row inserts stay under it
+_MAX_PARAMS_PER_INSERT = 2000
+
+metrics.counter('ballots_total', 'Ballots submitted, by result (rate() gives votes per second).')
+
+# ───────────────────────────────────────────────────────────
+def get_poll_meta(poll_id):
+    """Return what submit_vote checks a ballot against, or None if the poll doesn't exist."""
+    meta = _poll_meta.get(poll_id)
+    if meta is not None:
+        return meta
+
+    rows = db.session.query(
+        Poll.IsActive, Poll.EndDate, Poll.CCAId, Poll.QuestionType, Poll.IsAnonymous, PollOption.OptionId
+    ).outerjoin(PollOption, PollOption.PollId == Poll.PollId).filter(Poll.PollId == poll_id).all()
+    if not rows:
+        return None
+
+    is_active, end_date, cca_id, question_type, is_anonymous, _ = rows[0]
+    if end_date is not None and end_date.tzinfo is None:
+        # If database datetime is naive, assume it's UTC
+        end_date = end_date.replace(tzinfo=timezone.utc)
+
+    meta = {
+        'is_active': is_active,
+        'end_date': end_date,
+        'cca_id': cca_id,
+        'question_type': question_type,
+        'is_anonymous': is_anonymous,
+        'option_ids': frozenset(row[5] for row in rows if row[5] is not None)
+    }
+    _poll_meta.set(poll_id, meta, ttl=current_app.config.get('VOTE_POLL_CACHE_TTL', 5))
+    return meta
+
+def poll_is_open(meta):
+    """A cached IsActive may lag, so a passed EndDate closes the poll straight away."""
+    return meta['is_active'] and (meta['end_date'] is None or datetime.now(timezone.utc) < meta['end_date'])
+
+
+class Ballot:
+    """One voter's selection for one poll, settled by VoteIngestor."""
+
+    def __init__(self, poll_id, user_id, option_ids, token=None):
+        self.poll_id = poll_id
+        self.user_id = user_id
+        self.option_ids = option_ids
+        self.token = token          # VoteTokens fields from verify_vote_token, anonymous polls only
+        self.result = None
+        self.done = threading.Event()
+
+
+class VoteIngestor:
+    """Write-behind buffer for ballots, drained by one flusher thread per worker process."""
+
+    def __init__(self):
+        self._app = None
+        self._queue = None
+        self._threads = WorkerThreads(self._start_flusher)
+
+    def init_app(self, app):
+        self._app = app
+        if 'vote_ingest' not in app.extensions:
+            app.extensions['vote_ingest'] = self
+            self._threads.init_app(app)
+
+    def submit(self, poll_id, user_id, option_ids, token=None):
+        """Record a ballot and wait for the outcome: RECORDED, DUPLICATE, PENDING or FAILED."""
+        result = self._submit(poll_id, user_id, option_ids, token)
+        metrics.inc('ballots_total', result=result)
+        return result
+
+    def pending(self):
+        """Ballots waiting in this worker's buffer."""
+        pending = self._queue
+        return pending.qsize() if pending is not None and self._threads.started else 0
+
+    # ───────────────────────────────────────────────────────────
+    def _submit(self, poll_id, user_id, option_ids, token):
+        config = current_app.config
+        ballot = Ballot(poll_id, user_id, option_ids, token)
+
+        if not config.get('VOTE_BATCHING', True):
+            self._write([ballot])
+            return ballot.result
+
+        try:
+            self._buffer(current_app._get_current_object()).put_nowait(ballot)
+        except queue.Full:
+            # Buffer saturated: write this ballot ourselves rather than wait behind it
+            self._write([ballot])
+            return ballot.result
+
+        if not ballot.done.wait(config.get('VOTE_ACK_TIMEOUT', 10)):
+            return PENDING
+        return ballot.result
+
+    def _buffer(self, app):
+        if self._app is None:
+            # Used without init_app (scripts, tests): flush within the app submitting
+            self._app = app
+        self._threads.ensure_started()
+        return self._queue
+
+    def _start_flusher(self):
+        self._queue = queue.Queue(maxsize=self._app.config.get('VOTE_QUEUE_SIZE', 5000))
+        threading.Thread(
+            target=self._run, args=(self._app, self._queue), name="vote-flusher", daemon=True
+        ).start()
+
+    def _run(self, app, pending):
+        # Capped so the IN lists in _commit stay well under SQL Server's parameter limit
+        batch_size = min(app.config.get('VOTE_BATCH_SIZE', 200), 1000)
+        while True:
+            # Whatever piled up during the last commit goes into the next one
+            batch = [pending.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            with app.app_context():
+                self._write(batch)
+
+    def _write(self, batch):
+        """Commit a batch and settle every ballot in it. Never raises."""
+        try:
+            self._commit(batch)
+        except IntegrityError as e:
+            # Usually another worker committed one of these voters first; settle each ballot alone
+            db.session.rollback()
+            if len(batch) > 1:
+                for ballot in batch:
+                    self._write([ballot])
+                return
+            ballot = batch[0]
+            if self._has_voted(ballot):
+                ballot.result = DUPLICATE
+            else:
+                # Not a second ballot, e.g. an option or poll removed by a CCA purge
+                print(f"Error writing vote for poll {ballot.poll_id}: {e}")
+                ballot.result = FAILED
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error writing batch of {len(batch)} vote(s): {e}")
+            for ballot in batch:
+                ballot.result = FAILED
+
+        for ballot in batch:
+            ballot.done.set()
+
+    @staticmethod
+    def _has_voted(ballot):
+        """Whether a ballot for this voter is already committed, in PollBallots or Votes."""
+        try:
+            for model in (PollBallot, PollVote):
+                if db.session.query(model.PollId).filter_by(
+                        PollId=ballot.poll_id, UserId=ballot.user_id).first() is not None:
+                    return True
+            return False
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error checking for an existing vote on poll {ballot.poll_id}: {e}")
+            return False
+
+    def _commit(self, batch):
+        now = datetime.now(timezone.utc)
+
+        # Voters who already have a ballot; Votes also covers polls from before PollBallots existed
+        existing = set(db.session.query(PollVote.PollId, PollVote.UserId).filter(
+            PollVote.PollId.in_({ballot.poll_id for ballot in batch}),
+            PollVote.UserId.in_({ballot.user_id for ballot in batch})
+        ).distinct())
+
+        accepted = []
+        for ballot in batch:
+            key = (ballot.poll_id, ballot.user_id)
+            if key in existing:
+                ballot.result = DUPLICATE
+            else:
+                existing.add(key)
+                accepted.append(ballot)
+
+        if accepted:
+            ballot_rows = [{'PollId': b.poll_id, 'UserId': b.user_id, 'CastTime': now} for b in accepted]
+            vote_rows = [
+                {'PollId': b.poll_id, 'OptionId': option_id, 'UserId': b.user_id, 'VotedTime': now}
+                for b in accepted for option_id in b.option_ids
+            ]
+            # Redeemed anonymous-poll tokens; the hash primary key stops a token being used twice
+            token_rows = [
+                {**b.token, 'UserId': b.user_id, 'PollId': b.poll_id, 'IsUsed': True}
+                for b in accepted if b.token
+            ]
+            for model, rows in ((PollBallot, ballot_rows), (PollVote, vote_rows), (VoteToken, token_rows)):
+                if not rows:
+                    continue
+                rows_per_insert = _MAX_PARAMS_PER_INSERT // len(rows[0])
+                for start in range(0, len(rows), rows_per_insert):
+                    db.session.execute(insert(model).values(rows[start:start + rows_per_insert]))
+
+            counts = {}
+            for ballot in accepted:
+                counts.setdefault(ballot.poll_id, Counter()).update(ballot.option_ids)
+            for poll_id, poll_counts in counts.items():
+                record_vote_counts(poll_id, poll_counts)
+
+        db.session.commit()
+        for ballot in accepted:
+            ballot.result = RECORDED
+
+
+vote_ingestor = VoteIngestor()
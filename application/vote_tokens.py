@@ -0,0 +1,46 @@
+# application/vote_tokens.py
+import hashlib
+import secrets
+from datetime import timedelta, timezone
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
+
+# Anonymous-poll vote tokens are signed, not stored: the HMAC binds user, poll and
+# issue time, so showing a poll writes nothing. A VoteTokens row is written only
+# when a token is redeemed, and its hash is the primary key, so it redeems once.
+
+VALID = 'valid'
+EXPIRED = 'expired'
+INVALID = 'invalid'
+
+def _serializer():
+    # Salted so these can never be mistaken for password reset tokens signed with the same key
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='vote-token')
+
+def _max_age():
+    return current_app.config.get('VOTE_TOKEN_MAX_AGE', 600)
+
+# ───────────────────────────────────────────────────────────
+def issue_vote_token(user_id, poll_id):
+    """Return a signed token letting this user vote once in this poll."""
+    return _serializer().dumps({'user_id': user_id, 'poll_id': poll_id, 'nonce': secrets.token_hex(8)})
+
+def verify_vote_token(raw_token, user_id, poll_id):
+    """Check a submitted token. Returns (VALID | EXPIRED | INVALID, redemption row fields or None)."""
+    try:
+        data, issued_at = _serializer().loads(raw_token, max_age=_max_age(), return_timestamp=True)
+    except SignatureExpired:
+        return EXPIRED, None
+    except BadSignature:
+        return INVALID, None
+
+    if data.get('user_id') != user_id or data.get('poll_id') != poll_id:
+        return INVALID, None
+
+    # Fields for the VoteTokens row written alongside the ballot
+    issued_at = issued_at.astimezone(timezone.utc)
+    return VALID, {
+        'Token': hashlib.sha256(raw_token.encode()).hexdigest(),
+        'IssuedTime': issued_at,
+        'ExpiryTime': issued_at + timedelta(seconds=_max_age())
+    }
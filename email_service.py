@@ -2,6 +2,8 @@ from flask import current_app, url_for
 from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer
 import logging
+from application.email_outbox import email_outbox, enqueue_email
+from application.models import db, Student
 
 class EmailService:
     def __init__(self, app=None):
@@ -14,6 +16,7 @@ class EmailService:
         """Initialize the email service with Flask app"""
         self.mail = Mail(app)
         self.serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'])
+        email_outbox.init_app(app, self.mail, rebuild_setup_email=self.rebuild_student_credentials)
     
     def generate_password_reset_token(self, student_id):
         """Generate a secure token for password reset"""
@@ -34,17 +37,16 @@ class EmailService:
             current_app.logger.error(f"Token verification failed: {e}")
             return None
 
-    def send_student_credentials(self, student_name, student_email, student_id, temp_password=None):
-        """Send email with password setup link only (no login credentials)"""
-        try:
-            # Generate token for password reset
-            token = self.generate_password_reset_token(student_id)
-            
-            # Create password setup URL
-            password_setup_url = url_for('misc_routes.reset_password', token=token, _external=True)
-            
-            # Default HTML email content for modern email clients 
-            html_content = f"""
+    def build_student_credentials(self, student_name, student_email, student_id):
+        """Build the password setup email, returns (subject, html, text)"""
+        # Generate token for password reset
+        token = self.generate_password_reset_token(student_id)
+        
+        # Create password setup URL
+        password_setup_url = url_for('misc_routes.reset_password', token=token, _external=True)
+        
+        # Default HTML email content for modern email clients 
+        html_content = f"""
             <html>
             <body style="font-family: Arial, sans-serif; line-height: 1.6;">
                 <h2>Welcome to CCA Portal, {student_name}!</h2>
@@ -90,10 +92,10 @@ class EmailService:
                 <p><small>If you did not expect this email, please contact IT support immediately.</small></p>
             </body>
             </html>
-            """
-            
-            # Simplified plaintext as fallback for older email clients
-            text_content = f"""
+        """
+        
+        # Simplified plaintext as fallback for older email clients
+        text_content = f"""
     Welcome to CCA Portal, {student_name}!
 
     Your student account has been created.
@@ -118,11 +120,36 @@ class EmailService:
 
     ---
     This is an automated message from CCA Portal.
-            """
-            
+        """
+        
+        subject = "CCA Portal Account Setup - Set Your Password"
+        return subject, html_content, text_content
+
+    def rebuild_student_credentials(self, student_id):
+        """Build the password setup email again with a new token, or None if the student is gone"""
+        student = db.session.get(Student, student_id)
+        if student is None:
+            return None
+        return self.build_student_credentials(student.Name, student.Email, student.StudentId)
+
+    def send_student_credentials(self, student_name, student_email, student_id, temp_password=None, background=False):
+        """Send email with password setup link only (no login credentials).
+
+        With background=True the message goes to the email outbox and this returns
+        as soon as it is queued; delivery and retries happen off the request.
+        """
+        try:
+            subject, html_content, text_content = self.build_student_credentials(student_name, student_email, student_id)
+
+            if background:
+                email_id = enqueue_email(student_email, subject, html=html_content, text=text_content,
+                                         student_id=student_id)
+                current_app.logger.info(f"Password setup email to {student_email} queued (outbox {email_id})")
+                return True
+
             # Create and send message
             msg = Message(
-                subject="CCA Portal Account Setup - Set Your Password",
+                subject=subject,
                 recipients=[student_email],
                 html=html_content,
                 body=text_content
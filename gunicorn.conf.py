@@ -0,0 +1,100 @@
+# gunicorn.conf.py
+# Production serving for CCAP: pre-forked workers, each running a small thread pool.
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# Graceful reload of gunicorn.conf.py settings, no dropped requests: kill -HUP <master pid>
+# The app is preloaded in the master, so new code or config.py needs a full restart.
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Pre-fork worker/thread model
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+# Load the app once in the master so workers fork with it already imported
+preload_app = True
+
+# Timeouts (seconds)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))                   # kill a worker stuck on one request
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))  # time to finish in-flight requests on reload/stop
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers periodically to cap memory growth; jitter avoids all restarting at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+# nginx terminates TLS and sets X-Forwarded-* for us
+forwarded_allow_ips = os.getenv("GUNICORN_FORWARDED_ALLOW_IPS", "*")
+
+# Threads per worker that use the database outside requests, besides the mail
+# senders and one producer per live-results stream: audit and vote flushers,
+# session sweeper, health checker, CCA purger and student search refresh
+BACKGROUND_DB_THREADS = 6
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def post_fork(server, worker):
+    """Give each worker its own DB pool, password hashing pool and stream limit, then start its background threads."""
+    from application.db_pool import db_pool
+    from application.results_stream import results_broker
+
+    # Settings in config.py win over the environment, which wins over the sizes worked out here
+    app = server.app.wsgi()
+    config = app.config
+
+    def configured(name):
+        return config.get(name) or os.getenv(name)
+
+    # Connections opened in the master (e.g. Flask-Session table check) share
+    # sockets with every child; drop them without sending a logout
+    db_pool.reset_after_fork()
+
+    # Live-results streams each hold a request thread; keep some for everything else
+    results_broker.reserve_threads(threads, int(configured("RESULTS_STREAM_RESERVED_THREADS") or 2))
+
+    if not configured("DB_POOL_SIZE"):
+        # A request can hold two connections at once (the ORM session and a
+        # get_db_connection() handle); each background thread holds one
+        db_pool.max_size = 2 * threads + BACKGROUND_DB_THREADS + int(config.get("EMAIL_OUTBOX_WORKERS", 2)) \
+            + results_broker.max_streams
+
+    # bcrypt pool: split the machine's cores between workers, and fork its
+    # processes now, before this worker starts its request threads
+    from application.password_hashing import password_hasher
+    password_hasher.reset_after_fork(
+        None if configured("PASSWORD_HASH_WORKERS") else max(1, multiprocessing.cpu_count() // workers)
+    )
+    password_hasher.start()
+
+    # Flushers, mail senders, sweeper, health checks: running before the first request
+    from application.background import start_worker_threads
+    start_worker_threads(app)
+
+    server.log.info(
+        f"Worker {worker.pid} ready: {threads} threads, DB pool size {db_pool.max_size}, "
+        f"{password_hasher.max_workers} password hashing process(es), "
+        f"{results_broker.max_streams} live-results stream(s)"
+    )
+
+
+def worker_exit(server, worker):
+    """Write any audit log rows still buffered in this worker."""
+    from application.audit_sink import audit_sink
+    audit_sink.flush()
+
+
+def when_ready(server):
+    """Warn when the in-process session store would be split between workers."""
+    config = server.app.wsgi().config
+    if config.get("SESSION_BACKEND") == "memory" and workers > 1:
+        server.log.warning(
+            f"SESSION_BACKEND = 'memory' with {workers} workers: each worker has its own sessions, "
+            "so users will be logged out at random. Set GUNICORN_WORKERS=1 or use 'redis'."
+        )
@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+from sqlalchemy.pool import StaticPool
+
+from application.models import db
+
+
+@pytest.fixture(scope='session')
+def sqlite_app():
+    """Build a Flask app on its own in-memory SQLite database.
+
+    Used as `with sqlite_app(tables, seed, **config) as app:`. Inside the block the
+    app context is pushed, the tables (every model's if None) exist and seed() has
+    been committed.
+    """
+    @contextmanager
+    def sqlite_app(tables=(), seed=None, **config):
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite://',
+            # One shared connection, usable from the background threads some tests start
+            SQLALCHEMY_ENGINE_OPTIONS={'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}},
+            **config
+        )
+        db.init_app(app)
+        with app.app_context():
+            if tables is None:
+                db.create_all()
+            elif tables:
+                db.metadata.create_all(db.engine, tables=[model.__table__ for model in tables])
+            if seed is not None:
+                seed()
+                db.session.commit()
+            yield app
+    return sqlite_app
@@ -0,0 +1,59 @@
+import pytest
+
+from application import admin_dashboard
+from application.admin_dashboard import dashboard_counts, dashboard_page
+from application.models import db, CCA, CCAPurge, Student, User
+
+TABLES = [Student, User, CCA, CCAPurge]
+
+
+def seed():
+    # Duplicate names so pages have to break ties on the id
+    for i in range(1, 24):
+        db.session.add(Student(StudentId=2300000 + i, Name=f'Student {i % 7}', Email=f's{i}@example.com'))
+        if i % 2:
+            db.session.add(User(Username=str(2300000 + i), StudentId=2300000 + i, SystemRole='student',
+                                Password=None if i % 3 else 'hash'))
+    db.session.add(User(Username='admin', SystemRole='admin', Password='hash'))
+    db.session.add_all([CCA(CCAId=i, Name=name) for i, name in enumerate(['Chess', 'Band', 'Art'], start=1)])
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        admin_dashboard._counts.clear()
+        yield app
+
+
+def collect(panel, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = dashboard_page(panel, cursor, limit)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+def test_pages_walk_every_row_in_name_order(app):
+    pages = collect('students', limit=5)
+    rows = [row for page in pages for row in page]
+
+    assert len(pages) == 5
+    assert [(row['Name'], row['id']) for row in rows] == sorted((s.Name, s.StudentId) for s in Student.query)
+
+
+def test_password_setup_panel_lists_accounts_without_a_password(app):
+    rows = [row for page in collect('password-setup', limit=2) for row in page]
+    expected = {2300000 + i for i in range(1, 24) if i % 2 and i % 3}
+    assert {row['id'] for row in rows} == expected
+    assert len(rows) == len(expected)
+
+
+def test_ccas_and_bad_cursor(app):
+    rows, cursor = dashboard_page('ccas', 'not-a-cursor', limit=10)
+    assert [row['Name'] for row in rows] == ['Art', 'Band', 'Chess']
+    assert cursor is None
+
+
+def test_counts(app):
+    assert dashboard_counts() == {'ccas': 3, 'students': 23, 'accounts': 12, 'password-setup': 8}
@@ -0,0 +1,71 @@
+import os
+import queue
+import time
+from datetime import datetime
+
+import pytest
+
+from application.audit_sink import AuditSink
+from application.models import AdminLog, LoginLog, User
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app([User, LoginLog, AdminLog], AUDIT_LOG_FLUSH_INTERVAL=0.05) as app:
+        yield app
+
+
+def login_row(username, when=None):
+    return {'Username': username, 'UserId': None, 'IPAddress': '127.0.0.1',
+            'Timestamp': when or datetime.utcnow(), 'Success': False, 'Reason': 'Wrong password'}
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_rows_are_written_in_batches_with_their_own_timestamp(app):
+    sink = AuditSink()
+    sink.init_app(app)
+    queued_at = datetime(2024, 1, 1, 9, 0, 0)
+    for i in range(25):
+        sink.record(LoginLog, login_row(f'user{i}', queued_at))
+    sink.record(AdminLog, {'AdminUserId': 1, 'Action': 'Viewed dashboard', 'Timestamp': queued_at, 'IPAddress': '127.0.0.1'})
+
+    assert wait_for(lambda: sink.stats()['written'] == 26)
+    assert sink.stats()['batches'] < 26
+    assert LoginLog.query.count() == 25
+    assert {log.Timestamp for log in LoginLog.query} == {queued_at}
+    assert AdminLog.query.one().Action == 'Viewed dashboard'
+
+
+def test_full_queue_writes_synchronously_and_flush_drains_the_rest(app):
+    sink = AuditSink()
+    sink.init_app(app)
+    # A tiny queue with no flusher thread draining it
+    sink._queue, sink._threads._pid = queue.Queue(maxsize=1), os.getpid()
+    for i in range(5):
+        sink.record(LoginLog, login_row(f'user{i}'))
+
+    assert sink.stats()['overflowed'] == 4
+    assert LoginLog.query.count() == 4
+
+    sink.flush()
+    assert LoginLog.query.count() == 5
+    assert sink.stats()['pending'] == 0
+
+
+def test_bad_row_does_not_lose_the_rest_of_the_batch(app):
+    app.config['AUDIT_LOG_BATCHING'] = False
+    sink = AuditSink()
+    sink.init_app(app)
+    good, bad = login_row('good'), dict(login_row('bad'), Success=None)   # Success is NOT NULL
+    sink._write([(LoginLog, good), (LoginLog, bad)])
+
+    assert [log.Username for log in LoginLog.query] == ['good']
+    assert sink.stats()['failed'] == 1
@@ -18,5 +18,12 @@ class AuthRouteTests(unittest.TestCase):
         })
         self.assertIn(b'Invalid', response.data)  # adjust based on actual error msg
 
+    def test_security_headers_allow_page_scripts(self):
+        # Pages rely on inline scripts, jsDelivr's Bootstrap and reCAPTCHA
+        policy = self.client.get('/login').headers['Content-Security-Policy']
+        self.assertIn("'unsafe-inline'", policy)
+        self.assertIn('https://cdn.jsdelivr.net', policy)
+        self.assertIn('https://www.google.com', policy)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
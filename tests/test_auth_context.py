@@ -0,0 +1,105 @@
+import pytest
+from flask import Blueprint
+
+from application import auth_utils
+from application.auth_utils import get_auth_context, is_cca_moderator, moderator_required
+from application.cache_invalidation import membership_changed
+from application.models import db, CCA, CCAMembers, Student, User
+
+TABLES = [Student, User, CCA, CCAMembers]
+
+
+def seed():
+    db.session.add_all([CCA(CCAId=1, Name='Chess'), CCA(CCAId=2, Name='Choir')])
+    db.session.add(User(UserId=5, Username='2300005', SystemRole='student'))
+    db.session.add(CCAMembers(UserId=5, CCAId=1, CCARole='member'))
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed, AUTH_CONTEXT_TTL=300) as app:
+        pass
+
+    # The decorators redirect to these endpoints
+    misc = Blueprint('misc_routes', __name__)
+    misc.add_url_rule('/login', 'login', lambda: 'login')
+    misc.add_url_rule('/mfa-verify', 'mfa_verify', lambda: 'mfa')
+    student = Blueprint('student_routes', __name__)
+    student.add_url_rule('/dashboard', 'dashboard', lambda: 'dashboard')
+    app.register_blueprint(misc)
+    app.register_blueprint(student)
+
+    @app.route('/moderate/<int:cca_id>')
+    @moderator_required
+    def moderate(cca_id):
+        return 'moderator' if is_cca_moderator(cca_id) else 'not this cca'
+
+    auth_utils._auth_contexts.clear()
+    yield app
+    auth_utils._auth_contexts.clear()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=5, role='moderator', mfa_authenticated=True)
+    return client
+
+
+def set_role(cca_id, role):
+    db.session.query(CCAMembers).filter_by(UserId=5, CCAId=cca_id).update({'CCARole': role})
+    db.session.commit()
+
+
+def test_context_is_cached_until_invalidated(app):
+    with app.app_context():
+        assert get_auth_context(5)['moderated_cca_ids'] == frozenset()
+        set_role(1, 'moderator')
+        assert get_auth_context(5)['moderated_cca_ids'] == frozenset()
+
+        membership_changed(5)
+        assert get_auth_context(5)['moderated_cca_ids'] == {1}
+
+
+def test_promotion_is_visible_right_after_membership_changed(app, client):
+    assert client.get('/moderate/1').status_code == 302
+
+    with app.app_context():
+        set_role(1, 'moderator')
+        membership_changed(5)
+
+    response = client.get('/moderate/1')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == 'moderator'
+    assert client.get('/moderate/2').get_data(as_text=True) == 'not this cca'
+
+
+def test_removal_is_visible_right_after_membership_changed(app, client):
+    with app.app_context():
+        set_role(1, 'moderator')
+    assert client.get('/moderate/1').get_data(as_text=True) == 'moderator'
+
+    with app.app_context():
+        db.session.query(CCAMembers).filter_by(UserId=5, CCAId=1).delete()
+        db.session.commit()
+        membership_changed(5)
+
+    response = client.get('/moderate/1')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+
+
+def test_moving_moderation_to_another_cca(app, client):
+    with app.app_context():
+        set_role(1, 'moderator')
+    assert client.get('/moderate/1').get_data(as_text=True) == 'moderator'
+
+    with app.app_context():
+        set_role(1, 'member')
+        db.session.add(CCAMembers(UserId=5, CCAId=2, CCARole='moderator'))
+        db.session.commit()
+        membership_changed(5)
+
+    assert client.get('/moderate/1').get_data(as_text=True) == 'not this cca'
+    assert client.get('/moderate/2').get_data(as_text=True) == 'moderator'
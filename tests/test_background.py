@@ -0,0 +1,48 @@
+from flask import Flask
+
+from application.background import WorkerThreads, start_worker_threads
+
+
+def test_starts_once_per_process():
+    calls = []
+    threads = WorkerThreads(lambda: calls.append(1))
+
+    threads.ensure_started()
+    threads.ensure_started()
+    assert calls == [1]
+    assert threads.started
+
+    # What a forked child sees: started, but by another process
+    threads._pid = -1
+    assert not threads.started
+    threads.ensure_started()
+    assert calls == [1, 1]
+
+
+def test_registered_threads_start_together_or_on_first_request():
+    app = Flask(__name__)
+    app.add_url_rule('/', 'index', lambda: 'ok')
+    calls = []
+    for name in ('sender', 'sweeper'):
+        threads = WorkerThreads(lambda name=name: calls.append(name))
+        threads.init_app(app)
+        threads.init_app(app)
+
+    # gunicorn's post_fork
+    start_worker_threads(app)
+    assert calls == ['sender', 'sweeper']
+
+    # The dev server's first request finds them running already
+    app.test_client().get('/')
+    assert calls == ['sender', 'sweeper']
+
+
+def test_first_request_starts_threads_without_post_fork():
+    app = Flask(__name__)
+    app.add_url_rule('/', 'index', lambda: 'ok')
+    calls = []
+    WorkerThreads(lambda: calls.append('checker')).init_app(app)
+
+    app.test_client().get('/')
+    app.test_client().get('/')
+    assert calls == ['checker']
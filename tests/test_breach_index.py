@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+
+import pytest
+from flask import Flask
+
+from application import breach_index
+from application.breach_index import BreachIndex, BreachIndexError, build_index, is_breached
+
+BREACHED = ['password', 'letmein', 'correct horse battery staple', 'P@ssw0rd']
+
+
+def sha1_hex(password):
+    return hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
+
+
+def write_dump(path, passwords, count=3):
+    lines = sorted(f"{sha1_hex(p)}:{count}" for p in passwords)
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(BREACHED_PASSWORD_MODE='index', BREACHED_PASSWORD_INDEX=str(tmp_path / 'pwned.idx'))
+    breach_index._index = None
+    with app.app_context():
+        yield app
+    breach_index._index = None
+
+
+def test_lookup_finds_only_listed_hashes(tmp_path):
+    dump = write_dump(tmp_path / 'dump.txt', BREACHED)
+    assert build_index(str(dump), str(tmp_path / 'pwned.idx')) == len(BREACHED)
+
+    index = BreachIndex(str(tmp_path / 'pwned.idx'))
+    assert len(index) == len(BREACHED)
+    for password in BREACHED:
+        assert index.contains_password(password)
+    assert not index.contains_password('a long passphrase nobody has leaked')
+    index.close()
+
+
+def test_build_reads_gzip_and_honours_min_count(tmp_path):
+    lines = sorted([f"{sha1_hex('password')}:5", f"{sha1_hex('letmein')}:1"])
+    dump = tmp_path / 'dump.txt.gz'
+    with gzip.open(dump, 'wt') as f:
+        f.write("\n".join(lines))
+
+    assert build_index(str(dump), str(tmp_path / 'pwned.idx'), min_count=2) == 1
+    index = BreachIndex(str(tmp_path / 'pwned.idx'))
+    assert index.contains_password('password')
+    assert not index.contains_password('letmein')
+    index.close()
+
+
+def test_build_rejects_unsorted_dump(tmp_path):
+    dump = tmp_path / 'dump.txt'
+    dump.write_text("\n".join(sorted((f"{sha1_hex(p)}:1" for p in BREACHED), reverse=True)))
+    with pytest.raises(BreachIndexError):
+        build_index(str(dump), str(tmp_path / 'pwned.idx'))
+    assert not (tmp_path / 'pwned.idx').exists()
+
+
+def test_is_breached_uses_index_without_network(app, tmp_path, monkeypatch):
+    build_index(str(write_dump(tmp_path / 'dump.txt', BREACHED)), app.config['BREACHED_PASSWORD_INDEX'])
+    monkeypatch.setattr(breach_index.requests, 'get', lambda *a, **kw: pytest.fail('network used'))
+
+    app.config['BREACHED_PASSWORD_MODE'] = 'hybrid'
+    assert is_breached('letmein')
+    assert not is_breached('a long passphrase nobody has leaked')
+
+
+def test_hybrid_falls_back_to_cached_range_api(app, monkeypatch):
+    app.config['BREACHED_PASSWORD_MODE'] = 'hybrid'
+    breach_index._ranges.clear()
+    digest = sha1_hex('letmein')
+    calls = []
+
+    class Response:
+        text = f"{digest[5:]}:42\r\n{'0' * 35}:1"
+
+        def raise_for_status(self):
+            pass
+
+    def fake_get(url, timeout):
+        calls.append(url)
+        return Response()
+
+    monkeypatch.setattr(breach_index.requests, 'get', fake_get)
+    assert is_breached('letmein')
+    assert is_breached('letmein')
+    assert calls == [f"https://api.pwnedpasswords.com/range/{digest[:5]}"]
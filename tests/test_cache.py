@@ -0,0 +1,30 @@
+import time
+
+from application.cache import TTLCache
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.01)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_pop_returns_value_once():
+    cache = TTLCache()
+    cache.set('a', 1)
+    assert cache.pop('a') == 1
+    assert cache.pop('a') is None
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from application.cca_cascade import cca_size, delete_cca, is_pending_purge, purge_deleted_ccas, soft_delete_cca
+from application.models import (db, CCA, CCAMembers, CCAPurge, Poll, PollBallot, PollOption, PollTally, PollVote,
+                                User, VoteToken)
+
+NOW = datetime(2024, 3, 1, 9, 0, 0)
+TABLES = [User, CCA, CCAMembers, CCAPurge, Poll, PollOption, PollVote, PollTally, PollBallot, VoteToken]
+
+
+def seed():
+    db.session.add_all([User(UserId=i, Username=f'u{i}', SystemRole='student') for i in range(1, 11)])
+    # CCA 1 is deleted; CCA 2 must be left alone
+    for cca_id in (1, 2):
+        db.session.add(CCA(CCAId=cca_id, Name=f'CCA {cca_id}'))
+        db.session.add_all([CCAMembers(UserId=i, CCAId=cca_id, CCARole='member') for i in range(1, 11)])
+        for poll in range(2):
+            poll_id = cca_id * 10 + poll
+            db.session.add(Poll(PollId=poll_id, CCAId=cca_id, Question='Q', StartDate=NOW, EndDate=NOW,
+                                IsAnonymous=False, IsActive=True))
+            option_ids = [poll_id * 10 + n for n in range(2)]
+            db.session.add_all([PollOption(OptionId=o, PollId=poll_id, OptionText='A') for o in option_ids])
+            db.session.add_all([PollTally(PollId=poll_id, OptionId=o, VoteCount=5) for o in option_ids])
+            for user_id in range(1, 11):
+                db.session.add(PollVote(PollId=poll_id, UserId=user_id, OptionId=option_ids[user_id % 2],
+                                        VotedTime=NOW))
+                db.session.add(PollBallot(PollId=poll_id, UserId=user_id, CastTime=NOW))
+                db.session.add(VoteToken(Token=f'{poll_id}-{user_id}', UserId=user_id, PollId=poll_id,
+                                         IssuedTime=NOW, ExpiryTime=NOW + timedelta(hours=1)))
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        yield app
+
+
+EXPECTED = {'Votes': 20, 'VoteTokens': 20, 'PollBallots': 20, 'PollTallies': 4, 'Options': 4, 'Poll': 2,
+            'CCAMembers': 10, 'CCA': 1}
+
+
+def remaining():
+    return {model.__tablename__: model.query.count() for model in TABLES if model not in (User, CCAPurge)}
+
+
+def test_delete_removes_everything_under_the_cca_and_reports_counts(app):
+    assert cca_size(1) == 40
+
+    assert delete_cca(1) == EXPECTED
+
+    assert remaining() == {'CCA': 1, 'CCAMembers': 10, 'Poll': 2, 'Options': 4, 'Votes': 20, 'PollTallies': 4,
+                           'PollBallots': 20, 'VoteTokens': 20}
+    assert Poll.query.filter_by(CCAId=2).count() == 2
+
+
+def test_soft_delete_hides_now_and_purge_finishes_in_chunks(app):
+    assert soft_delete_cca(1, requested_by=1) == 10
+    assert is_pending_purge(1)
+    assert CCAMembers.query.filter_by(CCAId=1).count() == 0
+    assert Poll.query.filter_by(CCAId=1, IsActive=True).count() == 0
+    assert PollVote.query.count() == 40
+
+    assert purge_deleted_ccas(chunk_size=3) == {1: {**EXPECTED, 'CCAMembers': 0}}
+
+    assert not is_pending_purge(1)
+    assert CCA.query.get(1) is None
+    assert remaining()['Votes'] == 20
+    assert purge_deleted_ccas() == {}
+
+
+def test_purge_skips_a_cca_another_worker_holds(app):
+    soft_delete_cca(1)
+    CCAPurge.query.filter_by(CCAId=1).update({'LockedBy': 'other', 'LockedUntil': datetime.utcnow() + timedelta(minutes=5)})
+    db.session.commit()
+
+    assert purge_deleted_ccas() == {}
+
+    CCAPurge.query.filter_by(CCAId=1).update({'LockedUntil': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert list(purge_deleted_ccas()) == [1]
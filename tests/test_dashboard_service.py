@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from application import dashboard_service
+from application.cache_invalidation import membership_changed
+from application.dashboard_service import get_dashboard_data, invalidate_cca_dashboards, invalidate_dashboard
+from application.models import db, CCA, CCAMembers, Poll, Student, User
+
+NOW = datetime.utcnow()
+TABLES = [Student, User, CCA, CCAMembers, Poll]
+
+
+def add_poll(poll_id, cca_id, ends_in_days, active=True):
+    db.session.add(Poll(PollId=poll_id, CCAId=cca_id, Question=f'Poll {poll_id}', StartDate=NOW - timedelta(days=1),
+                        EndDate=NOW + timedelta(days=ends_in_days), IsAnonymous=False, IsActive=active))
+
+
+def seed():
+    db.session.add_all([CCA(CCAId=cca_id, Name=name, Description=f'{name} club')
+                        for cca_id, name in ((1, 'Chess'), (2, 'Choir'), (3, 'Drama'))])
+    # User 1 is in Chess and moderates Choir; user 2 is in nothing
+    db.session.add(User(UserId=1, Username='2300001', SystemRole='student',
+                        PasswordLastSet=NOW - timedelta(days=100)))
+    db.session.add(User(UserId=2, Username='2300002', SystemRole='student', PasswordLastSet=NOW))
+    db.session.add_all([CCAMembers(UserId=1, CCAId=1, CCARole='member'),
+                        CCAMembers(UserId=1, CCAId=2, CCARole='moderator')])
+    add_poll(10, 1, ends_in_days=5)
+    add_poll(11, 1, ends_in_days=-2, active=False)  # ended
+    add_poll(20, 2, ends_in_days=1)
+    add_poll(30, 3, ends_in_days=3)                 # a CCA user 1 isn't in
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed, DASHBOARD_CACHE_TTL=300) as app:
+        pass
+
+    dashboard_service._dashboards.clear()
+    with app.app_context():
+        yield app
+    dashboard_service._dashboards.clear()
+
+
+def poll_ids(data):
+    return [poll['id'] for poll in data['available_polls']]
+
+
+def test_member_sees_own_ccas_and_their_active_polls(app):
+    data = get_dashboard_data(1)
+
+    assert [(cca['id'], cca['role']) for cca in data['ccas']] == [(1, 'member'), (2, 'moderator')]
+    # Soonest first; ended polls and other CCAs' polls are left out
+    assert poll_ids(data) == [20, 10]
+    assert [poll['days_remaining'] for poll in data['available_polls']] == [1, 5]
+    assert data['available_polls'][0]['cca'] == 'Choir'
+    assert data['user_is_moderator'] is True
+    assert data['password_days_left'] == 265
+
+
+def test_non_member_sees_nothing(app):
+    data = get_dashboard_data(2)
+
+    assert data['ccas'] == []
+    assert data['available_polls'] == []
+    assert data['user_is_moderator'] is False
+    assert data['password_days_left'] == 365
+
+
+def test_unknown_user_gets_an_empty_dashboard(app):
+    assert get_dashboard_data(99) == {'ccas': [], 'available_polls': [], 'user_is_moderator': False,
+                                      'password_days_left': None}
+
+
+def test_membership_change_reloads_dashboard(app):
+    assert get_dashboard_data(2)['ccas'] == []
+    db.session.add(CCAMembers(UserId=2, CCAId=3, CCARole='member'))
+    db.session.commit()
+    # Cached until told otherwise
+    assert get_dashboard_data(2)['ccas'] == []
+
+    membership_changed(2)
+
+    data = get_dashboard_data(2)
+    assert [cca['name'] for cca in data['ccas']] == ['Drama']
+    assert poll_ids(data) == [30]
+
+
+def test_new_poll_reloads_every_member_dashboard(app):
+    assert poll_ids(get_dashboard_data(1)) == [20, 10]
+    assert get_dashboard_data(2)['available_polls'] == []
+    add_poll(12, 1, ends_in_days=2)
+    db.session.commit()
+
+    invalidate_cca_dashboards(1)
+
+    assert poll_ids(get_dashboard_data(1)) == [20, 12, 10]
+
+
+def test_password_change_reloads_dashboard(app):
+    assert get_dashboard_data(1)['password_days_left'] == 265
+    db.session.query(User).filter_by(UserId=1).update({'PasswordLastSet': datetime.utcnow()})
+    db.session.commit()
+    assert get_dashboard_data(1)['password_days_left'] == 265
+
+    invalidate_dashboard(1)
+
+    assert get_dashboard_data(1)['password_days_left'] == 365
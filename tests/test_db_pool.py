@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from application.db_pool import ConnectionPool, PoolTimeout, build_connection_string
+
+
+class FakeConnection:
+    def __init__(self, fail_ping=False):
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_ping = fail_ping
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, sql):
+                if conn.fail_ping:
+                    raise RuntimeError("connection reset")
+
+            def fetchone(self):
+                return (1,)
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(max_size=2, **kwargs):
+    created = []
+
+    def creator():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    pool = ConnectionPool(creator=creator)
+    pool.max_size = max_size
+    for key, value in kwargs.items():
+        setattr(pool, key, value)
+    return pool, created
+
+
+def test_connections_are_reused():
+    pool, created = make_pool()
+    conn = pool.connect()
+    conn.close()
+    conn = pool.connect()
+    conn.close()
+
+    assert len(created) == 1
+    assert created[0].rollbacks == 2
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, _ = make_pool(max_size=1, timeout=0.05)
+    held = pool.connect()
+
+    with pytest.raises(PoolTimeout):
+        pool.connect()
+
+    held.close()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(max_size=1, timeout=2)
+    held = pool.connect()
+    got = []
+
+    worker = threading.Thread(target=lambda: got.append(pool.connect()))
+    worker.start()
+    time.sleep(0.05)
+    held.close()
+    worker.join(1)
+
+    assert got and len(created) == 1
+
+
+def test_idle_connections_are_evicted():
+    pool, created = make_pool(max_idle=0)
+    pool.connect().close()
+    time.sleep(0.01)
+    pool.connect().close()
+
+    assert created[0].closed
+    assert pool.stats()['idle_evictions'] == 1
+
+
+def test_evicted_connection_is_closed_outside_the_lock():
+    pool, created = make_pool(max_idle=0.05)
+    pool.connect().close()
+    stuck = threading.Event()
+    created[0].close = lambda: stuck.wait(5)    # a half-dead socket
+    time.sleep(0.1)
+
+    evicting = threading.Thread(target=lambda: pool.connect().close())
+    evicting.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    pool.connect().close()
+    assert pool.stats()['idle_evictions'] == 1
+    assert time.monotonic() - started < 1
+
+    stuck.set()
+    evicting.join(1)
+
+
+def test_failed_health_check_replaces_connection():
+    pool, created = make_pool(ping_after=0)
+    pool.connect().close()
+    created[0].fail_ping = True
+
+    pool.connect().close()
+
+    assert len(created) == 2
+    assert created[0].closed
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_connection_string_from_sqlalchemy_uri():
+    config = {'SQLALCHEMY_DATABASE_URI': 'mssql+pyodbc:///?odbc_connect=DRIVER%3D%7BODBC+Driver+18%7D%3BSERVER%3Ddb'}
+    assert build_connection_string(config) == 'DRIVER={ODBC Driver 18};SERVER=db'
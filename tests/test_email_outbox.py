@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from flask_mail import Mail
+
+from application.models import db, EmailOutbox
+from application.email_outbox import OutboxWorkers, email_outbox, enqueue_email, purge_sent, retry_email, SENT, PENDING, DEAD
+
+
+class FakeMail:
+    def __init__(self):
+        self.sent = []
+        self.connections = 0
+
+    @contextmanager
+    def connect(self):
+        self.connections += 1
+        mail = self
+
+        class Connection:
+            def send(self, message):
+                if message.recipients[0].startswith('bounce'):
+                    raise RuntimeError('550 mailbox unavailable')
+                mail.sent.append(message.recipients[0])
+
+        yield Connection()
+
+
+@pytest.fixture
+def workers(sqlite_app):
+    with sqlite_app([EmailOutbox], EMAIL_OUTBOX_MAX_ATTEMPTS=2, MAIL_DEFAULT_SENDER='portal@example.com') as app:
+        Mail(app)  # Message() reads the default sender from it
+        workers = OutboxWorkers()
+        workers.init_app(app, FakeMail())
+        yield workers
+
+
+def make_due():
+    EmailOutbox.query.update({'NextAttemptAt': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_batch_is_sent_over_one_connection(workers):
+    for recipient in ('a@example.com', 'b@example.com'):
+        enqueue_email(recipient, 'Hello', text='Hi')
+
+    assert workers._process_batch('worker-1') == 2
+    assert workers._mail.sent == ['a@example.com', 'b@example.com']
+    assert workers._mail.connections == 1
+    assert {e.Status for e in EmailOutbox.query} == {SENT}
+
+
+def test_failures_back_off_then_dead_letter(workers):
+    email_id = enqueue_email('bounce@example.com', 'Hello', text='Hi')
+
+    workers._process_batch('worker-1')
+    email = db.session.get(EmailOutbox, email_id)
+    assert email.Status == PENDING
+    assert email.NextAttemptAt > datetime.utcnow()
+    # Not due yet, so nothing is claimed
+    assert workers._process_batch('worker-1') == 0
+
+    make_due()
+    workers._process_batch('worker-1')
+    assert db.session.get(EmailOutbox, email_id).Status == DEAD
+
+    assert retry_email(email_id)
+    email = db.session.get(EmailOutbox, email_id)
+    assert (email.Status, email.Attempts) == (PENDING, 0)
+
+
+def test_rows_leased_by_one_worker_are_not_claimed_by_another(workers):
+    enqueue_email('a@example.com', 'Hello', text='Hi')
+
+    assert len(workers._claim('worker-1')) == 1
+    assert workers._claim('worker-2') == []
+
+
+def test_sent_message_keeps_no_body(workers):
+    sent_id = enqueue_email('a@example.com', 'Set your password', html='<a href="/setup/token">', text='/setup/token')
+    dead_id = enqueue_email('bounce@example.com', 'Set your password', text='/setup/token')
+
+    workers._process_batch('worker-1')
+
+    sent = db.session.get(EmailOutbox, sent_id)
+    assert (sent.Status, sent.HtmlBody, sent.TextBody) == (SENT, None, None)
+    # Still retryable, so it keeps its body
+    assert db.session.get(EmailOutbox, dead_id).TextBody == '/setup/token'
+
+
+def test_purge_deletes_old_sent_messages_only(workers):
+    ids = {name: enqueue_email(f'{name}@example.com', 'Hello', text='Hi')
+           for name in ('old', 'recent', 'leftover', 'pending')}
+    now = datetime.utcnow()
+    for name, sent_days_ago in (('old', 10), ('recent', 1), ('leftover', 2)):
+        email = db.session.get(EmailOutbox, ids[name])
+        email.Status, email.SentAt = SENT, now - timedelta(days=sent_days_ago)
+    # Sent before bodies were cleared on send
+    db.session.get(EmailOutbox, ids['recent']).TextBody = None
+    db.session.commit()
+
+    assert purge_sent(retention_days=7, chunk_size=1) == 1
+
+    assert db.session.get(EmailOutbox, ids['old']) is None
+    assert db.session.get(EmailOutbox, ids['recent']).Status == SENT
+    assert db.session.get(EmailOutbox, ids['leftover']).TextBody is None
+    assert db.session.get(EmailOutbox, ids['pending']).TextBody == 'Hi'
+
+
+def test_retried_setup_email_gets_a_fresh_link(workers, monkeypatch):
+    # Only student 2300001 still exists
+    monkeypatch.setattr(email_outbox, '_rebuild_setup_email',
+                        {2300001: ('Set your password', '<a href="/setup/new">', '/setup/new')}.get)
+    fresh = enqueue_email('bounce@example.com', 'Set your password', text='/setup/old', student_id=2300001)
+    gone = enqueue_email('bounce@example.com', 'Set your password', text='/setup/old', student_id=2300002)
+    EmailOutbox.query.update({'Status': DEAD})
+    db.session.commit()
+
+    assert retry_email(fresh)
+    email = db.session.get(EmailOutbox, fresh)
+    assert (email.Status, email.HtmlBody, email.TextBody) == (PENDING, '<a href="/setup/new">', '/setup/new')
+    assert not retry_email(gone)
+    assert db.session.get(EmailOutbox, gone).Status == DEAD
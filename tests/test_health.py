@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask
+from flask_session import Session
+
+from application import health as health_module
+from application.health import DEGRADED, DOWN, OK, HealthMonitor, check_sessions
+from application.session_store import configure_sessions
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['HEALTH_CHECK_INTERVAL'] = 10
+    return app
+
+
+@pytest.fixture
+def monitor(app):
+    monitor = HealthMonitor()
+    monitor.init_app(app)
+    # Pretend the checker thread is already running so probes don't start one
+    monitor._threads._pid = os.getpid()
+    return monitor
+
+
+def use_checks(monkeypatch, **results):
+    def make(result):
+        def check():
+            if isinstance(result, Exception):
+                raise result
+            return result, {}
+        return check
+    monkeypatch.setattr(health_module, 'CHECKS', tuple((name, make(result)) for name, result in results.items()))
+
+
+def test_live_never_runs_checks(app, monitor, monkeypatch):
+    use_checks(monkeypatch, database=RuntimeError('should not run'))
+    response = app.test_client().get('/health/live')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'alive'
+
+
+def test_ready_reports_starting_until_first_check(app, monitor):
+    response = app.test_client().get('/health/ready')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'starting'}
+
+
+def test_starting_never_waits_on_the_checks(app, monkeypatch):
+    app.config['HEALTH_CHECK_INTERVAL'] = 3600
+    monitor = HealthMonitor()
+    monitor.init_app(app)
+    release = threading.Event()
+
+    def hung_database():
+        release.wait(5)
+        return OK, {}
+    monkeypatch.setattr(health_module, 'CHECKS', (('database', hung_database), ('sessions', lambda: (OK, {}))))
+
+    started = time.monotonic()
+    response = app.test_client().get('/health/ready')
+    assert time.monotonic() - started < 1
+    assert response.get_json() == {'status': 'starting'}
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while monitor._last is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert app.test_client().get('/health/ready').status_code == 200
+
+
+class UnreachableStore:
+    def get(self, key):
+        raise ConnectionError('store unreachable')
+
+
+def test_session_check_probes_the_store(app):
+    app.secret_key = 'test'
+    app.config['SESSION_BACKEND'] = 'memory'
+    configure_sessions(app)
+    Session(app)
+    with app.app_context():
+        assert check_sessions()[0] == OK
+        app.session_interface.cache = UnreachableStore()
+        with pytest.raises(ConnectionError):
+            check_sessions()
+
+
+def test_optional_checks_only_degrade(app, monitor, monkeypatch):
+    use_checks(monkeypatch, database=OK, sessions=OK, outbox=DEGRADED, breach_index=RuntimeError('gone'))
+    with app.app_context():
+        ready, body = monitor.run_checks()
+    monitor._last = (ready, body, time.monotonic())
+
+    response = app.test_client().get('/health/ready')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['status'] == DEGRADED
+    assert data['checks']['breach_index'] == {'status': DOWN, 'error': 'gone'}
+
+
+def test_required_check_failing_is_not_ready(app, monitor, monkeypatch):
+    use_checks(monkeypatch, database=RuntimeError('login timeout'), sessions=OK)
+    with app.app_context():
+        ready, body = monitor.run_checks()
+    monitor._last = (ready, body, time.monotonic())
+
+    response = app.test_client().get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['checks']['database']['error'] == 'login timeout'
+
+
+def test_stale_result_is_not_ready(app, monitor, monkeypatch):
+    use_checks(monkeypatch, database=OK, sessions=OK)
+    with app.app_context():
+        ready, body = monitor.run_checks()
+    monitor._last = (ready, body, time.monotonic() - 31)
+
+    response = app.test_client().get('/health/ready')
+    assert response.status_code == 503
+    assert response.get_json()['stale_seconds'] == 31
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import event
+
+from application.auth_utils import resolve_identity, save_login_state
+from application.models import db, CCA, CCAMembers, Student, User
+
+TABLES = [Student, User, CCA, CCAMembers]
+
+
+def seed():
+    db.session.add_all([
+        Student(StudentId=2300001, Name='Alice', Email='alice@example.com'),
+        Student(StudentId=2300002, Name='Bob', Email='bob@example.com'),
+        User(UserId=1, Username='admin', Password='hash', SystemRole='admin'),
+        User(UserId=2, Username='2300001', Password='hash', SystemRole='student', StudentId=2300001,
+             MFATOTPSecret='SECRET'),
+        User(UserId=3, Username='2300002', Password='hash', SystemRole='student', StudentId=2300002,
+             IsLocked=True, FailedLoginAttempts=5),
+        CCA(CCAId=1, Name='Chess'),
+        CCAMembers(UserId=2, CCAId=1, CCARole='moderator'),
+    ])
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        yield app
+
+
+def count_queries():
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_resolves_by_email_student_id_and_username(app):
+    with app.test_request_context():
+        by_email = resolve_identity('alice@example.com', by='email')
+        assert by_email['user_id'] == 2
+        assert by_email['name'] == 'Alice'
+        assert by_email['mfa_secret'] == 'SECRET'
+        assert by_email['is_moderator'] is True
+
+        by_id = resolve_identity('2300002', by='student_id')
+        assert by_id['user_id'] == 3
+        assert by_id['is_locked'] is True
+        assert by_id['is_moderator'] is False
+
+        assert resolve_identity('admin')['system_role'] == 'admin'
+        assert resolve_identity('nobody') is None
+
+
+def test_one_query_per_request(app):
+    with app.test_request_context():
+        statements = count_queries()
+        first = resolve_identity('2300001', by='student_id')
+        assert resolve_identity('2300001', by='student_id') is first
+        assert len(statements) == 1
+
+    # Each request gets a fresh app context, and with it a fresh g
+    with app.app_context(), app.test_request_context():
+        resolve_identity('2300001', by='student_id')
+        assert len(statements) == 2
+
+
+def test_save_login_state_updates_row_and_identity(app):
+    with app.test_request_context():
+        identity = resolve_identity('2300002', by='student_id')
+        save_login_state(identity, IsLocked=False, FailedLoginAttempts=0)
+        db.session.commit()
+
+        assert identity['is_locked'] is False
+        assert identity['failed_attempts'] == 0
+        assert db.session.get(User, 3).IsLocked is False
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from application import log_explorer
+from application.log_explorer import log_counts, parse_filters, query_logs
+from application.models import db, AdminLog, LoginLog, LogDailyStats, User
+
+START = datetime(2024, 3, 1, 9, 0, 0)
+TABLES = [User, LoginLog, AdminLog, LogDailyStats]
+
+
+def seed():
+    db.session.add_all([
+        User(UserId=1, Username='admin', Password='x', SystemRole='admin'),
+        User(UserId=2, Username='2300001', Password='x', SystemRole='student'),
+    ])
+    # Interleaved: even minutes are logins, odd minutes admin actions; two logins share a timestamp
+    for i in range(30):
+        when = START + timedelta(minutes=i)
+        if i % 2 == 0:
+            db.session.add(LoginLog(Username='2300001', UserId=2, IPAddress='10.0.0.1', Timestamp=when,
+                                    Success=i % 4 == 0, Reason=None if i % 4 == 0 else 'Wrong password'))
+        else:
+            db.session.add(AdminLog(AdminUserId=1, Action='Data Change' if i % 3 == 0 else 'Viewed',
+                                    Timestamp=when, IPAddress='10.0.0.2'))
+    db.session.add(LoginLog(Username='ghost', IPAddress='10.0.0.9', Timestamp=START, Success=False,
+                            Reason='User not found'))
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        log_explorer._counts.clear()
+        yield app
+
+
+def collect(filters, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = query_logs(filters, cursor, limit)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_both_tables_newest_first_without_gaps(app):
+    pages = collect({}, limit=7)
+    rows = [row for page in pages for row in page]
+
+    assert len(rows) == 31
+    assert len({(row['source'], row['log_id']) for row in rows}) == 31
+    keys = [(row['timestamp'], row['log_id']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert all(len(page) == 7 for page in pages[:-1])
+
+
+def test_filters(app):
+    failed = [row for page in collect(parse_filters({'success': 'false'}), 5) for row in page]
+    assert {row['source'] for row in failed} == {'auth'}
+    assert len(failed) == 8
+
+    by_ip = [row for page in collect(parse_filters({'ip': '10.0.0.2'}), 50) for row in page]
+    assert len(by_ip) == 15 and all(row['source'] == 'admin' for row in by_ip)
+
+    data_changes = [row for page in collect(parse_filters({'log_type': 'data_modification'}), 50) for row in page]
+    assert {row['message'] for row in data_changes} == {'Data Change'}
+
+    ghost = [row for page in collect(parse_filters({'user': 'ghost'}), 50) for row in page]
+    assert [row['message'] for row in ghost] == ['Failed: User not found']
+
+    day = parse_filters({'date_from': '2024-03-02', 'date_to': 'not-a-date'})
+    assert query_logs(day) == ([], None)
+
+
+def test_counts_come_from_one_cached_query(app):
+    counts = log_counts()
+    assert counts['total_logs'] == 31
+    assert counts['authentication_logs'] == 16
+    assert counts['data_changes_logs'] == 5
+
+    db.session.add(AdminLog(AdminUserId=1, Action='Data Change', Timestamp=START))
+    db.session.commit()
+    assert log_counts()['data_changes_logs'] == 5
+
+
+def test_garbage_cursor_starts_from_the_top(app):
+    rows, _ = query_logs({}, 'not-a-cursor', 3)
+    assert rows[0]['timestamp'] == START + timedelta(minutes=29)
+
+
+def test_rows_without_timestamp_are_left_out(app):
+    # Explicit NULLs; the ORM would fill in the column default
+    db.session.execute(insert(LoginLog).values(Username='2300001', UserId=2, IPAddress='10.0.0.1',
+                                                Timestamp=None, Success=True))
+    db.session.execute(insert(AdminLog).values(AdminUserId=1, Action='Viewed', Timestamp=None, IPAddress='10.0.0.2'))
+    db.session.commit()
+
+    # Same rows whether read in one page or resumed from cursors
+    for limit in (4, 200):
+        rows = [row for page in collect({}, limit) for row in page]
+        assert len(rows) == 31
+        assert all(row['timestamp'] is not None for row in rows)
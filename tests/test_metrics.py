@@ -0,0 +1,107 @@
+import json
+import subprocess
+import sys
+
+import pytest
+from flask import Flask
+
+from application.metrics import Metrics
+
+
+@pytest.fixture
+def registry():
+    registry = Metrics()
+    registry.counter('jobs_total', 'Jobs run.')
+    registry.histogram('job_seconds', 'Job time.', buckets=(0.1, 1.0))
+    return registry
+
+
+def test_renders_counters_histograms_and_gauges(registry):
+    registry.inc('jobs_total', kind='email')
+    registry.inc('jobs_total', 2, kind='email')
+    for value in (0.05, 0.5, 3):
+        registry.observe('job_seconds', value, kind='email')
+    registry.collector('queue_depth', 'Waiting jobs.', lambda: [({'queue': 'a'}, 4), ({'queue': 'b'}, 1)])
+
+    text = registry.render([registry.snapshot()])
+
+    assert '# TYPE jobs_total counter\njobs_total{kind="email"} 3\n' in text
+    assert 'job_seconds_bucket{kind="email",le="0.1"} 1\n' in text
+    assert 'job_seconds_bucket{kind="email",le="1.0"} 2\n' in text
+    assert 'job_seconds_bucket{kind="email",le="+Inf"} 3\n' in text
+    assert 'job_seconds_sum{kind="email"} 3.55\n' in text
+    assert 'queue_depth{queue="b"} 1\n' in text
+
+
+def test_worker_snapshots_are_added_together(registry):
+    registry.inc('jobs_total', kind='email')
+    registry.observe('job_seconds', 0.5)
+    snapshot = registry.snapshot()
+
+    text = registry.render([snapshot, snapshot])
+
+    assert 'jobs_total{kind="email"} 2\n' in text
+    assert 'job_seconds_count 2\n' in text
+
+
+def test_endpoint_only_answers_allowed_addresses(registry, tmp_path):
+    app = Flask(__name__)
+    app.config.update(METRICS_ALLOWED_IPS=['10.0.0.0/8'], METRICS_DIR=str(tmp_path))
+    registry.init_app(app)
+    registry.inc('jobs_total', kind='email')
+    client = app.test_client()
+
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '192.168.1.5'}).status_code == 404
+    response = client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'})
+    assert response.status_code == 200
+    assert 'jobs_total{kind="email"} 1' in response.get_data(as_text=True)
+    assert list(tmp_path.iterdir())
+
+
+def test_times_requests_and_sessions(registry):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    registry.init_app(app)
+    registry.instrument_sessions(app)
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    client = app.test_client()
+    client.get('/ok')
+    client.get('/ok')
+    client.get('/boom')
+
+    text = registry.render([registry.snapshot()])
+    assert 'http_request_duration_seconds_count{endpoint="ok",method="GET"} 2\n' in text
+    assert 'http_requests_total{endpoint="ok",status="200"} 2\n' in text
+    assert 'http_requests_total{endpoint="boom",status="500"} 1\n' in text
+    assert 'http_requests_in_flight 0\n' in text
+    assert 'session_store_duration_seconds_count{op="open"} 3\n' in text
+
+
+def test_exited_workers_counters_are_kept(registry, tmp_path):
+    app = Flask(__name__)
+    app.config.update(METRICS_ALLOWED_IPS=['127.0.0.1'], METRICS_DIR=str(tmp_path))
+    registry.init_app(app)
+    registry.collector('queue_depth', 'Waiting jobs.', lambda: 4)
+    registry.inc('jobs_total', 5, kind='email')
+    registry.observe('job_seconds', 0.5)
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True).stdout.strip()
+    with app.app_context():
+        (tmp_path / f'{exited}.json').write_text(json.dumps(registry.snapshot()))
+    client = app.test_client()
+
+    for _ in range(2):
+        text = client.get('/metrics').get_data(as_text=True)
+        # This worker's figures plus the exited one's, counted once
+        assert 'jobs_total{kind="email"} 10\n' in text
+        assert 'job_seconds_count 2\n' in text
+        assert 'queue_depth 4\n' in text
+    assert not (tmp_path / f'{exited}.json').exists()
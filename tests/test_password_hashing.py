@@ -0,0 +1,58 @@
+import threading
+
+import bcrypt
+import pytest
+from flask import Flask
+
+from application.password_hashing import PasswordHasher, PasswordHashBusy, hash_cost
+
+
+def make_hasher(**config):
+    app = Flask(__name__)
+    app.config.update({'BCRYPT_ROUNDS': 4, 'PASSWORD_HASH_WORKERS': 2, **config})
+    return PasswordHasher(app)
+
+
+@pytest.mark.parametrize('use_pool', [True, False])
+def test_hash_and_verify(use_pool):
+    hasher = make_hasher(PASSWORD_HASH_POOL=use_pool)
+    hashed = hasher.hash('correct horse battery staple')
+
+    assert hash_cost(hashed) == 4
+    assert hasher.verify('correct horse battery staple', hashed)
+    assert not hasher.verify('wrong', hashed)
+    assert hasher.stats()['verified'] == 2
+    assert hasher.stats()['hashed'] == 1
+
+
+def test_malformed_or_missing_hash_never_matches():
+    hasher = make_hasher(PASSWORD_HASH_POOL=False)
+    assert not hasher.verify('anything', None)
+    assert not hasher.verify('anything', 'not-a-bcrypt-hash')
+
+
+def test_needs_rehash_when_cost_changes():
+    hasher = make_hasher(PASSWORD_HASH_POOL=False)
+    old = bcrypt.hashpw(b'secret', bcrypt.gensalt(5)).decode()
+    assert hasher.needs_rehash(old)
+    assert not hasher.needs_rehash(hasher.hash('secret'))
+
+
+def test_saturated_pool_raises_busy():
+    hasher = make_hasher(PASSWORD_HASH_POOL=False, PASSWORD_HASH_WORKERS=1,
+                         PASSWORD_HASH_QUEUE=0, PASSWORD_HASH_QUEUE_TIMEOUT=0.05)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=hasher._run, args=('hashed', slow))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(PasswordHashBusy):
+        hasher.verify('secret', bcrypt.hashpw(b'secret', bcrypt.gensalt(4)).decode())
+    release.set()
+    worker.join()
+    assert hasher.stats()['rejected'] == 1
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from application.models import db, Student, User
+from application.provisioning import provision_students, read_student_ids, summarize
+
+TABLES = [Student, User]
+
+
+def seed():
+    db.session.add_all([Student(StudentId=2300000 + i, Name=f'Student {i}', Email=f's{i}@example.com')
+                        for i in range(1, 6)])
+    db.session.add(User(Username='2300001', StudentId=2300001, Password='hash', SystemRole='student'))
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        yield app
+
+
+def test_reads_student_id_column_after_header():
+    stream = io.StringIO("name,student_id\nAlice,2300001\n\nBob,2300002\n")
+    assert list(read_student_ids(stream)) == [(2, '2300001'), (4, '2300002')]
+
+
+def test_reads_first_column_without_header():
+    assert list(read_student_ids(io.StringIO("2300001\n2300002,extra\n"))) == [(1, '2300001'), (2, '2300002')]
+
+
+def test_reports_an_outcome_for_every_row(app):
+    rows = [(1, '2300001'), (2, '2300002'), (3, '2300002'), (4, '99'), (5, '2399999'), (6, '2300003')]
+    outcomes = provision_students(rows, send_emails=False, chunk_size=2)
+
+    assert [o['status'] for o in outcomes] == ['exists', 'created', 'duplicate', 'invalid', 'not_found', 'created']
+    assert summarize(outcomes) == {'exists': 1, 'created': 2, 'duplicate': 1, 'invalid': 1, 'not_found': 1}
+
+    created = User.query.filter(User.StudentId.in_([2300002, 2300003])).all()
+    assert [(u.Username, u.Password, u.SystemRole) for u in created] == [('2300002', None, 'student'), ('2300003', None, 'student')]
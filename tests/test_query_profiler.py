@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from application.metrics import metrics
+from application.models import db
+from application.query_profiler import parameter_shape, profiled, query_profiler
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(QUERY_PROFILER_HEADERS=True, SLOW_QUERY_MS=None) as app:
+        pass
+    query_profiler.init_app(app)
+
+    @app.route('/orm')
+    def orm():
+        for _ in range(3):
+            db.session.execute(text('SELECT 1'))
+        return 'ok'
+
+    @app.route('/raw')
+    def raw():
+        conn = profiled(sqlite3.connect(':memory:'))
+        cursor = conn.cursor()
+        cursor.execute('SELECT ?', (1,))
+        cursor.executemany('SELECT ?', [(1,), (2,)])
+        conn.close()
+        return 'ok'
+    return app
+
+
+def test_counts_orm_and_raw_statements_per_request(app):
+    client = app.test_client()
+
+    response = client.get('/orm')
+    assert response.headers['X-DB-Query-Count'] == '3'
+    assert len(response.headers['X-DB-Slowest-Ms'].split(', ')) == 3
+    assert 'db;dur=' in response.headers['Server-Timing']
+
+    assert client.get('/raw').headers['X-DB-Query-Count'] == '2'
+    text = metrics.render([metrics.snapshot()])
+    assert 'db_queries_per_request_count{endpoint="orm"}' in text
+    assert 'db_queries_per_request_count{endpoint="raw"}' in text
+
+
+def test_slow_statements_are_logged_with_parameter_shapes(app, capsys):
+    app.config['SLOW_QUERY_MS'] = 0
+    app.test_client().get('/raw')
+
+    out = capsys.readouterr().out
+    assert '[slow query]' in out
+    assert 'in raw: SELECT ? params=(int)' in out
+    assert 'params=2 x (int)' in out
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape(('secret', 7, None, datetime(2024, 1, 1))) == '(str[6], int, null, datetime)'
+    assert parameter_shape({'name': 'alice'}) == '{name: str[5]}'
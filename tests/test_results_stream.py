@@ -0,0 +1,124 @@
+import json
+import time
+
+import pytest
+from flask import Flask
+
+from application import results_stream
+from application.results_stream import ResultsBroker
+
+
+@pytest.fixture
+def app(monkeypatch):
+    tallies = {1: 0, 2: 0}
+    reads = []
+
+    def fake_get_tallies(poll_id):
+        reads.append(poll_id)
+        return [(option_id, f"Option {option_id}", count) for option_id, count in tallies.items()]
+
+    monkeypatch.setattr(results_stream, 'get_tallies', fake_get_tallies)
+    app = Flask(__name__)
+    app.config.update(RESULTS_STREAM_INTERVAL=0.05, RESULTS_STREAM_HEARTBEAT=0.05, RESULTS_STREAM_MAX_SECONDS=5)
+    app.tallies, app.reads = tallies, reads
+    return app
+
+
+def next_tally(events):
+    for chunk in events:
+        if chunk.startswith('event: tally'):
+            return json.loads(chunk.split('data: ', 1)[1])
+
+
+def test_one_producer_fans_out_deltas(app):
+    broker = ResultsBroker()
+    with app.app_context():
+        first, second = broker.stream(1), broker.stream(1)
+
+    assert next_tally(first) == {'counts': {'1': 0, '2': 0}, 'total_votes': 0}
+    assert next_tally(second) == {'counts': {'1': 0, '2': 0}, 'total_votes': 0}
+
+    app.tallies[2] = 3
+    broker.notify(1)
+    assert next_tally(first) == {'counts': {'2': 3}, 'total_votes': 3}
+    assert next_tally(second) == {'counts': {'2': 3}, 'total_votes': 3}
+
+    # Both viewers share one producer reading the same poll
+    assert set(app.reads) == {1}
+    first.close()
+    second.close()
+
+
+def test_producer_stops_without_subscribers(app):
+    broker = ResultsBroker()
+    with app.app_context():
+        events = broker.stream(1)
+    next_tally(events)
+    events.close()
+
+    time.sleep(0.2)
+    assert broker.subscriber_count() == 0
+    assert broker._channels == {}
+
+
+def test_refuses_subscribers_over_capacity(app):
+    app.config['RESULTS_STREAM_MAX_SUBSCRIBERS'] = 1
+    broker = ResultsBroker()
+    with app.app_context():
+        events = broker.stream(1)
+        next_tally(events)
+        assert broker.stream(2) is None
+    events.close()
+
+
+def test_streams_leave_reserved_threads_free(app):
+    broker = ResultsBroker()
+    broker.reserve_threads(4, reserved=2)
+    with app.app_context():
+        first, second = broker.stream(1), broker.stream(2)
+        assert broker.stream(1) is None
+
+        # A slot frees as soon as the server closes its response, even one never sent
+        second.close()
+        third = broker.stream(1)
+        assert third is not None
+        assert broker.stream(1) is None
+
+    next_tally(first)
+    first.close()
+    third.close()
+    assert broker._open_streams == 0
+
+
+def test_no_streams_when_threads_are_all_reserved(app):
+    broker = ResultsBroker()
+    broker.reserve_threads(2, reserved=2)
+    with app.app_context():
+        assert broker.stream(1) is None
+
+
+def test_latest_shares_one_read_between_pollers(app):
+    app.config['RESULTS_STREAM_INTERVAL'] = 60
+    broker = ResultsBroker()
+    app.tallies[1] = 2
+    with app.app_context():
+        assert broker.latest(1) == {'counts': {'1': 2, '2': 0}, 'total_votes': 2}
+        app.tallies[1] = 5
+        assert broker.latest(1)['total_votes'] == 2
+    assert app.reads == [1]
+
+
+def test_latest_uses_the_open_streams_tallies(app):
+    app.config['RESULTS_STREAM_INTERVAL'] = 60
+    broker = ResultsBroker()
+    with app.app_context():
+        events = broker.stream(1)
+        next_tally(events)
+        app.tallies[2] = 4
+        broker.notify(1)
+        next_tally(events)
+        reads = len(app.reads)
+
+        assert broker.latest(1) == {'counts': {'1': 0, '2': 4}, 'total_votes': 4}
+        assert len(app.reads) == reads
+    events.close()
@@ -0,0 +1,66 @@
+import pytest
+from flask import Flask, session
+from flask_session import Session
+
+from application.session_store import MemorySessionCache, configure_sessions
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config.update(SESSION_BACKEND='memory', SESSION_PERMANENT=False, SESSION_STORE_TTL=60)
+    configure_sessions(app)
+    Session(app)
+
+    @app.route('/login')
+    def login():
+        session['user_id'] = 7
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return str(session.get('user_id'))
+
+    return app
+
+
+def test_memory_backend_keeps_sessions(app):
+    client = app.test_client()
+    client.get('/login')
+    assert client.get('/whoami').get_data(as_text=True) == '7'
+    assert app.test_client().get('/whoami').get_data(as_text=True) == 'None'
+
+
+def test_only_changed_sessions_are_written(app, monkeypatch):
+    cache = app.config['SESSION_CACHELIB']
+    writes = []
+    original = cache.set
+    monkeypatch.setattr(cache, 'set', lambda key, value, timeout=None: writes.append(key) or original(key, value, timeout))
+
+    client = app.test_client()
+    client.get('/login')
+    for _ in range(3):
+        client.get('/whoami')
+
+    assert len(writes) == 1
+
+
+def test_memory_cache_is_bounded_and_returns_copies():
+    cache = MemorySessionCache(maxsize=2)
+    cache.set('a', {'n': 1}, timeout=60)
+    cache.get('a')['n'] = 2
+    assert cache.get('a') == {'n': 1}
+
+    cache.set('b', {}, timeout=60)
+    cache.set('c', {}, timeout=60)
+    assert cache.get('a') is None
+    assert len(cache) == 2
+    assert cache.delete('b') and not cache.delete('b')
+
+
+def test_unknown_backend_is_rejected():
+    app = Flask(__name__)
+    app.config['SESSION_BACKEND'] = 'files'
+    with pytest.raises(RuntimeError, match='SESSION_BACKEND'):
+        configure_sessions(app)
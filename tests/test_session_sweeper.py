@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask_session import Session
+
+from application.models import db
+from application.session_store import configure_sessions
+from application.session_sweeper import SessionSweeper, sweep_sessions
+
+
+@pytest.fixture(scope='module')
+def app(sqlite_app):
+    # Flask-Session declares its table model on `db`, which can only happen once per process
+    with sqlite_app(SESSION_STORE_TTL=8 * 3600, SESSION_IDLE_TIMEOUT=1800, SESSION_SWEEP_INTERVAL=0) as app:
+        pass
+    configure_sessions(app)
+    Session(app)
+    SessionSweeper().init_app(app)
+    return app
+
+
+@pytest.fixture
+def model(app):
+    model = app.session_interface.sql_session_model
+    with app.app_context():
+        model.__table__.drop(db.engine, checkfirst=True)
+        model.__table__.create(db.engine)
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        rows = {
+            'fresh': now - timedelta(minutes=5),
+            'idle': now - timedelta(hours=1),
+            'expired': now - lifetime - timedelta(minutes=1),
+        }
+        for name, written in rows.items():
+            for n in range(3):
+                db.session.add(model(session_id=f'session:{name}-{n}', data=b'', expiry=written + lifetime))
+        db.session.commit()
+        yield model
+
+
+def remaining(model):
+    return sorted({row.session_id.split(':')[1].rsplit('-', 1)[0] for row in db.session.query(model)})
+
+
+def test_sweeps_expired_and_idle_sessions_in_chunks(app, model):
+    with app.app_context():
+        counts = sweep_sessions(chunk_size=2)
+        assert counts == {'expired': 3, 'idle': 3}
+        assert remaining(model) == ['fresh']
+
+
+def test_idle_limit_can_be_turned_off(app, model):
+    with app.app_context():
+        assert sweep_sessions(idle_timeout=0) == {'expired': 3}
+        assert remaining(model) == ['fresh', 'idle']
+
+
+def test_declares_expiry_index(app, model):
+    assert 'IX_sessions_expiry' in {index.name for index in model.__table__.indexes}
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from application.models import db, CCA, CCAMembers, Student, User
+from application.student_search import StudentSearchIndex, search_response
+
+NAMES = ['Alice Tan', 'Alan Lim', 'Bob Alvarez', 'Tan Wei Ming', 'Carol Ng']
+TABLES = [Student, User, CCA, CCAMembers]
+
+
+def seed():
+    for i, name in enumerate(NAMES, start=1):
+        db.session.add(Student(StudentId=2300000 + i, Name=name, Email=f's{i}@example.com'))
+        db.session.add(User(UserId=i, Username=str(2300000 + i), StudentId=2300000 + i, SystemRole='student'))
+    # A student record without a login account is not searchable
+    db.session.add(Student(StudentId=2399999, Name='Alex No Account', Email='none@example.com'))
+    db.session.add(CCA(CCAId=1, Name='Chess'))
+    db.session.add(CCAMembers(UserId=1, CCAId=1, CCARole='member'))
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        yield app
+
+
+@pytest.fixture
+def index(app):
+    index = StudentSearchIndex()
+    index.rebuild()
+    return index
+
+
+def names(results):
+    return [student['name'] for student in results]
+
+
+def test_matches_substrings_of_name_or_id(index):
+    assert names(index.search('al')) == ['Alan Lim', 'Alice Tan', 'Bob Alvarez']
+    assert names(index.search('VAREZ')) == ['Bob Alvarez']
+    assert names(index.search('2300004')) == ['Tan Wei Ming']
+    assert index.search('zz') == []
+    assert index.search('a') == []
+
+
+def test_ranks_prefixes_before_other_matches(index):
+    # Name prefix, then a later word starting with the query, then anywhere
+    assert names(index.search('tan')) == ['Tan Wei Ming', 'Alice Tan']
+    assert index.search('2300003')[0]['name'] == 'Bob Alvarez'
+    assert names(index.search('230000', limit=2)) == ['Alan Lim', 'Alice Tan']
+
+
+def test_excludes_members_of_the_cca(index):
+    assert 'Alice Tan' not in names(index.search('al', cca_id=1))
+    assert 'Alice Tan' in names(index.search('al', cca_id=2))
+
+
+def test_applies_membership_and_account_changes_incrementally(app, index):
+    db.session.add(CCAMembers(UserId=2, CCAId=1, CCARole='member'))
+    CCAMembers.query.filter_by(UserId=1).delete()
+    db.session.add(User(UserId=9, Username='2399999', StudentId=2399999, SystemRole='student'))
+    db.session.commit()
+
+    index.memberships_changed(1, 2)
+    index.accounts_changed(2399999)
+
+    assert names(index.search('al', cca_id=1)) == ['Alex No Account', 'Alice Tan', 'Bob Alvarez']
+
+
+def test_stale_index_is_rebuilt_in_the_background(app, index):
+    app.config['STUDENT_SEARCH_REFRESH'] = 0
+    db.session.add(User(UserId=9, Username='2399999', StudentId=2399999, SystemRole='student'))
+    db.session.commit()
+
+    # This search is answered from the old index while the rebuild runs
+    assert 'Alex No Account' not in names(index.search('alex'))
+    deadline = time.monotonic() + 5
+    while not index.search('alex') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert names(index.search('alex')) == ['Alex No Account']
+
+
+def test_results_are_cached_until_the_index_changes(app, index):
+    calls = []
+    compute = index._search
+    index._search = lambda *args: calls.append(args) or compute(*args)
+
+    first = index.search('al', cca_id=1)
+    assert index.search(' AL ', cca_id=1) == first
+    assert len(calls) == 1
+
+    index.memberships_changed(1)
+    index.search('al', cca_id=1)
+    assert len(calls) == 2
+
+
+def test_identical_concurrent_searches_share_one_computation(app, index):
+    started, release, calls = threading.Event(), threading.Event(), []
+    compute = index._search
+
+    def slow_search(*args):
+        calls.append(args)
+        started.set()
+        release.wait(5)
+        return compute(*args)
+    index._search = slow_search
+
+    results = []
+
+    def search():
+        with app.app_context():
+            results.append(index.search('tan'))
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [names(r) for r in results] == [['Tan Wei Ming', 'Alice Tan']] * 4
+
+
+def test_search_response_supports_conditional_requests(app):
+    with app.test_request_context('/search?q=al'):
+        response = search_response([{'student_id': 2300001, 'name': 'Alice Tan', 'email': 's1@example.com'}])
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    with app.test_request_context('/search?q=al', headers={'If-None-Match': etag}):
+        response = search_response([{'student_id': 2300001, 'name': 'Alice Tan', 'email': 's1@example.com'}])
+        assert response.status_code == 304
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+
+from application.cli import register_cli_commands
+from application.models import db, CCA, Poll, PollOption, PollTally, PollVote
+from application.tally_service import create_tallies, get_tallies, rebuild_tallies, record_vote_counts
+
+NOW = datetime(2024, 3, 1, 9, 0, 0)
+
+
+def seed():
+    db.session.add(CCA(CCAId=1, Name='Chess'))
+    # Poll 1 has tallies from the start; poll 2 was created before PollTallies existed
+    for poll_id in (1, 2):
+        db.session.add(Poll(PollId=poll_id, CCAId=1, Question='Q', StartDate=NOW, EndDate=NOW,
+                            IsAnonymous=False, IsActive=True))
+        db.session.add_all([PollOption(OptionId=poll_id * 10 + n, PollId=poll_id, OptionText=f'Option {n}')
+                            for n in range(3)])
+    create_tallies(1, [10, 11, 12])
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(None, seed) as app:
+        register_cli_commands(app)
+        yield app
+
+
+def vote(poll_id, *option_ids):
+    """Write Votes rows and tally them the way vote_ingest does."""
+    counts = {}
+    for option_id in option_ids:
+        db.session.add(PollVote(PollId=poll_id, UserId=1, OptionId=option_id, VotedTime=NOW))
+        counts[option_id] = counts.get(option_id, 0) + 1
+    db.session.flush()
+    record_vote_counts(poll_id, counts)
+    db.session.commit()
+
+
+def counted(poll_id):
+    """{option id: COUNT(Votes)}, the figure every tally must match."""
+    rows = db.session.query(PollOption.OptionId, func.count(PollVote.VoteId)) \
+        .outerjoin(PollVote, PollVote.OptionId == PollOption.OptionId) \
+        .filter(PollOption.PollId == poll_id).group_by(PollOption.OptionId).all()
+    return dict(rows)
+
+
+def tallied(poll_id):
+    return {option_id: count for option_id, _, count in get_tallies(poll_id)}
+
+
+def test_tallies_match_votes_after_voting(app):
+    vote(1, 10, 10, 12)
+    vote(1, 10)
+
+    assert tallied(1) == counted(1) == {10: 3, 11: 0, 12: 1}
+    assert [text for _, text, _ in get_tallies(1)] == ['Option 0', 'Option 1', 'Option 2']
+
+
+def test_rebuild_repairs_drifted_tallies(app):
+    vote(1, 11, 12)
+    db.session.query(PollTally).filter_by(PollId=1, OptionId=11).update({'VoteCount': 40})
+    db.session.commit()
+
+    assert rebuild_tallies(1) == 3
+    db.session.commit()
+
+    assert tallied(1) == counted(1) == {10: 0, 11: 1, 12: 1}
+
+
+def test_poll_without_tallies_is_counted_without_writing(app):
+    db.session.add_all([PollVote(PollId=2, UserId=1, OptionId=21, VotedTime=NOW) for _ in range(2)])
+    db.session.commit()
+    # Something the caller hasn't committed yet
+    db.session.add(CCA(CCAId=2, Name='Choir'))
+
+    assert tallied(2) == counted(2) == {20: 0, 21: 2, 22: 0}
+
+    db.session.rollback()
+    assert db.session.get(CCA, 2) is None
+    assert db.session.query(PollTally).filter_by(PollId=2).count() == 0
+
+
+def test_vote_on_poll_without_tallies_rebuilds_them(app):
+    vote(2, 20, 22, 22)
+
+    assert db.session.query(PollTally).filter_by(PollId=2).count() == 3
+    assert tallied(2) == counted(2) == {20: 1, 21: 0, 22: 2}
+
+
+def test_init_db_fills_in_missing_tallies(app):
+    db.session.add(PollVote(PollId=2, UserId=1, OptionId=20, VotedTime=NOW))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+
+    assert 'Counted tallies for 1 poll(s)' in result.output
+    assert db.session.query(PollTally).filter_by(PollId=2).count() == 3
+    assert tallied(2) == counted(2) == {20: 1, 21: 0, 22: 0}
+
+
+def test_rebuild_tallies_command(app):
+    vote(1, 10)
+    db.session.add(PollVote(PollId=2, UserId=1, OptionId=22, VotedTime=NOW))
+    db.session.query(PollTally).update({'VoteCount': 7})
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-tallies'])
+
+    assert result.output == 'Rebuilt 6 tally rows.\n'
+    assert tallied(1) == counted(1)
+    assert tallied(2) == counted(2)
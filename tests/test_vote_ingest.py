@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from application.models import db, Poll, PollOption, PollVote, PollBallot, PollTally
+from application.vote_ingest import VoteIngestor, RECORDED, DUPLICATE, FAILED
+
+# Foreign keys to UserDetails/CCA aren't enforced by SQLite, so only poll tables are needed
+TABLES = [Poll, PollOption, PollVote, PollBallot, PollTally]
+
+
+def seed():
+    db.session.add(Poll(PollId=1, CCAId=1, Question='Q', QuestionType='multiple_choice',
+                        StartDate=datetime(2024, 1, 1), EndDate=datetime(2099, 1, 1),
+                        IsAnonymous=False, IsActive=True))
+    db.session.add_all([PollOption(OptionId=1, PollId=1, OptionText='A'),
+                        PollOption(OptionId=2, PollId=1, OptionText='B')])
+    db.session.add_all([PollTally(PollId=1, OptionId=1, VoteCount=0),
+                        PollTally(PollId=1, OptionId=2, VoteCount=0)])
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app(TABLES, seed) as app:
+        yield app
+
+
+def tallies():
+    return {t.OptionId: t.VoteCount for t in PollTally.query.filter_by(PollId=1)}
+
+
+def test_ballot_is_committed_with_tallies(app):
+    assert VoteIngestor().submit(1, 10, [1, 2]) == RECORDED
+    assert PollVote.query.filter_by(UserId=10).count() == 2
+    assert tallies() == {1: 1, 2: 1}
+
+
+def test_second_ballot_from_same_voter_is_rejected(app):
+    ingestor = VoteIngestor()
+    assert ingestor.submit(1, 10, [1]) == RECORDED
+    assert ingestor.submit(1, 10, [2]) == DUPLICATE
+    assert tallies() == {1: 1, 2: 0}
+
+
+def test_ballot_committed_elsewhere_is_reported_as_duplicate(app):
+    # Another worker's ballot row is visible only through the primary key
+    db.session.add(PollBallot(PollId=1, UserId=10, CastTime=datetime.utcnow()))
+    db.session.commit()
+
+    app.config['VOTE_BATCHING'] = False
+    assert VoteIngestor().submit(1, 10, [1]) == DUPLICATE
+    assert tallies() == {1: 0, 2: 0}
+
+
+def test_other_integrity_errors_are_not_reported_as_duplicate(app, monkeypatch):
+    # e.g. the option's row was removed by a CCA purge after the ballot was validated
+    def commit(batch):
+        raise IntegrityError('INSERT INTO Votes', {}, Exception('FOREIGN KEY constraint failed'))
+    ingestor = VoteIngestor()
+    monkeypatch.setattr(ingestor, '_commit', commit)
+
+    app.config['VOTE_BATCHING'] = False
+    assert ingestor.submit(1, 10, [1]) == FAILED
@@ -0,0 +1,32 @@
+import pytest
+from flask import Flask
+
+from application.vote_tokens import issue_vote_token, verify_vote_token, VALID, EXPIRED, INVALID
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test-secret'
+    with app.app_context():
+        yield app
+
+
+def test_token_is_bound_to_user_and_poll(app):
+    token = issue_vote_token(7, 3)
+
+    status, row = verify_vote_token(token, 7, 3)
+    assert status == VALID
+    assert len(row['Token']) == 64
+    assert row['ExpiryTime'] > row['IssuedTime']
+
+    assert verify_vote_token(token, 8, 3) == (INVALID, None)
+    assert verify_vote_token(token, 7, 4) == (INVALID, None)
+
+
+def test_tampered_and_expired_tokens_are_rejected(app):
+    token = issue_vote_token(7, 3)
+    assert verify_vote_token(token[:-2] + 'xx', 7, 3) == (INVALID, None)
+
+    app.config['VOTE_TOKEN_MAX_AGE'] = -1
+    assert verify_vote_token(token, 7, 3) == (EXPIRED, None)